@@ -0,0 +1,169 @@
+"""Buffered activity log for the mission planner
+
+Writing every message straight into a ScrolledText (and printing it) makes a
+burst of log calls - loading or clearing a large mission - block the event
+loop. ActivityLog instead:
+
+- keeps the most recent records in an in-memory ring buffer;
+- queues lines for the Text widget and inserts them in one batch from
+  root.after, at most FLUSH_RATE times per second;
+- caps the widget at a maximum number of lines and colours each line with a
+  per-level tag;
+- hands console and file output to a background writer thread.
+
+The level filter applies to the widget and the console/file output; the ring
+buffer keeps every record, so lowering the filter re-displays older lines.
+log() must be called from the Tk thread.
+"""
+from collections import deque, namedtuple
+from datetime import datetime
+import queue
+import sys
+import threading
+import time
+import tkinter as tk
+
+LEVELS = ("DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR")
+LEVEL_RANK = {level: rank for rank, level in enumerate(LEVELS)}
+LEVEL_COLORS = {
+    "DEBUG": "#808080",
+    "INFO": "#00ff00",
+    "SUCCESS": "#00ff00",
+    "WARNING": "#ffaa00",
+    "ERROR": "#ff0000"
+}
+BUFFER_RECORDS = 10000  # Records kept in memory
+MAX_DISPLAY_LINES = 1000  # Lines kept in the log widget
+FLUSH_RATE = 10  # Maximum widget updates per second
+
+LogRecord = namedtuple('LogRecord', ['timestamp', 'level', 'message'])
+
+
+def format_record(record):
+    return f"[{record.timestamp.strftime('%H:%M:%S')}] [{record.level}] {record.message}"
+
+
+class BackgroundWriter:
+    """Writes log lines to the console and an optional file on a daemon thread"""
+
+    def __init__(self, console=True, path=None):
+        self.console = console
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def run(self):
+        while True:
+            lines = [self.queue.get()]
+            try:
+                while True:
+                    lines.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            text = "".join(f"{line}\n" for line in lines if line is not None)
+            if text:
+                if self.console:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                if self.file:
+                    self.file.write(text)
+                    self.file.flush()
+            if None in lines:
+                return
+
+    def close(self, timeout=2.0):
+        """Write out queued lines and stop the thread"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.file:
+            self.file.close()
+
+
+class ActivityLog:
+    """Ring-buffered log with batched, bounded output to a Tk Text widget"""
+
+    def __init__(self, root, level="INFO", console=True, path=None,
+                 max_lines=MAX_DISPLAY_LINES, buffer_records=BUFFER_RECORDS, flush_rate=FLUSH_RATE):
+        self.root = root
+        self.level = level
+        self.max_lines = max_lines
+        self.flush_interval = 1.0 / flush_rate
+        self.records = deque(maxlen=buffer_records)
+        self.pending = deque(maxlen=max_lines)  # Records waiting for the next widget flush
+        self.widget = None
+        self.widget_lines = 0
+        self.flush_scheduled = False
+        self.last_flush = 0.0
+        self.writer = BackgroundWriter(console, path)
+
+    def attach(self, widget):
+        """Display the log in a Text widget"""
+        self.widget = widget
+        for level, color in LEVEL_COLORS.items():
+            widget.tag_configure(level, foreground=color)
+        self.redisplay()
+
+    def close(self):
+        self.writer.close()
+
+    # Logging
+
+    def log(self, message, level="INFO"):
+        record = LogRecord(datetime.now(), level, message)
+        self.records.append(record)
+        if not self.shown(record):
+            return
+        self.writer.write(format_record(record))
+        self.pending.append(record)
+        self.schedule_flush()
+
+    def shown(self, record):
+        return LEVEL_RANK.get(record.level, 0) >= LEVEL_RANK[self.level]
+
+    def set_level(self, level):
+        """Change the level filter and redisplay the buffered records that pass it"""
+        self.level = level
+        self.redisplay()
+
+    # Widget output
+
+    def schedule_flush(self):
+        if self.flush_scheduled or self.widget is None:
+            return
+        self.flush_scheduled = True
+        delay = self.last_flush + self.flush_interval - time.monotonic()
+        self.root.after(max(0, int(delay * 1000)), self.flush)
+
+    def flush(self):
+        """Insert all pending records into the widget in one call"""
+        self.flush_scheduled = False
+        self.last_flush = time.monotonic()
+        if not self.pending or self.widget is None:
+            return
+
+        chunks = []
+        for record in self.pending:
+            chunks.extend((format_record(record) + "\n", record.level))
+        self.widget.insert(tk.END, *chunks)
+        self.widget_lines += len(self.pending)
+        self.pending.clear()
+
+        if self.widget_lines > self.max_lines:
+            excess = self.widget_lines - self.max_lines
+            self.widget.delete("1.0", f"{excess + 1}.0")
+            self.widget_lines = self.max_lines
+        self.widget.see(tk.END)
+
+    def redisplay(self):
+        """Rebuild the widget from the ring buffer"""
+        self.pending.clear()
+        self.pending.extend(record for record in self.records if self.shown(record))
+        if self.widget is not None:
+            self.widget.delete("1.0", tk.END)
+            self.widget_lines = 0
+            self.flush()
@@ -0,0 +1,264 @@
+"""Crash-safe autosave journal for the mission being edited
+
+Instead of rewriting the whole mission after every change, Autosave keeps a
+snapshot of the mission plus an append-only journal of the edits made since:
+
+    autosave/snapshot-000007.wpb    mission state when generation 7 started
+    autosave/journal-000007.log     edits since then, one JSON array per line
+
+Mission reports each edit (see Mission.record): ["add", id, lat, lon, name],
+["remove", id], ["rename", id, name], ["takeoff", id], ["land", id] and
+["route", id] (route toggle). Recording an edit only encodes one short line
+and queues it, so its cost does not depend on the mission size. A background
+thread appends the queued lines in batches and fsyncs once per batch, at most
+every FLUSH_INTERVAL seconds, so a crash loses at most that much work.
+
+Bulk changes (loading, clearing, reordering the route) and journals that grew
+longer than the mission itself are compacted: the Tk thread copies the
+mission (mission_format.snapshot) and starts the next generation, and the
+writer thread saves the copy as a binary mission file and then deletes the
+older generations. Compaction costs O(mission size) at most once per
+mission-size edits, so the cost per edit stays constant.
+
+A clean exit deletes the autosave files. If they exist at startup the
+previous session crashed: recover() loads the newest snapshot and replays
+the journals written since.
+"""
+from collections import namedtuple
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from mission import Mission
+import mission_format
+
+AUTOSAVE_DIR = "autosave"
+JOURNAL_MAGIC = "DRONE-JOURNAL 1"
+FLUSH_INTERVAL = 0.5  # Seconds between journal fsyncs
+COMPACT_RECORDS = 1000  # Journal records before compacting (at least the number of waypoints)
+FILE_PATTERN = re.compile(r"^(snapshot|journal)-(\d{6})\.(wpb|log)$")
+
+Recovery = namedtuple('Recovery', ['mission', 'records', 'complete'])
+
+
+def snapshot_path(directory, generation):
+    return os.path.join(directory, f"snapshot-{generation:06d}{mission_format.BINARY_EXTENSION}")
+
+
+def journal_path(directory, generation):
+    return os.path.join(directory, f"journal-{generation:06d}.log")
+
+
+def autosave_files(directory):
+    """{generation: {'snapshot': path, 'journal': path}} of the autosave files in a directory"""
+    generations = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return generations
+    for name in names:
+        match = FILE_PATTERN.match(name)
+        if match:
+            generations.setdefault(int(match.group(2)), {})[match.group(1)] = os.path.join(directory, name)
+    return generations
+
+
+def encode_record(edit):
+    return json.dumps(edit, separators=(',', ':'), ensure_ascii=False) + "\n"
+
+
+def apply_record(mission, edit):
+    """Replay one journaled edit on a mission; raises ValueError if it does not apply"""
+    op, *args = edit
+    if op == 'add':
+        waypoint_id, lat, lon, name = args
+        if waypoint_id in mission.waypoints:
+            raise ValueError(f"Waypoint {waypoint_id} already exists")
+        mission.add_waypoint(lat, lon, name=name, waypoint_id=waypoint_id)
+        return
+    waypoint = mission.waypoints.get(args[0])
+    if waypoint is None:
+        raise ValueError(f"Unknown waypoint {args[0]}")
+    if op == 'remove':
+        mission.remove_waypoint(waypoint)
+    elif op == 'rename':
+        mission.rename_waypoint(waypoint, args[1])
+    elif op == 'takeoff':
+        mission.set_takeoff(waypoint)
+    elif op == 'land':
+        mission.set_land(waypoint)
+    elif op == 'route':
+        mission.toggle_route(waypoint)
+    else:
+        raise ValueError(f"Unknown journal record {op!r}")
+
+
+def read_journal(path):
+    """Edits of a journal file; a torn last line (crash while writing) is ignored"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if f.readline().rstrip("\n") != JOURNAL_MAGIC:
+            raise ValueError(f"Not an autosave journal: {path}")
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            yield json.loads(line)
+
+
+def has_recovery(directory=AUTOSAVE_DIR):
+    """True if a previous session left autosave files behind (it did not exit cleanly)"""
+    return bool(autosave_files(directory))
+
+
+def recover(directory=AUTOSAVE_DIR):
+    """Rebuild the autosaved mission: newest snapshot plus the journals written since
+
+    Returns Recovery(mission, replayed records, complete). complete is False
+    if replay had to stop early, e.g. at a bulk change whose snapshot was not
+    written before the crash.
+    """
+    generations = autosave_files(directory)
+    snapshots = [generation for generation, files in generations.items() if 'snapshot' in files]
+    base = max(snapshots, default=min(generations, default=0))
+    mission = Mission.load(generations[base]['snapshot']) if base in snapshots else Mission()
+
+    records = 0
+    for generation in sorted(g for g in generations if g >= base):
+        path = generations[generation].get('journal')
+        if path is None:
+            continue
+        try:
+            for edit in read_journal(path):
+                if edit[0] == 'reset':
+                    # The bulk change is only in the next snapshot, which was never completed
+                    return Recovery(mission, records, False)
+                apply_record(mission, edit)
+                records += 1
+        except (ValueError, TypeError, IndexError):
+            return Recovery(mission, records, False)
+    return Recovery(mission, records, True)
+
+
+class JournalWriter:
+    """Appends journal lines and writes snapshots on a daemon thread"""
+
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.error = None  # Last write error (writing continues with the next batch)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            items = [self.queue.get()]
+            try:
+                while True:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = []
+            for item in items:
+                if isinstance(item, str):
+                    lines.append(item)
+                    continue
+                self.write_lines(lines)
+                lines = []
+                if item[0] == 'close':
+                    self.finish(item[1])
+                    return
+                self.start_generation(*item[1:])
+            self.write_lines(lines)
+            time.sleep(self.flush_interval)  # Let the next batch of edits accumulate
+
+    def write_lines(self, lines):
+        if not lines or not self.file:
+            return
+        try:
+            self.file.write("".join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            self.error = e
+
+    def start_generation(self, generation, snap):
+        """Switch to a new journal, save its base snapshot, then drop older generations"""
+        try:
+            if self.file:
+                self.file.close()
+            self.file = open(journal_path(self.directory, generation), 'w', encoding='utf-8')
+            self.file.write(JOURNAL_MAGIC + "\n")
+            self.file.flush()
+            mission_format.write_snapshot(snap, snapshot_path(self.directory, generation))
+            for old, files in autosave_files(self.directory).items():
+                if old < generation:
+                    for path in files.values():
+                        os.unlink(path)
+        except OSError as e:
+            self.error = e
+
+    def finish(self, discard):
+        if self.file:
+            self.file.close()
+            self.file = None
+        if discard:
+            for files in autosave_files(self.directory).values():
+                for path in files.values():
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    def close(self, discard, timeout=5.0):
+        self.queue.put(('close', discard))
+        self.thread.join(timeout)
+
+
+class Autosave:
+    """Journals the edits of the attached mission (Tk thread side)"""
+
+    def __init__(self, directory=AUTOSAVE_DIR, compact_records=COMPACT_RECORDS, flush_interval=FLUSH_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_records = compact_records
+        self.generation = max(autosave_files(directory), default=0)
+        self.mission = None
+        self.records = 0  # Records in the current generation's journal
+        self.writer = JournalWriter(directory, flush_interval)
+
+    def attach(self, mission):
+        """Journal a mission from now on, starting with a snapshot of it"""
+        if self.mission is not None and self.mission is not mission:
+            self.mission.journal = None
+        self.mission = mission
+        mission.journal = self
+        self.compact()
+
+    def record(self, edit):
+        """Queue one edit (called by Mission)"""
+        self.writer.queue.put(encode_record(edit))
+        self.records += 1
+        if self.records >= max(self.compact_records, len(self.mission.waypoints)):
+            self.compact()
+
+    def reset(self, mission):
+        """A bulk change the journal cannot express: start a new snapshot (called by Mission)"""
+        self.writer.queue.put(encode_record(['reset']))
+        self.compact()
+
+    def compact(self):
+        """Start a new generation from a snapshot of the mission"""
+        self.generation += 1
+        self.records = 0
+        self.writer.queue.put(('generation', self.generation, mission_format.snapshot(self.mission)))
+
+    def close(self, discard=True):
+        """Write out queued edits and stop; discard deletes the autosave files (clean exit)"""
+        if self.mission is not None:
+            self.mission.journal = None
+        self.writer.close(discard)
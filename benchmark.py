@@ -0,0 +1,480 @@
+"""Benchmark suite for the mission planner's hot paths
+
+Runs reproducible benchmarks against synthetic missions (seeded random
+waypoints around San Francisco) of 10, 1k, 10k and 100k waypoints and writes
+the timings as JSON, so results of two versions can be compared:
+
+    python benchmark.py                          # headless core benchmarks
+    python benchmark.py --tk                     # also time the Tk-bound GUI paths
+    python benchmark.py --sizes 10 1000 --output new.json --compare old.json
+
+The headless suite exercises the display-free Mission core. --tk builds the
+real DroneControlGUI and times widget-bound paths (list refresh, marker
+rendering, route toggles, removal, save/load). It needs a display; without
+one an Xvfb server is started automatically if the Xvfb binary is installed.
+"""
+import argparse
+from collections import namedtuple
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import autosave
+import elevation
+import fleet
+import geodesy
+import geofence
+from mission import Mission
+from route_layer import RouteLayer, simplification_ranks
+from route_metrics import RouteMetrics
+from spatial_index import mercator
+import survey
+
+SIZES = (10, 1000, 10000, 100000)
+SEED = 1234
+CENTER = (37.7749, -122.4194)  # Synthetic missions are scattered around this point
+SPREAD = 0.5  # Degrees
+ROUTE_FRACTION = 0.5  # Share of waypoints placed on the route
+MIN_SECONDS = 0.2  # Minimum measuring time per benchmark
+MAX_REPEAT = 1000
+GEOFENCES = 2000  # Synthetic no-fly zones for the geofence benchmarks
+TERRAIN_ROUTE = ((CENTER[0] - 0.1, CENTER[1] - 0.25), (CENTER[0] + 0.1, CENTER[1] + 0.25))  # About 50 km
+REGRESSION_RATIO = 1.25  # --compare flags benchmarks this much slower
+
+BenchmarkResult = namedtuple('BenchmarkResult', ['name', 'size', 'repeat', 'min_ms', 'median_ms', 'mean_ms'])
+
+
+def synthetic_mission_data(size, seed=SEED):
+    """Mission file data with size random waypoints, takeoff, landing and a route"""
+    rng = np.random.default_rng(seed + size)
+    lats = CENTER[0] + rng.uniform(-SPREAD, SPREAD, size)
+    lons = CENTER[1] + rng.uniform(-SPREAD, SPREAD, size)
+    ids = list(range(1, size + 1))
+    route = ids[2:2 + int(size * ROUTE_FRACTION)]
+    return {
+        'timestamp': "2000-01-01T00:00:00",
+        'waypoints': [
+            {'id': wp_id, 'name': f"WP{wp_id}", 'lat': lat, 'lon': lon, 'type': 'normal'}
+            for wp_id, lat, lon in zip(ids, lats.tolist(), lons.tolist())
+        ],
+        'takeoff_id': 1 if size > 0 else None,
+        'land_id': 2 if size > 1 else None,
+        'route': route
+    }
+
+
+def synthetic_geofences(count=GEOFENCES, seed=SEED):
+    """Random octagonal no-fly zones of 100-800 m radius scattered like the waypoints"""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    fences = []
+    for k in range(count):
+        lat = CENTER[0] + rng.uniform(-SPREAD, SPREAD)
+        lon = CENTER[1] + rng.uniform(-SPREAD, SPREAD)
+        radius = rng.uniform(100, 800) / survey.METERS_PER_DEGREE
+        fences.append(geofence.Geofence(
+            f"Zone {k + 1}", lat + radius * np.sin(angles), lon + radius * np.cos(angles) / np.cos(np.radians(lat))
+        ))
+    return fences
+
+
+def synthetic_dem(folder):
+    """SRTM 3 arc-second tiles of rolling synthetic terrain covering the synthetic missions"""
+    os.makedirs(folder, exist_ok=True)
+    samples = np.linspace(0.0, 1.0, 1201)
+    for south in range(int(np.floor(CENTER[0] - SPREAD)), int(np.floor(CENTER[0] + SPREAD)) + 1):
+        for west in range(int(np.floor(CENTER[1] - SPREAD)), int(np.floor(CENTER[1] + SPREAD)) + 1):
+            path = os.path.join(folder, f"N{south:02d}W{-west:03d}.hgt")
+            if os.path.exists(path):
+                continue
+            lats, lons = south + 1 - samples[:, None], west + samples[None, :]
+            heights = 400 + 300 * np.sin(lats * 40) * np.cos(lons * 30)
+            heights.astype('>i2').tofile(path)
+    return folder
+
+
+def measure(name, size, run, setup=None, min_seconds=MIN_SECONDS, max_repeat=MAX_REPEAT):
+    """Time run(state) repeatedly; setup() builds a fresh state for each repetition"""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_repeat and (len(timings) < 3 or time.perf_counter() - started < min_seconds):
+        state = setup() if setup else None
+        t0 = time.perf_counter()
+        run(state)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return BenchmarkResult(
+        name, size, len(timings),
+        min(timings), statistics.median(timings), statistics.fmean(timings)
+    )
+
+
+# Headless benchmarks
+
+def core_benchmarks(size, tmpdir):
+    """Benchmarks of the display-free planning core"""
+    data = synthetic_mission_data(size)
+    mission = Mission.from_dict(data)
+    route = mission.full_route() if size > 1 else []
+    lats, lons = mission.waypoints.coordinates_of(route)
+    rng = np.random.default_rng(SEED)
+    path = os.path.join(tmpdir, f"mission_{size}.json")
+    text_path = os.path.join(tmpdir, f"mission_{size}.wpt")
+    binary_path = os.path.join(tmpdir, f"mission_{size}.wpb")
+    for filename in (path, text_path, binary_path):
+        mission.save(filename)
+
+    def calculate_distance_loop(_):
+        total = 0.0
+        for i in range(len(route) - 1):
+            total += geodesy.haversine(lats[i], lons[i], lats[i + 1], lons[i + 1])
+
+    def route_metrics_build(_):
+        metrics = RouteMetrics()
+        metrics.set_takeoff((lats[0], lons[0]))
+        metrics.set_land((lats[-1], lons[-1]))
+        metrics.extend(lats[1:-1], lons[1:-1])
+        return metrics.total
+
+    def route_metrics_edit(_):
+        middle = len(mission.route) // 2
+        mission.metrics.insert(middle, CENTER[0], CENTER[1])
+        mission.metrics.remove(middle)
+        return mission.metrics.total
+
+    def route_toggle(_):
+        waypoint = mission.waypoints[size // 2]
+        mission.toggle_route(waypoint)
+        mission.toggle_route(waypoint)
+
+    # Flight path checks against no-fly zones
+    fences = geofence.GeofenceIndex(synthetic_geofences())
+    fenced = Mission.from_dict(data)
+    fenced.set_geofences(fences)
+
+    def geofence_route_toggle(_):
+        waypoint = fenced.waypoints[size // 2]
+        fenced.toggle_route(waypoint)
+        fenced.toggle_route(waypoint)
+        fenced.validate()
+
+    # Terrain under a 50 km route of size waypoints
+    terrain = elevation.ElevationService(synthetic_dem(os.path.join(tmpdir, "dem")))
+    terrain_lats = np.linspace(TERRAIN_ROUTE[0][0], TERRAIN_ROUTE[1][0], max(size, 2))
+    terrain_lons = np.linspace(TERRAIN_ROUTE[0][1], TERRAIN_ROUTE[1][1], max(size, 2))
+
+    def remove_waypoints(state):
+        fresh, ids = state
+        for wp_id in ids:
+            fresh.remove_waypoint(fresh.waypoints.get(wp_id))
+
+    def remove_setup():
+        fresh = Mission.from_dict(data)
+        ids = rng.choice(np.arange(3, size + 1), min(100, size - 2), replace=False).tolist()
+        return fresh, ids
+
+    points = list(zip(
+        (CENTER[0] + rng.uniform(-SPREAD, SPREAD, 100)).tolist(),
+        (CENTER[1] + rng.uniform(-SPREAD, SPREAD, 100)).tolist()
+    ))
+
+    def spatial_nearest(_):
+        for lat, lon in points:
+            mission.spatial_index.nearest(lat, lon, 15, 12)
+
+    # Roughly a 1200x800 px map at zoom 12
+    center_x, center_y = mercator(*CENTER)
+    x, y = float(center_x) * 2 ** 12, float(center_y) * 2 ** 12
+
+    def viewport_query(_):
+        mission.spatial_index.query_tiles((x - 2.3, y - 1.6), (x + 2.3, y + 1.6), 12)
+
+    simulation = mission.simulate() if size > 1 else None
+    seek_times = rng.uniform(0.0, simulation.total_time if simulation else 0.0, 100).tolist()
+
+    def simulation_seek(_):
+        for t in seek_times:
+            simulation.state_at(t)
+
+    # Square survey area with about size points
+    half = SPREAD / 10
+    area = [(CENTER[0] - half, CENTER[1] - half), (CENTER[0] + half, CENTER[1] - half),
+            (CENTER[0] + half, CENTER[1] + half), (CENTER[0] - half, CENTER[1] + half)]
+    area_side_m = 2 * half * survey.METERS_PER_DEGREE * np.cos(np.radians(CENTER[0]))
+    survey_spacing = area_side_m / np.sqrt(size)
+
+    def survey_to_mission(_):
+        result = survey.generate_survey(area, survey_spacing, heading=30.0)
+        Mission().add_survey(result.lats, result.lons)
+
+    # Flight path simplification down to the deepest map zoom level
+    survey_route = survey.generate_survey(area, survey_spacing, heading=30.0)
+    survey_x, survey_y = mercator(survey_route.lats, survey_route.lons)
+    route_x, route_y = mercator(*mission.route_coordinates())
+    min_tolerance = RouteLayer.tolerance(19)
+
+    # Balanced split of all waypoints among 8 vehicles sharing the mission's takeoff and landing
+    all_lats, all_lons = mission.waypoints.coordinates()
+    plane_points = fleet.local_plane(all_lats, all_lons, CENTER)
+    fleet_bases = fleet.local_plane(np.full(8, lats[0]), np.full(8, lons[0]), CENTER)
+
+    results = [
+        measure("mission_from_dict", size, lambda _: Mission.from_dict(data)),
+        measure("mission_to_json", size, lambda _: json.dumps(mission.to_dict())),
+        measure("mission_save", size, lambda _: mission.save(path)),
+        measure("mission_load", size, lambda _: Mission.load(path)),
+        measure("mission_save_text", size, lambda _: mission.save(text_path)),
+        measure("mission_load_text", size, lambda _: Mission.load(text_path)),
+        measure("mission_save_binary", size, lambda _: mission.save(binary_path)),
+        measure("mission_load_binary", size, lambda _: Mission.load(binary_path)),
+        measure("spatial_nearest_x100", size, spatial_nearest),
+        measure("viewport_query", size, viewport_query),
+    ]
+    if size > 2:
+        results += [
+            measure("calculate_distance_loop", size, calculate_distance_loop),
+            measure("route_distances", size, lambda _: geodesy.route_distances(lats, lons)),
+            measure("route_distances_fast", size, lambda _: geodesy.route_distances(lats, lons, 'fast')),
+            measure("route_distances_ellipsoidal", size, lambda _: geodesy.route_distances(lats, lons, 'ellipsoidal')),
+            measure("route_metrics_build", size, route_metrics_build),
+            measure("route_metrics_edit", size, route_metrics_edit),
+            measure("mission_summary", size, lambda _: mission.summary()),
+            measure("mission_summary_ellipsoidal", size, lambda _: mission.summary('ellipsoidal')),
+            measure("mission_simulate", size, lambda _: mission.simulate()),
+            measure("simulation_seek_x100", size, simulation_seek),
+            measure("survey_generate", size, lambda _: survey.generate_survey(area, survey_spacing, heading=30.0)),
+            measure("survey_to_mission", size, survey_to_mission),
+            measure("route_simplify", size, lambda _: simplification_ranks(route_x, route_y, min_tolerance)),
+            measure("survey_route_simplify", size,
+                    lambda _: simplification_ranks(survey_x, survey_y, min_tolerance)),
+            measure("fleet_cluster_x8", size,
+                    lambda _: fleet.cluster_waypoints(plane_points, fleet_bases, fleet_bases, 'time')),
+            measure("route_toggle", size, route_toggle),
+            measure("geofence_check_route", size, lambda _: fences.check_path(lats, lons)),
+            measure("geofence_route_toggle", size, geofence_route_toggle),
+            measure("terrain_profile_50km", size, lambda _: terrain.profile(terrain_lats, terrain_lons, 50.0)),
+            measure("remove_waypoint_x100", size, remove_waypoints, setup=remove_setup, max_repeat=20),
+        ]
+        # Journaled edits; compaction is amortized over as many edits as there are waypoints
+        journaled = Mission.from_dict(data)
+        journal = autosave.Autosave(os.path.join(tmpdir, f"autosave_{size}"))
+        journal.attach(journaled)
+        toggled = journaled.waypoints[size // 2]
+
+        def autosave_edit_x100(_):
+            for _ in range(50):
+                journaled.toggle_route(toggled)
+                journaled.toggle_route(toggled)
+
+        try:
+            results.append(measure("autosave_edit_x100", size, autosave_edit_x100))
+        finally:
+            journal.close()
+    return results
+
+
+# Tk benchmarks
+
+def ensure_display():
+    """Start an Xvfb server if there is no display; returns the process or None"""
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        return None
+    if not shutil.which('Xvfb'):
+        raise RuntimeError("No display available and Xvfb is not installed")
+    display = ":99"
+    process = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x1024x24'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1.0)
+    return process
+
+
+def tk_benchmarks(size, tmpdir):
+    """Benchmarks of the widget-bound GUI paths (needs a display)"""
+    import tkinter as tk
+    import drone_control_gui as gui
+
+    # Keep the run self-contained and non-interactive
+    gui.TILE_CACHE_PATH = os.path.join(tmpdir, "tiles.mbtiles")
+    gui.LOG_PATH = None
+    gui.AUTOSAVE_DIR = os.path.join(tmpdir, "gui_autosave")
+    gui.SESSION_PATH = os.path.join(tmpdir, "gui_session.json")
+    gui.messagebox.showinfo = gui.messagebox.showwarning = gui.messagebox.showerror = lambda *a, **k: None
+    gui.messagebox.askyesno = lambda *a, **k: True
+
+    data = synthetic_mission_data(size)
+    path = os.path.join(tmpdir, f"gui_mission_{size}.json")
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    gui.filedialog.askopenfilename = lambda **k: path
+
+    root = tk.Tk()
+    app = gui.DroneControlGUI(root)
+    app.activity_log.writer.console = False
+    while app.map_widget is None or not app.session_ready:  # The map is built after the first paint
+        root.update()
+        time.sleep(0.001)
+
+    def process_events():
+        root.update_idletasks()
+        root.update()
+
+    def wait_for_file_operation():
+        # Save and load run on a worker thread; time them until the result is applied
+        while app.file_operation:
+            process_events()
+            time.sleep(0.001)
+
+    def load_mission(_):
+        app.load_mission()
+        wait_for_file_operation()
+        process_events()
+
+    def save_mission(_):
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            app.save_mission()
+            wait_for_file_operation()
+        finally:
+            os.chdir(cwd)
+
+    def update_display(_):
+        app.update_waypoint_display()
+        process_events()
+
+    def marker_refresh(_):
+        app.marker_layer.clear()
+        app.marker_layer.refresh()
+        process_events()
+
+    def route_toggle(_):
+        app.waypoint_listbox.selection_set(size // 2)
+        app.add_to_route()
+        app.add_to_route()
+        process_events()
+
+    def remove_waypoints(_):
+        for _ in range(min(10, len(app.waypoints) - 3)):
+            app.remove_waypoint(app.waypoints[3])
+        process_events()
+
+    def route_pan(_):
+        # Small drags stay within the culled margin of the flight path
+        for dx in (0.05, -0.05) * 5:
+            app.map_widget.upper_left_tile_pos = (app.map_widget.upper_left_tile_pos[0] + dx,
+                                                  app.map_widget.upper_left_tile_pos[1])
+            app.map_widget.lower_right_tile_pos = (app.map_widget.lower_right_tile_pos[0] + dx,
+                                                   app.map_widget.lower_right_tile_pos[1])
+            app.map_widget.draw_move()
+        process_events()
+
+    def route_zoom(_):
+        app.map_widget.set_zoom(13)
+        app.map_widget.set_zoom(12)
+        process_events()
+
+    try:
+        results = [measure("gui_load_mission", size, load_mission, max_repeat=10)]
+        app.map_widget.set_position(*CENTER)
+        app.map_widget.set_zoom(12)
+        process_events()
+        results += [
+            measure("gui_save_mission", size, save_mission, max_repeat=10),
+            measure("gui_update_waypoint_display", size, update_display),
+            measure("gui_marker_refresh", size, marker_refresh, max_repeat=50),
+        ]
+        if size > 2:
+            app.route_layer.update()
+            results += [
+                measure("gui_route_pan_x10", size, route_pan),
+                measure("gui_route_zoom_x2", size, route_zoom, max_repeat=50),
+                measure("gui_add_to_route_toggle", size, route_toggle),
+                measure("gui_remove_waypoint_x10", size, remove_waypoints, max_repeat=10),
+            ]
+    finally:
+        app.autosave.close()
+        app.activity_log.close()
+        root.destroy()
+    return results
+
+
+# Reporting
+
+def environment():
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine()
+    }
+
+
+def compare(results, baseline_path, stream=sys.stdout):
+    """Print timing ratios against a previous results file; returns the regressed benchmarks"""
+    with open(baseline_path, 'r') as f:
+        baseline = {(r['name'], r['size']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"\nComparison with {baseline_path} (best run, new / old):", file=stream)
+    for result in results:
+        old = baseline.get((result.name, result.size))
+        if not old or not old['min_ms']:
+            continue
+        ratio = result.min_ms / old['min_ms']
+        flag = ""
+        if ratio > REGRESSION_RATIO:
+            flag = "  REGRESSION"
+            regressions.append(result)
+        print(f"  {result.name:<30} {result.size:>7}  {old['min_ms']:>10.3f} -> "
+              f"{result.min_ms:>10.3f} ms  x{ratio:.2f}{flag}", file=stream)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mission planner's hot paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Waypoint counts")
+    parser.add_argument('--tk', action='store_true', help="Also run the Tk-bound GUI benchmarks")
+    parser.add_argument('--output', '-o', default="benchmark_results.json", help="Results JSON file")
+    parser.add_argument('--compare', '-c', help="Previous results JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    xvfb = ensure_display() if args.tk else None
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for size in args.sizes:
+                suites = [core_benchmarks] + ([tk_benchmarks] if args.tk else [])
+                for suite in suites:
+                    for result in suite(size, tmpdir):
+                        print(f"{result.name:<30} {result.size:>7}  median {result.median_ms:>10.3f} ms  "
+                              f"min {result.min_ms:>10.3f} ms  ({result.repeat} runs)")
+                        results.append(result)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    report = {
+        'environment': environment(),
+        'mode': "tk" if args.tk else "headless",
+        'results': [result._asdict() for result in results]
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
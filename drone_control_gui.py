@@ -1,33 +1,288 @@
+import time
+
+STARTUP_CLOCK = time.perf_counter()  # Startup times are measured from here, before the imports below
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-import tkintermapview as tkmap
 from datetime import datetime
+import importlib
 import json
-import math
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+
+from activity_log import ActivityLog, LEVELS
+from fence_layer import FenceLayer
+import geodesy
+import geofence
+import flight_sim
+from mission import Mission
+import mission_format
+from playback_layer import PlaybackLayer, SPEEDS as PLAYBACK_SPEEDS
+from profiler import PROFILER, EventLoopProbe, ProfilerOverlay, timed
+import route_optimizer
+import session
+from marker_layer import MarkerLayer, MARKER_COLORS
+from route_layer import RouteLayer
+from vehicle_layer import VehicleLayer, VEHICLE_COLORS
+from waypoint_list import VirtualListbox
+
+CLICK_SELECT_RADIUS = 12  # Pixels around a click in which a waypoint is selected
+TILE_CACHE_PATH = "map_tiles.mbtiles"  # Offline map tile cache
+TILE_SERVER = os.environ.get("DRONE_TILE_SERVER")  # Tile URL template ("{z}/{x}/{y}"); None for OpenStreetMap
+PREFETCH_ZOOMS = range(10, 17)  # Zoom levels downloaded by "Prefetch Map Area"
+MAX_PREFETCH_TILES = 20000  # Larger prefetches must be confirmed
+LOG_PATH = "drone_control.log"  # Activity log file (appended)
+AUTOSAVE_DIR = None  # Crash-recovery journal of the current mission; None for autosave.AUTOSAVE_DIR
+TELEMETRY_ADDRESS = None  # Telemetry source (udp://host:port or unix:///path); None for telemetry.DEFAULT_ADDRESS
+DEM_DIR = "dem"  # Local elevation tiles (SRTM .hgt / GeoTIFF) for ground clearance
+SESSION_PATH = session.SESSION_PATH  # Viewport and mission restored at the next start
+MAP_MODULES = ("tkintermapview", "tile_cache", "autosave", "elevation")  # Imported on a worker thread after the first paint
+MAP_IMPORT_POLL = 20  # ms between checks whether the map modules are imported
+STARTUP_BUDGET = 1.0  # Seconds until the panels are shown; slower starts are logged as warnings
 
 
 class DroneControlGUI:
     def __init__(self, root):
+        self.startup_times = {'init': time.perf_counter() - STARTUP_CLOCK}  # Milestone -> seconds
         self.root = root
         self.root.title("Drone Control System")
         self.root.geometry("1200x800")
         self.root.configure(bg='black')
         
-        # Mission data
-        self.waypoints = []
+        # Activity log (buffered; widget attached in setup_log_panel)
+        self.activity_log = ActivityLog(self.root, path=LOG_PATH)
+        
+        # Mission data and plan (display-free core)
+        self.mission = Mission()
+        self.waypoints = self.mission.waypoints  # Columnar waypoint table with id index
+        self.spatial_index = self.mission.spatial_index  # Grid index for map queries
         self.add_waypoint_mode = False
+        self.survey_corners = None  # Corners of the survey area while it is being drawn
+        self.survey_polygon = None  # Map polygon of the survey area
+        
+        # No-fly zones the flight path is checked against (kept across missions)
+        self.geofences = geofence.GeofenceIndex()
+        self.mission.set_geofences(self.geofences)
+        self.fence_corners = None  # Corners of a no-fly zone while it is being drawn
+        self.fence_polygon = None  # Map polygon of the zone being drawn
         self.mission_active = False
-        self.marker_counter = 0
-        self.markers = []
         
-        # Mission planning
-        self.takeoff_waypoint = None
-        self.land_waypoint = None
-        self.route_waypoints = []  # Waypoints in the flight path
-        
-        # Setup UI
+        # Terrain elevation from local DEM tiles (headers are read with the map modules, samples on demand)
+        self.elevation = None
+        
+        # Route optimizer (runs on a worker thread)
+        self.optimizer_time_budget = route_optimizer.DEFAULT_TIME_BUDGET
+        self.optimizer_thread = None
+        self.optimizer_cancel = threading.Event()
+        self.optimizer_queue = queue.Queue()
+        self.optimizer_snapshot = None
+        
+        # Fleet planning (vehicle routes are optimized in worker processes)
+        self.fleet_thread = None
+        self.fleet_cancel = threading.Event()
+        self.fleet_queue = queue.Queue()
+        self.fleet_snapshot = None
+        self.fleet_layers = []  # Route line of every vehicle of the shown fleet plan
+        
+        # Map tile prefetch (runs on a worker thread)
+        self.tile_cache = None
+        self.prefetch_thread = None
+        self.prefetch_cancel = threading.Event()
+        self.prefetch_queue = queue.Queue()
+        
+        # Mission file save/load (runs on a worker thread)
+        self.file_operation = None  # 'save' or 'load' while one is running
+        self.file_thread = None
+        self.file_cancel = threading.Event()
+        self.file_queue = queue.Queue()
+        
+        # Autosave journal of every edit (written on a background thread)
+        self.autosave = None
+        
+        # Live telemetry (received on a background asyncio loop)
+        self.telemetry = None
+        
+        # Simulated flight playback window
+        self.playback_window = None
+        self.playback_names = []  # Route point names of the simulation being played
+        
+        # Hot-path profiling (spans are only recorded while the overlay is shown)
+        self.profiler_probe = None
+        self.profiler_overlay = None
+        
+        # Map (built after the first paint, once its modules are imported on a worker thread)
+        self.map_widget = None
+        self.map_thread = None
+        self.map_import_error = None
+        
+        # Previous session (restored once the map is up, saved on close)
+        self.restoring_session = False  # The session's mission is being loaded
+        self.session_ready = False  # Closing may overwrite the saved session
+        
+        # Setup UI; the map follows in start_map
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.log_message("System initialized successfully", "INFO")
+        self.startup_times['panels'] = time.perf_counter() - STARTUP_CLOCK
+        self.root.after_idle(self.start_map)
+        
+    # Startup
+    
+    def start_map(self):
+        """After the panels are drawn, import the map modules and read the DEM headers on a worker thread"""
+        self.root.update_idletasks()  # Finish the first paint
+        self.startup_times['first_paint'] = time.perf_counter() - STARTUP_CLOCK
+        self.map_thread = threading.Thread(target=self.import_map_modules, daemon=True)
+        self.map_thread.start()
+        self.root.after(MAP_IMPORT_POLL, self.poll_map_import)
+        
+    def import_map_modules(self):
+        """Map import worker thread (nothing here touches Tk)"""
+        try:
+            for name in MAP_MODULES:
+                importlib.import_module(name)
+        except Exception as e:
+            self.map_import_error = e
+            return
+        import elevation
+        self.elevation = elevation.ElevationService(DEM_DIR)
+            
+    def poll_map_import(self):
+        """Build the map once its modules are imported, then restore the previous session"""
+        if self.map_thread.is_alive():
+            self.root.after(MAP_IMPORT_POLL, self.poll_map_import)
+            return
+        self.startup_times['map_import'] = time.perf_counter() - STARTUP_CLOCK
+        if self.map_import_error is not None:
+            self.map_placeholder.config(text="Map unavailable")
+            self.log_message(f"Map unavailable: {str(self.map_import_error)}", "ERROR")
+            return
+        
+        self.setup_map()
+        self.setup_profiler()
+        self.set_controls_state(tk.NORMAL)
+        self.startup_times['map'] = time.perf_counter() - STARTUP_CLOCK
+        self.report_startup()
+        for name, error in self.elevation.errors:
+            self.log_message(f"Elevation tile {name} skipped: {error}", "WARNING")
+        
+        # A mission recovered after a crash is newer than the saved session
+        if self.setup_autosave():
+            self.session_ready = True
+        else:
+            self.restore_session()
+            
+    def report_startup(self):
+        """Log the startup milestones and check the startup budget"""
+        times = {name: seconds * 1000 for name, seconds in self.startup_times.items()}
+        self.log_message(
+            f"Startup: panels shown after {times['first_paint']:.0f} ms (imports and Tk {times['init']:.0f} ms, "
+            f"panels {times['panels'] - times['init']:.0f} ms), map ready after {times['map']:.0f} ms "
+            f"(map modules and DEM headers {times['map_import'] - times['first_paint']:.0f} ms in the background, "
+            f"widget {times['map'] - times['map_import']:.0f} ms)", "INFO"
+        )
+        if times['first_paint'] > STARTUP_BUDGET * 1000:
+            self.log_message(
+                f"Startup over budget: panels shown after {times['first_paint']:.0f} ms "
+                f"(budget {STARTUP_BUDGET * 1000:.0f} ms)", "WARNING"
+            )
+            
+    def set_controls_state(self, state):
+        """Enable (tk.NORMAL) or disable (tk.DISABLED) every button of the control panel"""
+        widgets = [self.control_frame]
+        while widgets:
+            widget = widgets.pop()
+            widgets.extend(widget.winfo_children())
+            if isinstance(widget, (tk.Button, ttk.Button)):
+                widget.config(state=state)
+                
+    def restore_session(self):
+        """Restore the previous session's viewport and load its mission in the background"""
+        try:
+            saved = session.load_session(SESSION_PATH)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Previous session not restored: {str(e)}", "WARNING")
+            saved = None
+        if saved is None:
+            self.session_ready = True
+            return
+        
+        self.map_widget.set_position(*saved.position)
+        self.map_widget.set_zoom(round(saved.zoom))
+        if saved.mission_path and os.path.exists(saved.mission_path):
+            self.restoring_session = True
+            self.start_file_operation('load', self.run_load_mission, (saved.mission_path,))
+            self.log_message("Restoring the previous session's mission...", "INFO")
+        else:
+            self.session_ready = True
+            
+    def finish_session_restore(self, kind, payload):
+        """Show the previous session's mission loaded by the worker thread"""
+        self.restoring_session = False
+        self.session_ready = True
+        if kind == 'cancelled':
+            self.log_message("Previous session's mission not restored (cancelled)", "WARNING")
+        elif kind != 'done':
+            self.log_message(f"Previous session's mission not restored: {str(payload)}", "ERROR")
+        elif self.waypoints:
+            self.log_message("Previous session's mission not restored: a new mission was started", "WARNING")
+        else:
+            self.set_mission(payload[0])
+            self.startup_times['session'] = time.perf_counter() - STARTUP_CLOCK
+            self.log_message(
+                f"Previous session restored: {len(self.waypoints)} waypoints, "
+                f"after {self.startup_times['session'] * 1000:.0f} ms", "SUCCESS"
+            )
+            
+    def on_close(self):
+        """Save the viewport and mission for the next start, then close the window"""
+        if self.map_widget is not None and self.session_ready:
+            try:
+                session.save_session(self.mission, self.map_widget.get_position(), self.map_widget.zoom, SESSION_PATH)
+            except OSError as e:
+                self.log_message(f"Session not saved: {str(e)}", "WARNING")
+        self.root.destroy()
+        
+    def setup_autosave(self):
+        """Offer to recover a crashed session's mission, then journal every edit
+        
+        Returns True if a recovered mission was loaded.
+        """
+        import autosave  # Imported with the map (see start_map)
+        
+        folder = AUTOSAVE_DIR or autosave.AUTOSAVE_DIR
+        recovery = None
+        if autosave.has_recovery(folder) and messagebox.askyesno(
+            "Recover Mission",
+            "The previous session did not exit cleanly.\nRecover its autosaved mission?"
+        ):
+            try:
+                recovery = autosave.recover(folder)
+            except (OSError, ValueError) as e:
+                self.log_message(f"Autosave recovery failed: {str(e)}", "ERROR")
+        
+        try:
+            self.autosave = autosave.Autosave(folder)
+        except OSError as e:
+            self.log_message(f"Autosave unavailable: {str(e)}", "WARNING")
+        
+        if recovery:
+            self.set_mission(recovery.mission)
+            if self.waypoints:
+                self.map_widget.set_position(self.waypoints[0].lat, self.waypoints[0].lon)
+            level = "SUCCESS" if recovery.complete else "WARNING"
+            status = "" if recovery.complete else " (the last changes could not be recovered)"
+            self.log_message(
+                f"Recovered mission: {len(self.waypoints)} waypoints, "
+                f"{recovery.records} journaled edits replayed{status}", level
+            )
+        elif self.autosave:
+            self.autosave.attach(self.mission)
+        return recovery is not None
         
     def setup_ui(self):
         """Setup the main user interface"""
@@ -55,12 +310,16 @@ class DroneControlGUI:
         self.setup_coordinate_display(left_panel)
         self.setup_waypoint_list(left_panel)
         self.setup_log_panel(left_panel)
-        self.setup_map(right_panel)
+        self.setup_map_frame(right_panel)
+        
+        # The controls need the map
+        self.set_controls_state(tk.DISABLED)
         
     def setup_control_buttons(self, parent):
         """Setup control buttons panel"""
         control_frame = ttk.LabelFrame(parent, text="Drone Controls", padding=10)
         control_frame.pack(fill=tk.X, pady=(0, 10))
+        self.control_frame = control_frame
         
         # Button configurations
         buttons = [
@@ -94,6 +353,61 @@ class DroneControlGUI:
             command=self.toggle_waypoint_mode
         ).pack(fill=tk.X, pady=2)
         
+        self.survey_button = ttk.Button(
+            additional_frame,
+            text="Survey Area",
+            command=self.toggle_survey_mode
+        )
+        self.survey_button.pack(fill=tk.X, pady=2)
+        
+        self.optimize_button = ttk.Button(
+            additional_frame,
+            text="Optimize Route",
+            command=self.optimize_route
+        )
+        self.optimize_button.pack(fill=tk.X, pady=2)
+        
+        self.fleet_button = ttk.Button(
+            additional_frame,
+            text="Plan Fleet",
+            command=self.plan_fleet
+        )
+        self.fleet_button.pack(fill=tk.X, pady=2)
+        
+        self.geofence_button = ttk.Button(
+            additional_frame,
+            text="No-Fly Zones",
+            command=self.show_geofence_menu
+        )
+        self.geofence_button.pack(fill=tk.X, pady=2)
+        
+        ttk.Button(
+            additional_frame,
+            text="Simulate Mission",
+            command=self.simulate_mission
+        ).pack(fill=tk.X, pady=2)
+        
+        self.prefetch_button = ttk.Button(
+            additional_frame,
+            text="Prefetch Map Area",
+            command=self.prefetch_map_area
+        )
+        self.prefetch_button.pack(fill=tk.X, pady=2)
+        
+        self.telemetry_button = ttk.Button(
+            additional_frame,
+            text="Connect Telemetry",
+            command=self.toggle_telemetry
+        )
+        self.telemetry_button.pack(fill=tk.X, pady=2)
+        
+        self.profiler_button = ttk.Button(
+            additional_frame,
+            text="Performance",
+            command=self.show_profiler_menu
+        )
+        self.profiler_button.pack(fill=tk.X, pady=2)
+        
         button_row = ttk.Frame(control_frame)
         button_row.pack(fill=tk.X, pady=(5, 0))
         
@@ -103,17 +417,19 @@ class DroneControlGUI:
             command=self.clear_waypoints
         ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
         
-        ttk.Button(
+        self.save_button = ttk.Button(
             button_row,
             text="Save",
             command=self.save_mission
-        ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        )
+        self.save_button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
         
-        ttk.Button(
+        self.load_button = ttk.Button(
             button_row,
             text="Load",
             command=self.load_mission
-        ).pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(2, 0))
+        )
+        self.load_button.pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(2, 0))
         
     def setup_coordinate_display(self, parent):
         """Setup coordinate display panel"""
@@ -131,25 +447,19 @@ class DroneControlGUI:
         waypoint_frame = ttk.LabelFrame(parent, text="Mission Waypoints (Double-click to navigate)", padding=10)
         waypoint_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         
-        # Create listbox instead of scrolled text for better interaction
-        listbox_frame = tk.Frame(waypoint_frame, bg="#1a1a1a")
-        listbox_frame.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = tk.Scrollbar(listbox_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.waypoint_listbox = tk.Listbox(
-            listbox_frame,
+        # Virtualized listbox: only the visible rows exist as Listbox items
+        self.waypoint_listbox = VirtualListbox(
+            waypoint_frame,
+            row_text=self.waypoint_row_text,
+            empty_text="No waypoints added yet.",
             height=8,
             font=("Consolas", 9),
             bg="#1a1a1a",
             fg="#00ff00",
             selectbackground="#004400",
-            selectforeground="#00ff00",
-            yscrollcommand=scrollbar.set
+            selectforeground="#00ff00"
         )
-        self.waypoint_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.waypoint_listbox.yview)
+        self.waypoint_listbox.pack(fill=tk.BOTH, expand=True)
         
         # Bind double-click event
         self.waypoint_listbox.bind("<Double-Button-1>", self.on_waypoint_double_click)
@@ -171,6 +481,21 @@ class DroneControlGUI:
         log_frame = ttk.LabelFrame(parent, text="Activity Log", padding=10)
         log_frame.pack(fill=tk.BOTH, expand=True)
         
+        # Level filter
+        filter_row = ttk.Frame(log_frame)
+        filter_row.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_row, text="Show:").pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value=self.activity_log.level)
+        level_box = ttk.Combobox(
+            filter_row,
+            textvariable=self.log_level_var,
+            values=LEVELS,
+            state="readonly",
+            width=10
+        )
+        level_box.pack(side=tk.LEFT, padx=(5, 0))
+        level_box.bind("<<ComboboxSelected>>", lambda e: self.activity_log.set_level(self.log_level_var.get()))
+        
         self.log_display = scrolledtext.ScrolledText(
             log_frame,
             height=10,
@@ -179,23 +504,74 @@ class DroneControlGUI:
             fg="#00ff00"
         )
         self.log_display.pack(fill=tk.BOTH, expand=True)
+        self.activity_log.attach(self.log_display)
+        
+    def setup_map_frame(self, parent):
+        """Setup the map frame, empty until setup_map"""
+        self.map_frame = ttk.LabelFrame(parent, text="Mission Map", padding=10)
+        self.map_frame.pack(fill=tk.BOTH, expand=True)
+        self.map_placeholder = ttk.Label(self.map_frame, text="Loading map...", font=("Arial", 10))
+        self.map_placeholder.pack(expand=True)
         
-    def setup_map(self, parent):
-        """Setup interactive map"""
-        map_frame = ttk.LabelFrame(parent, text="Mission Map", padding=10)
-        map_frame.pack(fill=tk.BOTH, expand=True)
+    def setup_map(self):
+        """Setup interactive map (its modules are imported by then, see start_map)"""
+        import tkintermapview as tkmap
+        import tile_cache
         
         # Create map widget (default location: San Francisco)
-        self.map_widget = tkmap.TkinterMapView(map_frame, corner_radius=0)
+        self.map_placeholder.destroy()
+        self.map_widget = tkmap.TkinterMapView(self.map_frame, corner_radius=0)
         self.map_widget.pack(fill=tk.BOTH, expand=True)
         
+        # Serve tiles from the memory/disk cache so the map works offline
+        tile_server = TILE_SERVER or tile_cache.TILE_SERVER
+        if tile_server != self.map_widget.tile_server:
+            self.map_widget.set_tile_server(tile_server)
+            self.log_message(f"Map tiles from {tile_server}", "INFO")
+        try:
+            self.tile_cache = tile_cache.TileCache(TILE_CACHE_PATH, tile_server)
+            self.tile_cache.install(self.map_widget)
+        except Exception as e:
+            self.log_message(f"Tile cache unavailable, using online tiles only: {str(e)}", "WARNING")
+        
         # Set initial position
         self.map_widget.set_position(37.7749, -122.4194)
         self.map_widget.set_zoom(12)
         
+        # No-fly zones and flight path segments entering them
+        self.fence_layer = FenceLayer(self.map_widget, self.geofences, lambda: self.mission.geofence_crossings())
+        
+        # Flight path line, simplified for the zoom level
+        self.route_layer = RouteLayer(self.map_widget, lambda: self.mission.route_coordinates())
+        
+        # Markers are only created for the visible part of the map
+        self.marker_layer = MarkerLayer(self.map_widget, self.waypoints, self.spatial_index)
+        
+        # Live vehicle positions from telemetry
+        self.vehicle_layer = VehicleLayer(self.map_widget)
+        
+        # Playback of simulated flights
+        self.playback_layer = PlaybackLayer(self.map_widget, on_frame=self.update_playback_panel)
+        
         # Bind events
         self.map_widget.add_left_click_map_command(self.map_left_click)
         
+    def setup_profiler(self):
+        """Register the map, layer and log paths timed while the performance overlay is shown"""
+        PROFILER.instrument(
+            self.map_widget, ("draw_move", "draw_zoom", "update_canvas_tile_images", "request_image"), "map."
+        )
+        PROFILER.instrument(self.marker_layer, ("refresh",), "markers.")
+        PROFILER.instrument(self.route_layer, ("draw", "update"), "route_layer.")
+        PROFILER.instrument(self.fence_layer, ("draw", "update"), "fence_layer.")
+        PROFILER.instrument(self.vehicle_layer, ("frame",), "vehicles.")
+        PROFILER.instrument(self.playback_layer, ("frame",), "playback.")
+        PROFILER.instrument(self.activity_log, ("flush",), "log.")
+        self.profiler_probe = EventLoopProbe(self.root)
+        self.profiler_overlay = ProfilerOverlay(self.map_widget)
+        self.root.bind("<F12>", lambda e: self.toggle_profiler_overlay())
+        
+    @timed
     def map_left_click(self, coords):
         """Handle left click on map"""
         lat, lon = coords
@@ -204,10 +580,44 @@ class DroneControlGUI:
         self.lat_var.set(f"Latitude: {lat:.6f}")
         self.lon_var.set(f"Longitude: {lon:.6f}")
         
-        # Add waypoint if mode is active
-        if self.add_waypoint_mode:
+        # Add a zone or survey corner or a waypoint if a mode is active, otherwise select the waypoint under the click
+        if self.fence_corners is not None:
+            self.add_fence_corner(lat, lon)
+        elif self.survey_corners is not None:
+            self.add_survey_corner(lat, lon)
+        elif self.add_waypoint_mode:
             self.add_waypoint(lat, lon)
-            
+        else:
+            waypoint = self.find_waypoint_at(lat, lon)
+            if waypoint:
+                self.select_waypoint(waypoint)
+                
+    def find_waypoint_at(self, lat, lon, radius_px=CLICK_SELECT_RADIUS):
+        """Return the waypoint nearest to a map position within radius_px pixels, or None"""
+        waypoint_id = self.spatial_index.nearest(lat, lon, round(self.map_widget.zoom), radius_px)
+        if waypoint_id is None:
+            return None
+        return self.waypoints.get(waypoint_id)
+        
+    def select_waypoint(self, waypoint):
+        """Select a waypoint in the list and show its coordinates"""
+        row = self.waypoints.row_of(waypoint)
+        self.waypoint_listbox.selection_clear(0, tk.END)
+        self.waypoint_listbox.selection_set(row)
+        self.waypoint_listbox.activate(row)
+        
+        self.lat_var.set(f"Latitude: {waypoint.lat:.6f}")
+        self.lon_var.set(f"Longitude: {waypoint.lon:.6f}")
+        self.log_message(f"Selected {waypoint.name}", "INFO")
+        
+    def waypoints_in_view(self):
+        """Return ids of waypoints inside the visible map area"""
+        return self.spatial_index.query_tiles(
+            self.map_widget.upper_left_tile_pos,
+            self.map_widget.lower_right_tile_pos,
+            round(self.map_widget.zoom)
+        )
+        
     def toggle_waypoint_mode(self):
         """Toggle waypoint adding mode"""
         self.add_waypoint_mode = not self.add_waypoint_mode
@@ -218,56 +628,269 @@ class DroneControlGUI:
         else:
             self.log_message("Waypoint mode DEACTIVATED", "INFO")
             
+    def toggle_survey_mode(self):
+        """Start drawing a survey area, or finish it and open the survey settings"""
+        if self.survey_corners is None:
+            self.clear_survey_area()
+            self.survey_corners = []
+            self.survey_button.config(text="Finish Survey Area")
+            self.log_message("Survey mode ACTIVATED - Click on the map to add the corners of the area", "INFO")
+            return
+        
+        if len(self.survey_corners) < 3:
+            messagebox.showwarning("Survey Area", "Click at least three corners of the area on the map.")
+            return
+        self.survey_button.config(text="Survey Area")
+        self.show_survey_dialog()
+        
+    def add_survey_corner(self, lat, lon):
+        self.survey_corners.append((lat, lon))
+        if self.survey_polygon is not None:
+            self.survey_polygon.add_position(lat, lon)
+        elif len(self.survey_corners) >= 2:
+            self.survey_polygon = self.map_widget.set_polygon(
+                list(self.survey_corners),
+                outline_color="orange",
+                fill_color=None,
+                border_width=2
+            )
+            
+    def clear_survey_area(self):
+        """Leave survey mode and remove the area outline"""
+        self.survey_corners = None
+        self.survey_button.config(text="Survey Area")
+        if self.survey_polygon is not None:
+            self.survey_polygon.delete()
+            self.survey_polygon = None
+            
+    def show_survey_dialog(self):
+        """Ask for the survey pattern settings and generate it"""
+        import survey  # Imported on first use
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Survey Area")
+        dialog.geometry("300x190")
+        dialog.configure(bg='black')
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        fields = [
+            ("Line spacing (m):", survey.DEFAULT_LINE_SPACING),
+            ("Line heading (°):", survey.DEFAULT_HEADING),
+            ("Overlap (%):", survey.DEFAULT_OVERLAP * 100)
+        ]
+        form = ttk.Frame(dialog)
+        form.pack(pady=(10, 5))
+        variables = []
+        for row, (label, default) in enumerate(fields):
+            ttk.Label(form, text=label).grid(row=row, column=0, sticky=tk.W, pady=3)
+            variable = tk.StringVar(value=f"{default:g}")
+            ttk.Entry(form, textvariable=variable, width=10).grid(row=row, column=1, padx=(10, 0), pady=3)
+            variables.append(variable)
+        
+        def generate():
+            try:
+                spacing, heading, overlap = (float(variable.get()) for variable in variables)
+            except ValueError:
+                messagebox.showwarning("Survey Area", "Please enter numbers.", parent=dialog)
+                return
+            if self.generate_survey(spacing, heading, overlap / 100):
+                dialog.destroy()
+        
+        def cancel():
+            self.clear_survey_area()
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Generate", command=generate).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=cancel).pack(side=tk.LEFT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
+        dialog.bind("<Return>", lambda e: generate())
+        dialog.bind("<Escape>", lambda e: cancel())
+        
+    def generate_survey(self, spacing, heading, overlap):
+        """Add a survey of the drawn area to the mission; returns True on success"""
+        import survey
+        
+        # Continue from where the route currently ends
+        start = self.mission.route[-1] if self.mission.route else self.mission.takeoff
+        try:
+            result = survey.generate_survey(
+                self.survey_corners, spacing, heading, overlap,
+                start=(start.lat, start.lon) if start else None
+            )
+            if len(result.lats) == 0:
+                raise ValueError("The area is too small for the line spacing")
+        except ValueError as e:
+            messagebox.showwarning("Survey Area", str(e))
+            return False
+        
+        self.mission.add_survey(result.lats, result.lons)
+        self.clear_survey_area()
+        # Plan types changed in bulk; redraw the visible markers with their new colors
+        self.marker_layer.clear()
+        self.update_waypoint_display()
+        self.log_message(
+            f"Survey added: {len(result.lats)} waypoints on {result.lines} lines "
+            f"({spacing:g} m apart, heading {heading:g}°, points every {result.point_spacing:.1f} m)", "SUCCESS"
+        )
+        return True
+        
+    def show_geofence_menu(self):
+        """Show the no-fly zone actions, or finish the zone being drawn"""
+        if self.fence_corners is not None:
+            self.finish_fence_drawing()
+            return
+        
+        menu = tk.Menu(self.root, tearoff=0, bg='#2d2d2d', fg='white',
+                       activebackground='#404040', activeforeground='white')
+        menu.add_command(label="Draw Zone", command=self.start_fence_drawing)
+        menu.add_command(label="Load GeoJSON...", command=self.load_geofences)
+        menu.add_command(label="Save GeoJSON...", command=self.save_geofences)
+        menu.add_separator()
+        menu.add_command(label="Clear Zones", command=self.clear_geofences)
+        try:
+            menu.tk_popup(self.geofence_button.winfo_rootx(),
+                          self.geofence_button.winfo_rooty() + self.geofence_button.winfo_height())
+        finally:
+            menu.grab_release()
+            
+    def start_fence_drawing(self):
+        self.clear_fence_drawing()
+        self.fence_corners = []
+        self.geofence_button.config(text="Finish No-Fly Zone")
+        self.log_message("Zone drawing ACTIVATED - Click on the map to add the corners of the no-fly zone", "INFO")
+        
+    def add_fence_corner(self, lat, lon):
+        self.fence_corners.append((lat, lon))
+        if self.fence_polygon is not None:
+            self.fence_polygon.add_position(lat, lon)
+        elif len(self.fence_corners) >= 2:
+            self.fence_polygon = self.map_widget.set_polygon(
+                list(self.fence_corners),
+                outline_color="red",
+                fill_color=None,
+                border_width=2
+            )
+            
+    def finish_fence_drawing(self):
+        """Add the drawn zone to the geofences"""
+        if len(self.fence_corners) < 3:
+            messagebox.showwarning("No-Fly Zones", "Click at least three corners of the zone on the map.")
+            return
+        lats, lons = zip(*self.fence_corners)
+        self.clear_fence_drawing()
+        self.add_geofences([geofence.Geofence(f"Zone {len(self.geofences) + 1}", lats, lons)])
+        
+    def clear_fence_drawing(self):
+        """Leave zone drawing and remove the zone outline"""
+        self.fence_corners = None
+        self.geofence_button.config(text="No-Fly Zones")
+        if self.fence_polygon is not None:
+            self.fence_polygon.delete()
+            self.fence_polygon = None
+            
+    def add_geofences(self, fences):
+        """Add no-fly zones and re-check the whole flight path against the fences"""
+        self.geofences.extend(fences)
+        self.log_message(f"{len(fences)} no-fly zone(s) added, {len(self.geofences)} in total", "SUCCESS")
+        self.geofences_changed()
+        
+    def geofences_changed(self):
+        self.mission.set_geofences(self.geofences)
+        self.fence_layer.refresh()
+        self.fence_layer.schedule_update()
+        self.update_route_info()
+        crossings = self.mission.geofence_crossings()
+        if crossings:
+            self.log_message(f"Flight path enters no-fly zones on {len(crossings)} segment(s)", "WARNING")
+            
+    def load_geofences(self):
+        """Add the no-fly zones of a GeoJSON file"""
+        filename = filedialog.askopenfilename(
+            title="Load No-Fly Zones",
+            initialdir=".",
+            filetypes=[("GeoJSON files", "*.geojson *.json"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            fences = geofence.load_geojson(filename)
+            if not fences:
+                raise ValueError("The file contains no polygons")
+            self.add_geofences(fences)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("No-Fly Zones", f"Could not load {filename}:\n{str(e)}")
+            self.log_message(f"Loading no-fly zones failed: {str(e)}", "ERROR")
+            
+    def save_geofences(self):
+        """Write the no-fly zones to a GeoJSON file"""
+        if not len(self.geofences):
+            messagebox.showinfo("No-Fly Zones", "No no-fly zones to save.")
+            return
+        filename = filedialog.asksaveasfilename(
+            title="Save No-Fly Zones",
+            initialdir=".",
+            defaultextension=".geojson",
+            filetypes=[("GeoJSON files", "*.geojson"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            geofence.save_geojson(self.geofences.fences, filename)
+            self.log_message(f"{len(self.geofences)} no-fly zone(s) saved to {filename}", "SUCCESS")
+        except OSError as e:
+            messagebox.showerror("No-Fly Zones", f"Could not save {filename}:\n{str(e)}")
+            self.log_message(f"Saving no-fly zones failed: {str(e)}", "ERROR")
+            
+    def clear_geofences(self):
+        if not len(self.geofences):
+            return
+        if messagebox.askyesno("No-Fly Zones", f"Remove all {len(self.geofences)} no-fly zones?"):
+            self.geofences.clear()
+            self.log_message("All no-fly zones removed", "WARNING")
+            self.geofences_changed()
+        
+    @timed
     def add_waypoint(self, lat, lon):
         """Add a waypoint to the mission"""
-        self.marker_counter += 1
-        waypoint_id = self.marker_counter
-        waypoint_name = f"WP{waypoint_id}"
-        
-        # Create marker on map
-        marker = self.map_widget.set_marker(
-            lat, lon,
-            text=waypoint_name,
-            marker_color_circle="gray",
-            marker_color_outside="darkgray"
-        )
-        
-        # Store waypoint data
-        waypoint_data = {
-            'id': waypoint_id,
-            'name': waypoint_name,
-            'lat': lat,
-            'lon': lon,
-            'marker': marker,
-            'type': 'normal'  # normal, takeoff, land, route
-        }
-        self.waypoints.append(waypoint_data)
-        self.markers.append(marker)
+        # Store waypoint data (the marker layer creates its marker if visible)
+        waypoint = self.mission.add_waypoint(lat, lon)
         
         # Log and update display
-        self.log_message(f"Waypoint {waypoint_name} added at ({lat:.6f}, {lon:.6f})", "SUCCESS")
+        self.log_message(f"Waypoint {waypoint.name} added at ({lat:.6f}, {lon:.6f})", "SUCCESS")
+        self.update_waypoint_display()
+        
+    def add_waypoints(self, waypoint_entries, takeoff_id=None, land_id=None, route_ids=None):
+        """Add many waypoints in one pass with a single display refresh
+        
+        See Mission.add_waypoints for the entry format. Returns the number of
+        added waypoints.
+        """
+        previous = (self.mission.takeoff, self.mission.land)
+        count = self.mission.add_waypoints(waypoint_entries, takeoff_id, land_id, route_ids)
+        for waypoint in previous:
+            if waypoint and waypoint in self.waypoints:
+                self.update_waypoint_marker(waypoint)
+        
         self.update_waypoint_display()
+        return count
         
+    @timed
     def remove_waypoint(self, waypoint):
         """Remove a specific waypoint"""
         if waypoint in self.waypoints:
-            # Remove from route if it's in there
-            if waypoint in self.route_waypoints:
-                self.route_waypoints.remove(waypoint)
-            
-            # Clear takeoff/landing if this waypoint is set as such
-            if waypoint == self.takeoff_waypoint:
-                self.takeoff_waypoint = None
-            if waypoint == self.land_waypoint:
-                self.land_waypoint = None
+            # Remove from the plan and the waypoint table
+            waypoint_name = waypoint.name
+            self.marker_layer.remove(waypoint.id)
+            self.mission.remove_waypoint(waypoint)
             
-            # Remove from main list
-            self.waypoints.remove(waypoint)
-            waypoint['marker'].delete()
-            
-            self.log_message(f"Waypoint {waypoint['name']} removed", "WARNING")
+            self.log_message(f"Waypoint {waypoint_name} removed", "WARNING")
             self.update_waypoint_display()
     
+    @timed
     def clear_waypoints(self):
         """Clear all waypoints"""
         if not self.waypoints:
@@ -275,98 +898,69 @@ class DroneControlGUI:
             return
             
         if messagebox.askyesno("Clear Waypoints", "Are you sure you want to clear all waypoints?"):
-            for waypoint in self.waypoints:
-                waypoint['marker'].delete()
-                
-            self.waypoints.clear()
-            self.markers.clear()
-            self.takeoff_waypoint = None
-            self.land_waypoint = None
-            self.route_waypoints.clear()
+            self.marker_layer.clear()
+            self.clear_fleet_routes()
+            self.mission.clear()
             
             self.log_message("All waypoints cleared", "WARNING")
             self.update_waypoint_display()
             
+    @timed
     def update_waypoint_display(self):
         """Update waypoint list display"""
-        self.waypoint_listbox.delete(0, tk.END)
+        # Only the visible rows are regenerated, and only changed rows are rewritten
+        self.waypoint_listbox.set_row_count(len(self.waypoints))
         
-        if not self.waypoints:
-            self.waypoint_listbox.insert(tk.END, "No waypoints added yet.")
-        else:
-            for wp in self.waypoints:
-                type_indicator = ""
-                if wp == self.takeoff_waypoint:
-                    type_indicator = " [TAKEOFF]"
-                elif wp == self.land_waypoint:
-                    type_indicator = " [LAND]"
-                elif wp in self.route_waypoints:
-                    route_idx = self.route_waypoints.index(wp)
-                    type_indicator = f" [ROUTE {route_idx + 1}]"
-                
-                display_text = f"{wp['name']}{type_indicator}: ({wp['lat']:.6f}, {wp['lon']:.6f})"
-                self.waypoint_listbox.insert(tk.END, display_text)
-                
         # Update mission info
         self.mission_info_var.set(f"Waypoints: {len(self.waypoints)}")
+        self.marker_layer.schedule_refresh()
+        self.route_layer.schedule_update()
+        self.fence_layer.schedule_update()
         self.update_route_info()
         
-    def calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two coordinates in km"""
-        R = 6371  # Earth's radius in km
-        
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
+    def waypoint_row_text(self, index):
+        """Build the waypoint list text for a row"""
+        wp = self.waypoints[index]
+        type_indicator = ""
+        if wp == self.mission.takeoff:
+            type_indicator = " [TAKEOFF]"
+        elif wp == self.mission.land:
+            type_indicator = " [LAND]"
+        else:
+            route_idx = self.mission.route_positions.get(wp.id)
+            if route_idx is not None:
+                type_indicator = f" [ROUTE {route_idx + 1}]"
         
-        a = (math.sin(dlat / 2) ** 2 +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlon / 2) ** 2)
-        c = 2 * math.asin(math.sqrt(a))
+        return f"{wp.name}{type_indicator}: ({wp.lat:.6f}, {wp.lon:.6f})"
         
-        return R * c
+    def calculate_distance(self, lat1, lon1, lat2, lon2):
+        """Calculate distance between two coordinates in km"""
+        return geodesy.haversine(lat1, lon1, lat2, lon2)
         
     def calculate_total_distance(self):
         """Calculate total mission distance"""
-        if len(self.waypoints) < 2:
-            return 0.0
-            
-        total = 0.0
-        for i in range(len(self.waypoints) - 1):
-            wp1 = self.waypoints[i]
-            wp2 = self.waypoints[i + 1]
-            total += self.calculate_distance(wp1['lat'], wp1['lon'], wp2['lat'], wp2['lon'])
-            
-        return total
+        return self.mission.total_distance()
     
+    @timed
     def update_route_info(self):
         """Update route information display"""
-        if not self.takeoff_waypoint or not self.land_waypoint:
+        if not self.mission.takeoff or not self.mission.land:
             self.route_info_var.set("Route: Not planned (set takeoff & land)")
             return
         
-        # Calculate direct distance
-        direct_dist = self.calculate_distance(
-            self.takeoff_waypoint['lat'], self.takeoff_waypoint['lon'],
-            self.land_waypoint['lat'], self.land_waypoint['lon']
-        )
-        
-        # Calculate route distance
-        if not self.route_waypoints:
-            route_dist = direct_dist
-            self.route_info_var.set(f"Direct: {direct_dist:.2f} km | Route: {route_dist:.2f} km")
-        else:
-            # Build full route: takeoff -> route waypoints -> land
-            full_route = [self.takeoff_waypoint] + self.route_waypoints + [self.land_waypoint]
-            route_dist = 0.0
-            for i in range(len(full_route) - 1):
-                route_dist += self.calculate_distance(
-                    full_route[i]['lat'], full_route[i]['lon'],
-                    full_route[i + 1]['lat'], full_route[i + 1]['lon']
-                )
-            self.route_info_var.set(
-                f"Direct: {direct_dist:.2f} km | Route: {route_dist:.2f} km | WPs: {len(self.route_waypoints)}"
-            )
+        # Distances are maintained incrementally by the route metrics cache
+        direct_dist = self.mission.metrics.direct
+        route_dist = self.mission.metrics.total
+        
+        info = f"Direct: {direct_dist:.2f} km | Route: {route_dist:.2f} km"
+        if self.mission.route:
+            info += f" | WPs: {len(self.mission.route)}"
+        crossings = len(self.mission.fence_check.violations())
+        if crossings:
+            info += f" | No-fly zone crossings: {crossings}"
+        self.route_info_var.set(info)
     
+    @timed
     def set_takeoff(self):
         """Set selected waypoint as takeoff point"""
         selection = self.waypoint_listbox.curselection()
@@ -376,20 +970,16 @@ class DroneControlGUI:
         
         idx = selection[0]
         if idx < len(self.waypoints):
-            # Clear previous takeoff
-            if self.takeoff_waypoint:
-                self.update_waypoint_marker(self.takeoff_waypoint)
-            
-            # Set new takeoff
-            self.takeoff_waypoint = self.waypoints[idx]
-            self.takeoff_waypoint['type'] = 'takeoff'
-            self.takeoff_waypoint['marker'].marker_color_circle = "green"
-            self.takeoff_waypoint['marker'].marker_color_outside = "darkgreen"
-            self.takeoff_waypoint['marker'].draw()
-            
-            self.log_message(f"Takeoff point set to {self.takeoff_waypoint['name']}", "SUCCESS")
+            # Set new takeoff, resetting the previous one
+            previous = self.mission.set_takeoff(self.waypoints[idx])
+            if previous:
+                self.update_waypoint_marker(previous)
+            self.update_waypoint_marker(self.mission.takeoff)
+            
+            self.log_message(f"Takeoff point set to {self.mission.takeoff.name}", "SUCCESS")
             self.update_waypoint_display()
     
+    @timed
     def set_landing(self):
         """Set selected waypoint as landing point"""
         selection = self.waypoint_listbox.curselection()
@@ -399,20 +989,16 @@ class DroneControlGUI:
         
         idx = selection[0]
         if idx < len(self.waypoints):
-            # Clear previous landing
-            if self.land_waypoint:
-                self.update_waypoint_marker(self.land_waypoint)
-            
-            # Set new landing
-            self.land_waypoint = self.waypoints[idx]
-            self.land_waypoint['type'] = 'land'
-            self.land_waypoint['marker'].marker_color_circle = "blue"
-            self.land_waypoint['marker'].marker_color_outside = "darkblue"
-            self.land_waypoint['marker'].draw()
-            
-            self.log_message(f"Landing point set to {self.land_waypoint['name']}", "SUCCESS")
+            # Set new landing, resetting the previous one
+            previous = self.mission.set_land(self.waypoints[idx])
+            if previous:
+                self.update_waypoint_marker(previous)
+            self.update_waypoint_marker(self.mission.land)
+            
+            self.log_message(f"Landing point set to {self.mission.land.name}", "SUCCESS")
             self.update_waypoint_display()
     
+    @timed
     def add_to_route(self):
         """Add selected waypoint to flight route"""
         selection = self.waypoint_listbox.curselection()
@@ -424,122 +1010,708 @@ class DroneControlGUI:
         if idx < len(self.waypoints):
             waypoint = self.waypoints[idx]
             
-            # Check if it's already takeoff or land
-            if waypoint == self.takeoff_waypoint or waypoint == self.land_waypoint:
-                messagebox.showwarning("Add to Route", "Takeoff and landing points are automatically in the route.")
+            # Toggle route membership (takeoff and land are always in the route)
+            try:
+                added = self.mission.toggle_route(waypoint)
+            except ValueError as e:
+                messagebox.showwarning("Add to Route", str(e))
                 return
             
-            # Toggle route membership
-            if waypoint in self.route_waypoints:
-                self.route_waypoints.remove(waypoint)
-                waypoint['type'] = 'normal'
-                self.update_waypoint_marker(waypoint)
-                self.log_message(f"Removed {waypoint['name']} from route", "WARNING")
+            self.update_waypoint_marker(waypoint)
+            if added:
+                self.log_message(f"Added {waypoint.name} to route (position {len(self.mission.route)})", "SUCCESS")
             else:
-                self.route_waypoints.append(waypoint)
-                waypoint['type'] = 'route'
-                waypoint['marker'].marker_color_circle = "purple"
-                waypoint['marker'].marker_color_outside = "darkviolet"
-                waypoint['marker'].draw()
-                self.log_message(f"Added {waypoint['name']} to route (position {len(self.route_waypoints)})", "SUCCESS")
+                self.log_message(f"Removed {waypoint.name} from route", "WARNING")
             
             self.update_waypoint_display()
     
     def update_waypoint_marker(self, waypoint):
         """Update waypoint marker color based on type"""
-        if waypoint['type'] == 'takeoff':
-            waypoint['marker'].marker_color_circle = "green"
-            waypoint['marker'].marker_color_outside = "darkgreen"
-        elif waypoint['type'] == 'land':
-            waypoint['marker'].marker_color_circle = "blue"
-            waypoint['marker'].marker_color_outside = "darkblue"
-        elif waypoint['type'] == 'route':
-            waypoint['marker'].marker_color_circle = "purple"
-            waypoint['marker'].marker_color_outside = "darkviolet"
+        marker = waypoint.marker
+        if not marker:
+            return  # Not rendered; the marker layer uses the type when it is drawn
+        circle, outside = MARKER_COLORS.get(waypoint.type, MARKER_COLORS['normal'])
+        marker.marker_color_circle = circle
+        marker.marker_color_outside = outside
+        marker.draw()
+        
+    @timed
+    def optimize_route(self):
+        """Reorder route waypoints to minimize distance, or cancel a running optimization"""
+        if self.optimizer_thread and self.optimizer_thread.is_alive():
+            self.optimizer_cancel.set()
+            self.log_message("Route optimization cancelling...", "WARNING")
+            return
+        
+        if not self.mission.takeoff or not self.mission.land:
+            messagebox.showwarning("Optimize Route", "Please set takeoff and landing points first.")
+            return
+        
+        if len(self.mission.route) < 2:
+            messagebox.showinfo("Optimize Route", "Add at least two waypoints to the route to optimize it.")
+            return
+        
+        if len(self.mission.route) > route_optimizer.MAX_ROUTE_WAYPOINTS:
+            messagebox.showwarning(
+                "Optimize Route",
+                f"The route has {len(self.mission.route)} waypoints; routes of up to "
+                f"{route_optimizer.MAX_ROUTE_WAYPOINTS} waypoints can be optimized."
+            )
+            return
+        
+        # Snapshot the plan so the result is only applied if it is still valid
+        self.optimizer_snapshot = (
+            self.mission.takeoff.id,
+            self.mission.land.id,
+            [wp.id for wp in self.mission.route]
+        )
+        full_route = [self.mission.takeoff] + self.mission.route + [self.mission.land]
+        lats, lons = self.waypoints.coordinates_of(full_route)
+        
+        self.optimizer_cancel.clear()
+        self.optimizer_thread = threading.Thread(
+            target=self.run_route_optimizer,
+            args=(lats, lons),
+            daemon=True
+        )
+        self.optimizer_thread.start()
+        self.optimize_button.config(text="Cancel Optimization")
+        self.log_message(
+            f"Optimizing route of {len(self.mission.route)} waypoints "
+            f"(time budget {self.optimizer_time_budget:.0f} s)", "INFO"
+        )
+        self.root.after(100, self.poll_route_optimizer)
+        
+    def run_route_optimizer(self, lats, lons):
+        """Optimizer worker thread: results are passed back through the queue"""
+        try:
+            result = route_optimizer.optimize_route(
+                lats, lons,
+                time_budget=self.optimizer_time_budget,
+                cancel_event=self.optimizer_cancel,
+                progress=lambda distance, order: self.optimizer_queue.put(('progress', distance))
+            )
+            self.optimizer_queue.put(('done', result))
+        except Exception as e:
+            self.optimizer_queue.put(('error', e))
+            
+    @timed
+    def poll_route_optimizer(self):
+        """Drain optimizer messages on the Tk thread"""
+        try:
+            while True:
+                kind, payload = self.optimizer_queue.get_nowait()
+                if kind == 'progress':
+                    self.route_info_var.set(f"Optimizing... best route: {payload:.2f} km")
+                elif kind == 'done':
+                    self.optimize_button.config(text="Optimize Route")
+                    self.apply_optimized_route(payload)
+                    return
+                else:
+                    self.optimize_button.config(text="Optimize Route")
+                    self.log_message(f"Route optimization failed: {str(payload)}", "ERROR")
+                    self.update_route_info()
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_route_optimizer)
+        
+    def apply_optimized_route(self, result):
+        """Apply an optimizer result if the route has not changed meanwhile"""
+        current = (
+            self.mission.takeoff.id if self.mission.takeoff else None,
+            self.mission.land.id if self.mission.land else None,
+            [wp.id for wp in self.mission.route]
+        )
+        if current != self.optimizer_snapshot:
+            self.log_message("Route changed during optimization - result discarded", "WARNING")
+            self.update_route_info()
+            return
+        
+        if result.distance < self.mission.metrics.total:
+            self.mission.reorder_route(result.order)
+            self.update_waypoint_display()
         else:
-            waypoint['marker'].marker_color_circle = "gray"
-            waypoint['marker'].marker_color_outside = "darkgray"
-        waypoint['marker'].draw()
+            self.update_route_info()
+        
+        saved = result.initial_distance - result.distance
+        percent = 100 * saved / result.initial_distance if result.initial_distance else 0.0
+        status = "cancelled" if result.cancelled else "complete"
+        self.log_message(
+            f"Route optimization {status}: {result.initial_distance:.2f} km → {result.distance:.2f} km "
+            f"({percent:.1f}% shorter)", "SUCCESS"
+        )
         
-
+    def plan_fleet(self):
+        """Split the waypoints among several vehicles, or cancel a running fleet plan"""
+        if self.fleet_thread and self.fleet_thread.is_alive():
+            self.fleet_cancel.set()
+            self.log_message("Fleet planning cancelling...", "WARNING")
+            return
         
-    def start_mission(self):
-        """Handle start mission command"""
-        if not self.takeoff_waypoint:
-            messagebox.showwarning("Start Mission", "Please set a takeoff point first.")
-            self.log_message("Mission start failed - No takeoff point set", "ERROR")
+        if not self.mission.takeoff or not self.mission.land:
+            messagebox.showwarning("Plan Fleet", "Please set takeoff and landing points first.\nAll vehicles take off and land there.")
+            return
+        
+        if len(self.waypoints) < 4:
+            messagebox.showinfo("Plan Fleet", "Add waypoints to split among the vehicles.")
+            return
+        self.show_fleet_dialog()
+        
+    def show_fleet_dialog(self):
+        """Ask for the number of vehicles and what to balance, then start planning"""
+        import fleet  # Imported on first use: it loads multiprocessing
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Plan Fleet")
+        dialog.geometry("300x190")
+        dialog.configure(bg='black')
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        form = ttk.Frame(dialog)
+        form.pack(pady=(10, 5))
+        vehicles_var = tk.StringVar(value=str(len(self.fleet_layers) or fleet.DEFAULT_VEHICLES))
+        balance_var = tk.StringVar(value=fleet.BALANCE_MODES[0])
+        ttk.Label(form, text="Vehicles:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(form, textvariable=vehicles_var, width=10).grid(row=0, column=1, padx=(10, 0), pady=3)
+        ttk.Label(form, text="Balance:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        for row, (text, value) in enumerate((("Route length", 'distance'), ("Flight time", 'time')), 1):
+            ttk.Radiobutton(form, text=text, variable=balance_var, value=value).grid(
+                row=row, column=1, sticky=tk.W, padx=(10, 0)
+            )
+        
+        def plan():
+            try:
+                vehicles = int(vehicles_var.get())
+            except ValueError:
+                messagebox.showwarning("Plan Fleet", "Please enter a whole number of vehicles.", parent=dialog)
+                return
+            if self.start_fleet_planner(vehicles, balance_var.get(), parent=dialog):
+                dialog.destroy()
+        
+        def clear():
+            self.clear_fleet_routes()
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Plan", command=plan).pack(side=tk.LEFT, padx=5)
+        if self.fleet_layers:
+            ttk.Button(button_frame, text="Clear Routes", command=clear).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        dialog.bind("<Return>", lambda e: plan())
+        dialog.bind("<Escape>", lambda e: dialog.destroy())
+        
+    def fleet_waypoints(self):
+        """(ids, lats, lons) of the waypoints to split among the vehicles: all but takeoff and landing"""
+        lats, lons = self.waypoints.coordinates()
+        ids = self.waypoints.ids[:len(lats)]
+        keep = (ids != self.mission.takeoff.id) & (ids != self.mission.land.id)
+        return ids[keep], lats[keep], lons[keep]
+        
+    def start_fleet_planner(self, vehicles, balance, parent=None):
+        """Plan the fleet on a worker thread; returns False if the settings are invalid"""
+        import fleet
+        
+        ids, lats, lons = self.fleet_waypoints()
+        if not 1 <= vehicles <= min(fleet.MAX_VEHICLES, len(ids)):
+            messagebox.showwarning(
+                "Plan Fleet", f"Choose 1 to {min(fleet.MAX_VEHICLES, len(ids))} vehicles.", parent=parent
+            )
+            return False
+        
+        # Snapshot the waypoints so the result is only shown if it still matches them
+        takeoff, land = self.mission.takeoff, self.mission.land
+        self.fleet_snapshot = (takeoff.id, land.id, ids)
+        
+        self.fleet_cancel.clear()
+        self.fleet_thread = threading.Thread(
+            target=self.run_fleet_planner,
+            args=(lats, lons, vehicles, (takeoff.lat, takeoff.lon), (land.lat, land.lon), balance),
+            daemon=True
+        )
+        self.fleet_thread.start()
+        self.fleet_button.config(text="Cancel Fleet Planning")
+        self.log_message(
+            f"Planning {vehicles} vehicle routes over {len(ids)} waypoints "
+            f"(balancing {'flight time' if balance == 'time' else 'route length'})", "INFO"
+        )
+        self.root.after(100, self.poll_fleet_planner)
+        return True
+        
+    def run_fleet_planner(self, lats, lons, vehicles, takeoff, land, balance):
+        """Fleet planner worker thread: results are passed back through the queue"""
+        import fleet
+        
+        try:
+            plan = fleet.plan_fleet(
+                lats, lons, vehicles, [takeoff], [land], balance,
+                cancel_event=self.fleet_cancel,
+                progress=lambda done, total: self.fleet_queue.put(('progress', (done, total)))
+            )
+            self.fleet_queue.put(('done', plan))
+        except Exception as e:
+            self.fleet_queue.put(('error', e))
+            
+    @timed
+    def poll_fleet_planner(self):
+        """Drain fleet planner messages on the Tk thread"""
+        try:
+            while True:
+                kind, payload = self.fleet_queue.get_nowait()
+                if kind == 'progress':
+                    self.route_info_var.set(f"Planning fleet... {payload[0]}/{payload[1]} vehicles optimized")
+                elif kind == 'done':
+                    self.fleet_button.config(text="Plan Fleet")
+                    self.update_route_info()
+                    self.apply_fleet_plan(payload)
+                    return
+                else:
+                    self.fleet_button.config(text="Plan Fleet")
+                    self.log_message(f"Fleet planning failed: {str(payload)}", "ERROR")
+                    self.update_route_info()
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_fleet_planner)
+        
+    def apply_fleet_plan(self, plan):
+        """Show a fleet plan as colour-coded routes with a summary per vehicle"""
+        if plan is None:
+            self.log_message("Fleet planning cancelled", "WARNING")
+            return
+        takeoff_id, land_id, ids = self.fleet_snapshot
+        if (not self.mission.takeoff or not self.mission.land or self.mission.takeoff.id != takeoff_id
+                or self.mission.land.id != land_id or not np.array_equal(self.fleet_waypoints()[0], ids)):
+            self.log_message("Waypoints changed during fleet planning - result discarded", "WARNING")
             return
         
-        if not self.land_waypoint:
-            messagebox.showwarning("Start Mission", "Please set a landing point first.")
-            self.log_message("Mission start failed - No landing point set", "ERROR")
+        self.clear_fleet_routes()
+        lines = []
+        for vehicle in plan.vehicles:
+            color = VEHICLE_COLORS[vehicle.vehicle % len(VEHICLE_COLORS)][2]
+            layer = RouteLayer(self.map_widget, color=color)
+            layer.set_route(vehicle.lats, vehicle.lons)
+            self.fleet_layers.append(layer)
+            
+            line = (f"Vehicle {vehicle.vehicle + 1}: {len(vehicle.indices)} waypoints, {vehicle.distance_km:.2f} km, "
+                    f"{flight_sim.format_duration(vehicle.flight_time)}, battery at landing {vehicle.battery:.0f}%")
+            low_battery = vehicle.battery < flight_sim.DEFAULT_PROFILE.reserve_percent
+            self.log_message(line, "WARNING" if low_battery else "INFO")
+            lines.append(line)
+        
+        total_km = sum(vehicle.distance_km for vehicle in plan.vehicles)
+        longest = max(vehicle.flight_time for vehicle in plan.vehicles)
+        balanced = "flight time" if plan.balance == 'time' else "route length"
+        summary = (f"Fleet plan: {len(plan.vehicles)} vehicles, {total_km:.2f} km in total, "
+                   f"mission time {flight_sim.format_duration(longest)}, "
+                   f"{plan.spread * 100:.0f}% {balanced} spread ({plan.seconds:.1f} s)")
+        self.log_message(summary, "SUCCESS")
+        messagebox.showinfo("Plan Fleet", summary + "\n\n" + "\n".join(lines))
+        
+    def clear_fleet_routes(self):
+        """Remove the routes of the shown fleet plan from the map"""
+        for layer in self.fleet_layers:
+            layer.delete()
+        self.fleet_layers = []
+        
+    def prefetch_map_area(self):
+        """Download map tiles around all waypoints for offline use, or cancel a running prefetch"""
+        if self.prefetch_thread and self.prefetch_thread.is_alive():
+            self.prefetch_cancel.set()
+            self.log_message("Map prefetch cancelling...", "WARNING")
+            return
+        
+        if not self.tile_cache:
+            messagebox.showwarning("Prefetch Map Area", "The offline tile cache is not available.")
+            return
+        
+        if not self.waypoints:
+            messagebox.showinfo("Prefetch Map Area", "Add waypoints to define the mission area first.")
+            return
+        
+        import tile_cache  # Imported with the map (see start_map)
+        lats, lons = self.waypoints.coordinates()
+        bounds = (float(lats.max()), float(lons.min()), float(lats.min()), float(lons.max()))
+        total = tile_cache.tile_count(*bounds, PREFETCH_ZOOMS)
+        if total > MAX_PREFETCH_TILES and not messagebox.askyesno(
+            "Prefetch Map Area",
+            f"The mission area needs {total} tiles (zoom {PREFETCH_ZOOMS.start}-{PREFETCH_ZOOMS.stop - 1}). Continue?"
+        ):
+            return
+        
+        self.prefetch_cancel.clear()
+        self.prefetch_thread = threading.Thread(
+            target=self.run_map_prefetch,
+            args=(bounds,),
+            daemon=True
+        )
+        self.prefetch_thread.start()
+        self.prefetch_button.config(text="Cancel Prefetch")
+        self.log_message(
+            f"Prefetching {total} map tiles (zoom {PREFETCH_ZOOMS.start}-{PREFETCH_ZOOMS.stop - 1})", "INFO"
+        )
+        self.root.after(200, self.poll_map_prefetch)
+        
+    def run_map_prefetch(self, bounds):
+        """Prefetch worker thread: results are passed back through the queue"""
+        try:
+            result = self.tile_cache.prefetch(
+                *bounds, PREFETCH_ZOOMS,
+                cancel_event=self.prefetch_cancel,
+                progress=lambda done, total: self.prefetch_queue.put(('progress', (done, total)))
+            )
+            self.prefetch_queue.put(('done', result))
+        except Exception as e:
+            self.prefetch_queue.put(('error', e))
+            
+    @timed
+    def poll_map_prefetch(self):
+        """Drain prefetch messages on the Tk thread"""
+        progress = None
+        try:
+            while True:
+                kind, payload = self.prefetch_queue.get_nowait()
+                if kind == 'progress':
+                    progress = payload
+                elif kind == 'done':
+                    self.prefetch_button.config(text="Prefetch Map Area")
+                    status = "cancelled" if payload.cancelled else "complete"
+                    level = "WARNING" if payload.failed or payload.cancelled else "SUCCESS"
+                    self.log_message(
+                        f"Map prefetch {status}: {payload.downloaded} downloaded, "
+                        f"{payload.cached} already cached, {payload.failed} failed", level
+                    )
+                    return
+                else:
+                    self.prefetch_button.config(text="Prefetch Map Area")
+                    self.log_message(f"Map prefetch failed: {str(payload)}", "ERROR")
+                    return
+        except queue.Empty:
+            pass
+        if progress:
+            self.prefetch_button.config(text=f"Cancel Prefetch ({100 * progress[0] // progress[1]}%)")
+        self.root.after(200, self.poll_map_prefetch)
+        
+    @timed
+    def start_mission(self):
+        """Handle start mission command"""
+        problems = self.mission.validate()
+        if problems:
+            messagebox.showwarning("Start Mission", "\n".join(problems))
+            self.log_message(f"Mission start failed - {problems[0]}", "ERROR")
             return
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.mission_active = True
         
         # Build mission route
-        mission_route = [self.takeoff_waypoint] + self.route_waypoints + [self.land_waypoint]
+        mission_route = self.mission.full_route()
         
-        # Calculate distances
-        direct_distance = self.calculate_distance(
-            self.takeoff_waypoint['lat'], self.takeoff_waypoint['lon'],
-            self.land_waypoint['lat'], self.land_waypoint['lon']
-        )
+        # Report distances on the WGS-84 ellipsoid (the route metrics cache is spherical)
+        summary = self.mission.summary(precision='ellipsoidal')
+        direct_distance = summary.direct_km
+        route_distance = summary.route_km
+        segment_distances = summary.segments_km
         
-        route_distance = 0.0
-        segment_distances = []
-        for i in range(len(mission_route) - 1):
-            seg_dist = self.calculate_distance(
-                mission_route[i]['lat'], mission_route[i]['lon'],
-                mission_route[i + 1]['lat'], mission_route[i + 1]['lon']
-            )
-            segment_distances.append(seg_dist)
-            route_distance += seg_dist
+        # Simulated flight time and battery use
+        simulation = self.mission.simulate()
+        low_battery = simulation.low_battery_waypoint()
+        
+        # Ground clearance along the route from the local elevation tiles
+        terrain = self.mission.terrain_profile(self.elevation, simulation.profile)
+        terrain_report = self.terrain_report(terrain, mission_route)
         
         # Log mission details
         self.log_message("=" * 50, "INFO")
         self.log_message("MISSION STARTED", "SUCCESS")
-        self.log_message(f"Takeoff: {self.takeoff_waypoint['name']} ({self.takeoff_waypoint['lat']:.6f}, {self.takeoff_waypoint['lon']:.6f})", "INFO")
-        
-        if self.route_waypoints:
-            self.log_message(f"Route waypoints: {len(self.route_waypoints)}", "INFO")
-            for i, wp in enumerate(self.route_waypoints, 1):
-                self.log_message(f"  {i}. {wp['name']} ({wp['lat']:.6f}, {wp['lon']:.6f})", "INFO")
-        
-        self.log_message(f"Landing: {self.land_waypoint['name']} ({self.land_waypoint['lat']:.6f}, {self.land_waypoint['lon']:.6f})", "INFO")
-        self.log_message(f"Direct distance: {direct_distance:.2f} km", "INFO")
-        self.log_message(f"Route distance: {route_distance:.2f} km", "INFO")
+        self.log_message(f"Takeoff: {self.mission.takeoff.name} ({self.mission.takeoff.lat:.6f}, {self.mission.takeoff.lon:.6f})", "INFO")
+        
+        if self.mission.route:
+            self.log_message(f"Route waypoints: {len(self.mission.route)}", "INFO")
+            for i, wp in enumerate(self.mission.route, 1):
+                self.log_message(f"  {i}. {wp.name} ({wp.lat:.6f}, {wp.lon:.6f})", "INFO")
+        
+        self.log_message(f"Landing: {self.mission.land.name} ({self.mission.land.lat:.6f}, {self.mission.land.lon:.6f})", "INFO")
+        self.log_message(f"Direct distance: {direct_distance:.2f} km (WGS-84)", "INFO")
+        self.log_message(f"Route distance: {route_distance:.2f} km (WGS-84)", "INFO")
+        self.log_message(
+            f"Estimated flight time: {flight_sim.format_duration(simulation.total_time)}, "
+            f"battery at landing: {simulation.remaining_battery:.0f}%", "INFO"
+        )
+        if low_battery is not None:
+            self.log_message(
+                f"Battery below {simulation.profile.reserve_percent:.0f}% reserve at {mission_route[low_battery].name}", "WARNING"
+            )
+        for message, level in terrain_report:
+            self.log_message(message, level)
         
-        if self.route_waypoints:
+        if self.mission.route:
             self.log_message("Segment distances:", "INFO")
             for i, seg_dist in enumerate(segment_distances):
                 if i < len(mission_route) - 1:
-                    self.log_message(f"  {mission_route[i]['name']} → {mission_route[i+1]['name']}: {seg_dist:.2f} km", "INFO")
+                    self.log_message(f"  {mission_route[i].name} → {mission_route[i+1].name}: {seg_dist:.2f} km", "INFO")
         
         self.log_message("=" * 50, "INFO")
         
         # Print to console
         print(f"\n[{timestamp}] MISSION START")
-        print(f"Route: {' → '.join([wp['name'] for wp in mission_route])}")
+        print(f"Route: {' → '.join([wp.name for wp in mission_route])}")
         print(f"Direct distance: {direct_distance:.2f} km")
         print(f"Route distance: {route_distance:.2f} km")
         print(f"Total waypoints: {len(mission_route)}")
         
         # Show summary dialog
-        summary = f"Mission Route:\n{' → '.join([wp['name'] for wp in mission_route])}\n\n"
+        summary = f"Mission Route:\n{' → '.join([wp.name for wp in mission_route])}\n\n"
         summary += f"Direct Distance: {direct_distance:.2f} km\n"
         summary += f"Route Distance: {route_distance:.2f} km\n"
-        summary += f"Total Waypoints: {len(mission_route)}\n\n"
+        summary += f"Total Waypoints: {len(mission_route)}\n"
+        summary += f"Flight Time: {flight_sim.format_duration(simulation.total_time)}\n"
+        summary += f"Battery at Landing: {simulation.remaining_battery:.0f}%\n"
+        if low_battery is not None:
+            summary += f"WARNING: below battery reserve at {mission_route[low_battery].name}\n"
+        for message, level in terrain_report:
+            summary += f"WARNING: {message}\n" if level == "WARNING" else f"{message}\n"
+        summary += "\n"
         
         if len(segment_distances) > 0:
             summary += "Segment Distances:\n"
             for i, seg_dist in enumerate(segment_distances):
                 if i < len(mission_route) - 1:
-                    summary += f"{mission_route[i]['name']} → {mission_route[i+1]['name']}: {seg_dist:.2f} km\n"
+                    summary += f"{mission_route[i].name} → {mission_route[i+1].name}: {seg_dist:.2f} km\n"
+        
+        # Follow the vehicles on the map
+        if not (self.telemetry and self.telemetry.running):
+            self.start_telemetry()
         
         messagebox.showinfo("Mission Started", summary)
+        
+    def terrain_report(self, terrain, mission_route):
+        """(message, level) lines describing the ground clearance of a TerrainProfile"""
+        import elevation  # Imported with the map (see start_map)
+        
+        if not terrain.coverage:
+            return [(f"Terrain: no elevation data (add SRTM .hgt or GeoTIFF tiles to {DEM_DIR}/)", "INFO")]
+        
+        report = []
+        lowest = terrain.lowest_segment
+        if lowest is None:
+            report.append((
+                f"Terrain: highest ground {terrain.highest_ground:.0f} m, "
+                f"clearance unknown (no elevation data at {mission_route[0].name})", "WARNING"
+            ))
+        else:
+            report.append((
+                f"Terrain: highest ground {terrain.highest_ground:.0f} m, minimum clearance "
+                f"{terrain.min_clearance:.0f} m ({mission_route[lowest].name} → {mission_route[lowest + 1].name})", "INFO"
+            ))
+        low = terrain.low_segments()
+        if low.size:
+            first = int(low[0])
+            report.append((
+                f"Ground clearance below {elevation.MIN_CLEARANCE:.0f} m on {low.size} segment(s), "
+                f"first {mission_route[first].name} → {mission_route[first + 1].name}", "WARNING"
+            ))
+        if terrain.coverage < 1:
+            report.append((f"Elevation data covers only {terrain.coverage:.0%} of the route", "WARNING"))
+        return report
             
+    @timed
+    def simulate_mission(self):
+        """Simulate the planned flight and open the playback controls"""
+        problems = self.mission.validate(geofences=False)
+        if problems:
+            messagebox.showwarning("Simulate Mission", "\n".join(problems))
+            return
+        
+        simulation = self.mission.simulate()
+        self.log_message(
+            f"Simulated {len(simulation)} route points, {simulation.distance_km:.2f} km: "
+            f"flight time {flight_sim.format_duration(simulation.total_time)}, "
+            f"battery at landing {simulation.remaining_battery:.0f}%", "SUCCESS"
+        )
+        low_battery = simulation.low_battery_waypoint()
+        if low_battery is not None:
+            waypoint = self.mission.full_route()[low_battery]
+            self.log_message(
+                f"Battery below {simulation.profile.reserve_percent:.0f}% reserve at {waypoint.name}", "WARNING"
+            )
+        
+        self.show_playback_window()
+        self.playback_scale.config(to=simulation.total_time)
+        self.playback_summary_var.set(
+            f"Flight time {flight_sim.format_duration(simulation.total_time)} | "
+            f"{simulation.distance_km:.2f} km | battery at landing {simulation.remaining_battery:.0f}%"
+        )
+        self.playback_names = [wp.name for wp in self.mission.full_route()]
+        self.playback_layer.load(simulation)
+        
+    def show_playback_window(self):
+        """Create the playback controls window, or raise it if it is open"""
+        if self.playback_window is not None:
+            self.playback_window.lift()
+            return
+        
+        window = self.playback_window = tk.Toplevel(self.root)
+        window.title("Mission Playback")
+        window.geometry("420x170")
+        window.configure(bg='black')
+        window.transient(self.root)
+        window.protocol("WM_DELETE_WINDOW", self.close_playback_window)
+        
+        self.playback_summary_var = tk.StringVar()
+        ttk.Label(window, textvariable=self.playback_summary_var, font=("Arial", 9)).pack(pady=(10, 5))
+        
+        # Dragging the scale seeks; playback moves it without triggering its command
+        self.playback_time_var = tk.DoubleVar(value=0.0)
+        self.playback_scale = ttk.Scale(
+            window,
+            from_=0.0,
+            to=1.0,
+            variable=self.playback_time_var,
+            command=lambda value: self.playback_layer.seek(float(value))
+        )
+        self.playback_scale.pack(fill=tk.X, padx=10)
+        
+        self.playback_state_var = tk.StringVar(value="")
+        ttk.Label(window, textvariable=self.playback_state_var, font=("Consolas", 9)).pack(pady=5)
+        
+        controls = ttk.Frame(window)
+        controls.pack(pady=5)
+        self.playback_button = ttk.Button(controls, text="Play", command=self.toggle_playback)
+        self.playback_button.pack(side=tk.LEFT, padx=5)
+        ttk.Label(controls, text="Speed:").pack(side=tk.LEFT, padx=(10, 0))
+        self.playback_speed_var = tk.StringVar(value=f"{PLAYBACK_SPEEDS[0]}x")
+        speed_box = ttk.Combobox(
+            controls,
+            textvariable=self.playback_speed_var,
+            values=[f"{speed}x" for speed in PLAYBACK_SPEEDS],
+            state="readonly",
+            width=6
+        )
+        speed_box.pack(side=tk.LEFT, padx=5)
+        speed_box.bind(
+            "<<ComboboxSelected>>",
+            lambda e: self.playback_layer.set_speed(self.playback_speed_var.get().rstrip("x"))
+        )
+        self.playback_layer.set_speed(PLAYBACK_SPEEDS[0])
+        
+    def toggle_playback(self):
+        """Play or pause the simulated flight"""
+        if self.playback_layer.playing:
+            self.playback_layer.pause()
+        else:
+            self.playback_layer.play()
+        self.playback_button.config(text="Pause" if self.playback_layer.playing else "Play")
+        
+    def update_playback_panel(self, state):
+        """Show a playback frame's flight state in the playback window"""
+        if self.playback_window is None:
+            return
+        self.playback_time_var.set(state.time)
+        self.playback_state_var.set(
+            f"T+{flight_sim.format_duration(state.time)}  alt {state.alt:5.1f} m  "
+            f"battery {max(state.battery, 0.0):5.1f}%  next {self.playback_names[state.waypoint]}"
+        )
+        if not self.playback_layer.playing:
+            self.playback_button.config(text="Play")
+        
+    def close_playback_window(self):
+        self.playback_layer.clear()
+        self.playback_window.destroy()
+        self.playback_window = None
+            
+    def toggle_telemetry(self):
+        """Connect to or disconnect from the telemetry source"""
+        if self.telemetry and self.telemetry.running:
+            self.stop_telemetry()
+        else:
+            self.start_telemetry()
+            
+    def start_telemetry(self):
+        """Start receiving telemetry and drawing vehicles; returns True on success"""
+        import telemetry  # Imported on first use: it loads asyncio
+        
+        address = TELEMETRY_ADDRESS or telemetry.DEFAULT_ADDRESS
+        receiver = telemetry.TelemetryReceiver(address)
+        try:
+            receiver.start()
+        except OSError as e:
+            self.log_message(f"Telemetry unavailable on {address}: {str(e)}", "ERROR")
+            messagebox.showerror("Telemetry", f"Cannot listen on {address}:\n{str(e)}")
+            return False
+        
+        self.telemetry = receiver
+        self.vehicle_layer.clear()
+        self.vehicle_layer.start(receiver)
+        self.telemetry_button.config(text="Disconnect Telemetry")
+        self.log_message(f"Telemetry listening on {address}", "SUCCESS")
+        return True
+        
+    def stop_telemetry(self):
+        """Stop receiving telemetry; vehicle trails stay on the map until the next connect"""
+        self.vehicle_layer.stop()
+        self.telemetry.stop()
+        stats = self.telemetry.stats()
+        self.telemetry_button.config(text="Connect Telemetry")
+        self.log_message(
+            f"Telemetry stopped: {stats['received']} messages received, "
+            f"{stats['forwarded']} displayed, {stats['malformed']} malformed", "INFO"
+        )
+        
+    def show_profiler_menu(self):
+        """Show the performance overlay and trace export actions"""
+        menu = tk.Menu(self.root, tearoff=0, bg='#2d2d2d', fg='white',
+                       activebackground='#404040', activeforeground='white')
+        menu.add_command(
+            label="Hide Overlay (F12)" if self.profiler_overlay.shown else "Show Overlay (F12)",
+            command=self.toggle_profiler_overlay
+        )
+        menu.add_command(label="Export Trace...", command=self.export_profiler_trace)
+        menu.add_separator()
+        menu.add_command(label="Reset Statistics", command=PROFILER.clear)
+        try:
+            menu.tk_popup(self.profiler_button.winfo_rootx(),
+                          self.profiler_button.winfo_rooty() + self.profiler_button.winfo_height())
+        finally:
+            menu.grab_release()
+            
+    def toggle_profiler_overlay(self):
+        """Start or stop recording spans and frame lag, with the overlay over the map"""
+        if self.profiler_overlay.shown:
+            self.profiler_overlay.hide()
+            self.profiler_probe.stop()
+            PROFILER.disable()
+            self.log_message(f"Performance overlay off ({len(PROFILER.events)} spans recorded)", "INFO")
+        else:
+            PROFILER.enable()
+            self.profiler_probe.start()
+            self.profiler_overlay.show()
+            self.log_message("Performance overlay on: recording handler spans and frame lag", "INFO")
+            
+    def export_profiler_trace(self):
+        """Save the recorded spans as a Chrome trace (open in Perfetto or chrome://tracing)"""
+        if not PROFILER.events:
+            messagebox.showinfo("Export Trace", "Nothing recorded yet.\nShow the performance overlay (F12) while using the planner.")
+            return
+        filename = filedialog.asksaveasfilename(
+            title="Export Trace",
+            initialdir=".",
+            initialfile=f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            defaultextension=".json",
+            filetypes=[("Chrome trace files", "*.json"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            spans = PROFILER.export(filename)
+            self.log_message(f"{spans} spans exported to {filename}", "SUCCESS")
+        except OSError as e:
+            messagebox.showerror("Export Trace", f"Could not save {filename}:\n{str(e)}")
+            self.log_message(f"Exporting the trace failed: {str(e)}", "ERROR")
+        
     def emergency_stop(self):
         """Handle emergency stop command"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -549,91 +1721,177 @@ class DroneControlGUI:
         messagebox.showwarning("Emergency Stop", "All drone operations have been halted!")
         
     def save_mission(self):
-        """Save mission plan to file"""
+        """Save mission plan to file on a worker thread, or cancel a running save"""
+        if self.file_operation_busy('save'):
+            return
+        
         if not self.waypoints:
             messagebox.showinfo("Save Mission", "No waypoints to save.")
             return
             
-        mission_data = {
-            'timestamp': datetime.now().isoformat(),
-            'waypoints': [
-                {'id': wp['id'], 'name': wp['name'], 'lat': wp['lat'], 'lon': wp['lon']}
-                for wp in self.waypoints
-            ],
-            'total_distance_km': self.calculate_total_distance()
-        }
-        
-        filename = f"mission_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = f"mission_{datetime.now().strftime('%Y%m%d_%H%M%S')}{mission_format.TEXT_EXTENSION}"
         
+        # The worker writes a copy, so the mission can be edited while it saves
+        snapshot = mission_format.snapshot(self.mission)
+        self.start_file_operation('save', self.run_save_mission, (snapshot, filename))
+        self.log_message(f"Saving mission to {filename}...", "INFO")
+    
+    def run_save_mission(self, snapshot, filename):
+        """Save worker thread: results are passed back through the queue"""
         try:
-            with open(filename, 'w') as f:
-                json.dump(mission_data, f, indent=2)
-            self.log_message(f"Mission saved to {filename}", "SUCCESS")
-            messagebox.showinfo("Save Mission", f"Mission saved successfully to:\n{filename}")
+            mission_format.write_snapshot(
+                snapshot, filename,
+                progress=lambda done, total: self.file_queue.put(('progress', (done, total))),
+                cancel_event=self.file_cancel
+            )
+            self.file_queue.put(('done', filename))
+        except mission_format.Cancelled:
+            self.file_queue.put(('cancelled', filename))
         except Exception as e:
-            self.log_message(f"Failed to save mission: {str(e)}", "ERROR")
-            messagebox.showerror("Save Error", f"Failed to save mission:\n{str(e)}")
+            self.file_queue.put(('error', e))
     
     def load_mission(self):
-        """Load mission plan from file"""
+        """Load mission plan from file on a worker thread, or cancel a running load"""
+        if self.file_operation_busy('load'):
+            return
+        
         # Open file dialog
         filename = filedialog.askopenfilename(
             title="Load Mission",
             initialdir=".",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[
+                ("Mission files", "*.wpt *.wpb *.json"),
+                ("Text missions", "*.wpt"),
+                ("Binary missions", "*.wpb"),
+                ("JSON files", "*.json"),
+                ("All files", "*.*")
+            ]
         )
         
         if not filename:
             return
             
+        # Existing waypoints are only replaced once the file loaded successfully
+        if self.waypoints:
+            if not messagebox.askyesno("Load Mission", "This will clear current waypoints. Continue?"):
+                return
+        
+        self.start_file_operation('load', self.run_load_mission, (filename,))
+        self.log_message(f"Loading mission from {filename}...", "INFO")
+    
+    def run_load_mission(self, filename):
+        """Load worker thread: builds a fresh mission that the Tk thread swaps in"""
         try:
-            with open(filename, 'r') as f:
-                mission_data = json.load(f)
-            
-            # Validate mission data
-            if 'waypoints' not in mission_data:
-                messagebox.showerror("Load Error", "Invalid mission file: missing waypoints data")
+            mission = Mission()
+            header = mission.load_file(
+                filename,
+                progress=lambda done, total: self.file_queue.put(('progress', (done, total))),
+                cancel_event=self.file_cancel
+            )
+            self.file_queue.put(('done', (mission, header)))
+        except mission_format.Cancelled:
+            self.file_queue.put(('cancelled', filename))
+        except Exception as e:
+            self.file_queue.put(('error', e))
+    
+    def file_operation_busy(self, operation):
+        """Handle a Save/Load click while a file operation runs; returns True if one is running"""
+        if self.file_operation is None:
+            return False
+        if operation == self.file_operation:
+            self.file_cancel.set()
+            self.log_message(f"Mission {operation} cancelling...", "WARNING")
+        else:
+            messagebox.showinfo(f"{operation.title()} Mission", f"Please wait for the mission {self.file_operation} to finish.")
+        return True
+    
+    def start_file_operation(self, operation, target, args):
+        self.file_operation = operation
+        self.file_cancel.clear()
+        self.file_thread = threading.Thread(target=target, args=args, daemon=True)
+        self.file_thread.start()
+        self.file_button().config(text=f"Cancel {operation.title()}")
+        self.root.after(100, self.poll_file_operation)
+    
+    def file_button(self):
+        return self.save_button if self.file_operation == 'save' else self.load_button
+    
+    @timed
+    def poll_file_operation(self):
+        """Drain save/load messages on the Tk thread"""
+        operation = self.file_operation
+        progress = None
+        try:
+            while True:
+                kind, payload = self.file_queue.get_nowait()
+                if kind == 'progress':
+                    progress = payload
+                    continue
+                
+                self.file_button().config(text=operation.title())
+                self.file_operation = None
+                if self.restoring_session:
+                    self.finish_session_restore(kind, payload)
+                elif kind == 'done' and operation == 'save':
+                    self.log_message(f"Mission saved to {payload}", "SUCCESS")
+                    messagebox.showinfo("Save Mission", f"Mission saved successfully to:\n{payload}")
+                elif kind == 'done':
+                    self.apply_loaded_mission(*payload)
+                elif kind == 'cancelled':
+                    self.log_message(f"Mission {operation} cancelled", "WARNING")
+                elif operation == 'save':
+                    self.log_message(f"Failed to save mission: {str(payload)}", "ERROR")
+                    messagebox.showerror("Save Error", f"Failed to save mission:\n{str(payload)}")
+                elif isinstance(payload, json.JSONDecodeError):
+                    self.log_message(f"Failed to load mission: Invalid JSON format", "ERROR")
+                    messagebox.showerror("Load Error", "Failed to load mission:\nInvalid JSON format")
+                else:
+                    self.log_message(f"Failed to load mission: {str(payload)}", "ERROR")
+                    messagebox.showerror("Load Error", f"Failed to load mission:\n{str(payload)}")
                 return
+        except queue.Empty:
+            pass
+        if progress and progress[1]:
+            self.file_button().config(text=f"Cancel {operation.title()} ({100 * progress[0] // progress[1]}%)")
+        self.root.after(100, self.poll_file_operation)
+    
+    @timed
+    def apply_loaded_mission(self, mission, header):
+        """Show a mission loaded by the worker thread"""
+        self.set_mission(mission)
+        
+        # Center map on first waypoint
+        if self.waypoints:
+            first_wp = self.waypoints[0]
+            self.map_widget.set_position(first_wp.lat, first_wp.lon)
+        
+        loaded_count = len(self.waypoints)
+        timestamp = header.get('timestamp', 'Unknown')
+        total_distance = header.get('total_distance_km')
+        if total_distance is None:
+            total_distance = self.mission.total_distance()
+        
+        plan = (f"takeoff {self.mission.takeoff.name if self.mission.takeoff else '-'}, "
+                f"landing {self.mission.land.name if self.mission.land else '-'}, "
+                f"{len(self.mission.route)} route waypoints")
+        self.log_message(f"Mission loaded: {loaded_count} waypoints, {total_distance:.2f} km, {plan} (saved {timestamp})", "SUCCESS")
+        messagebox.showinfo("Load Mission", f"Mission loaded successfully!\n\nWaypoints: {loaded_count}\nDistance: {total_distance:.2f} km\nSaved: {timestamp}")
             
-            # Clear existing waypoints
-            if self.waypoints:
-                if not messagebox.askyesno("Load Mission", "This will clear current waypoints. Continue?"):
-                    return
-                self.clear_waypoints()
-            
-            # Load waypoints
-            loaded_count = 0
-            for wp_data in mission_data['waypoints']:
-                if 'lat' in wp_data and 'lon' in wp_data:
-                    self.add_waypoint(wp_data['lat'], wp_data['lon'])
-                    # If the loaded waypoint has a custom name, apply it
-                    if 'name' in wp_data and self.waypoints:
-                        self.waypoints[-1]['name'] = wp_data['name']
-                        self.waypoints[-1]['marker'].text = wp_data['name']
-                        self.waypoints[-1]['marker'].draw()
-                    loaded_count += 1
-            
-            # Update display to show names
-            self.update_waypoint_display()
-            
-            # Center map on first waypoint
-            if self.waypoints:
-                first_wp = self.waypoints[0]
-                self.map_widget.set_position(first_wp['lat'], first_wp['lon'])
-            
-            timestamp = mission_data.get('timestamp', 'Unknown')
-            total_distance = mission_data.get('total_distance_km', 0)
-            
-            self.log_message(f"Mission loaded: {loaded_count} waypoints, {total_distance:.2f} km (saved {timestamp})", "SUCCESS")
-            messagebox.showinfo("Load Mission", f"Mission loaded successfully!\n\nWaypoints: {loaded_count}\nDistance: {total_distance:.2f} km\nSaved: {timestamp}")
-            
-        except json.JSONDecodeError:
-            self.log_message(f"Failed to load mission: Invalid JSON format", "ERROR")
-            messagebox.showerror("Load Error", "Failed to load mission:\nInvalid JSON format")
-        except Exception as e:
-            self.log_message(f"Failed to load mission: {str(e)}", "ERROR")
-            messagebox.showerror("Load Error", f"Failed to load mission:\n{str(e)}")
+    def set_mission(self, mission):
+        """Replace the current mission, e.g. with a loaded one"""
+        self.marker_layer.clear()
+        self.clear_fleet_routes()
+        mission.set_geofences(self.geofences)
+        self.mission = mission
+        self.waypoints = mission.waypoints
+        self.spatial_index = mission.spatial_index
+        self.marker_layer.store = mission.waypoints
+        self.marker_layer.spatial_index = mission.spatial_index
+        if self.autosave:
+            self.autosave.attach(mission)
+        self.update_waypoint_display()
             
+    @timed
     def on_waypoint_double_click(self, event):
         """Handle double-click on waypoint to navigate to it"""
         selection = self.waypoint_listbox.curselection()
@@ -644,14 +1902,14 @@ class DroneControlGUI:
         if idx < len(self.waypoints):
             waypoint = self.waypoints[idx]
             # Navigate to waypoint on map
-            self.map_widget.set_position(waypoint['lat'], waypoint['lon'])
+            self.map_widget.set_position(waypoint.lat, waypoint.lon)
             self.map_widget.set_zoom(15)  # Zoom in on the waypoint
             
             # Update coordinate display
-            self.lat_var.set(f"Latitude: {waypoint['lat']:.6f}")
-            self.lon_var.set(f"Longitude: {waypoint['lon']:.6f}")
+            self.lat_var.set(f"Latitude: {waypoint.lat:.6f}")
+            self.lon_var.set(f"Longitude: {waypoint.lon:.6f}")
             
-            self.log_message(f"Navigated to {waypoint['name']} at ({waypoint['lat']:.6f}, {waypoint['lon']:.6f})", "INFO")
+            self.log_message(f"Navigated to {waypoint.name} at ({waypoint.lat:.6f}, {waypoint.lon:.6f})", "INFO")
     
     def show_waypoint_context_menu(self, event):
         """Show context menu on right-click in waypoint list"""
@@ -672,12 +1930,12 @@ class DroneControlGUI:
                                activebackground='#404040', activeforeground='white')
         
         context_menu.add_command(
-            label=f"Rename '{waypoint['name']}'",
+            label=f"Rename '{waypoint.name}'",
             command=lambda: self.rename_waypoint(waypoint)
         )
         
         context_menu.add_command(
-            label=f"Delete '{waypoint['name']}'",
+            label=f"Delete '{waypoint.name}'",
             command=lambda: self.delete_waypoint_with_confirm(waypoint)
         )
         
@@ -704,9 +1962,9 @@ class DroneControlGUI:
         dialog.transient(self.root)
         dialog.grab_set()
         
-        ttk.Label(dialog, text=f"Rename {waypoint['name']}:").pack(pady=(10, 5))
+        ttk.Label(dialog, text=f"Rename {waypoint.name}:").pack(pady=(10, 5))
         
-        entry_var = tk.StringVar(value=waypoint['name'])
+        entry_var = tk.StringVar(value=waypoint.name)
         entry = ttk.Entry(dialog, textvariable=entry_var, width=30)
         entry.pack(pady=5)
         entry.focus_set()
@@ -714,13 +1972,14 @@ class DroneControlGUI:
         
         def save_name():
             new_name = entry_var.get().strip()
-            if new_name and new_name != waypoint['name']:
-                old_name = waypoint['name']
-                waypoint['name'] = new_name
+            if new_name and new_name != waypoint.name:
+                old_name = waypoint.name
+                self.mission.rename_waypoint(waypoint, new_name)
                 
                 # Update marker text
-                waypoint['marker'].text = new_name
-                waypoint['marker'].draw()
+                if waypoint.marker:
+                    waypoint.marker.text = new_name
+                    waypoint.marker.draw()
                 
                 # Update display
                 self.update_waypoint_display()
@@ -742,35 +2001,35 @@ class DroneControlGUI:
     
     def delete_waypoint_with_confirm(self, waypoint):
         """Delete waypoint with confirmation"""
-        if messagebox.askyesno("Delete Waypoint", f"Are you sure you want to delete '{waypoint['name']}'?"):
+        if messagebox.askyesno("Delete Waypoint", f"Are you sure you want to delete '{waypoint.name}'?"):
             self.remove_waypoint(waypoint)
             
+    @timed
     def log_message(self, message, level="INFO"):
-        """Add message to log display"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # Color coding
-        colors = {
-            "INFO": "#00ff00",
-            "SUCCESS": "#00ff00",
-            "WARNING": "#ffaa00",
-            "ERROR": "#ff0000"
-        }
-        
-        log_entry = f"[{timestamp}] [{level}] {message}\n"
-        
-        self.log_display.insert(tk.END, log_entry)
-        self.log_display.see(tk.END)
-        
-        # Also print to console
-        print(log_entry.strip())
+        """Add message to the activity log (display, console and log file)"""
+        self.activity_log.log(message, level)
 
 
 def main():
-    """Main application entry point"""
+    """Main application entry point
+    
+    With arguments, runs the display-free batch CLI instead of the GUI, e.g.
+    ``python drone_control_gui.py validate missions/`` (see mission_cli.py).
+    """
+    if len(sys.argv) > 1:
+        import mission_cli
+        sys.exit(mission_cli.main(sys.argv[1:]))
+    
     root = tk.Tk()
     app = DroneControlGUI(root)
     root.mainloop()
+    if app.file_thread and app.file_operation == 'save':
+        app.file_thread.join()  # Let a running save finish
+    if app.telemetry:
+        app.telemetry.stop()
+    if app.autosave:
+        app.autosave.close()  # Clean exit: nothing to recover next time
+    app.activity_log.close()
 
 
 if __name__ == "__main__":
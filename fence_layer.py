@@ -0,0 +1,162 @@
+"""Geofence overlay for TkinterMapView
+
+Draws the no-fly zones of a GeofenceIndex as outlines and highlights the
+flight path segments that enter them. Like RouteLayer, only what lies in the
+viewport (plus VIEW_MARGIN) is put on the canvas - the fences are found with
+the index's bounding-box tree - and pans within the margin move all items
+with a single canvas.move(). When zoomed out over thousands of fences, those
+smaller than MIN_FENCE_PX are skipped and at most MAX_DRAWN_FENCES of the
+largest are drawn.
+
+The layer registers itself in the map's path list, so TkinterMapView calls
+draw() on every pan and zoom like for its own paths.
+"""
+import itertools
+import tkinter as tk
+
+import numpy as np
+
+from route_layer import VIEW_MARGIN
+from spatial_index import TILE_SIZE, mercator
+
+FENCE_COLOR = "red"
+FENCE_WIDTH = 2
+CROSSING_COLOR = "red"
+CROSSING_WIDTH = 7  # Wider than the route line, so crossing segments get a red halo
+FENCE_TAG = "geofence"  # Canvas tag prefix; every layer gets its own tag
+MIN_FENCE_PX = 2  # Fences smaller than this in both directions are not drawn
+MAX_DRAWN_FENCES = 2000
+MAX_DRAWN_CROSSINGS = 2000
+
+_layer_numbers = itertools.count(1)
+
+
+class FenceLayer:
+    """Draws geofences and the flight path segments crossing them"""
+
+    def __init__(self, map_widget, index, crossings_source):
+        self.map_widget = map_widget
+        self.index = index  # GeofenceIndex
+        self.crossings_source = crossings_source  # Returns [(from waypoint, to waypoint, fence), ...]
+        self.tag = f"{FENCE_TAG}{next(_layer_numbers)}"
+        self.crossings = np.zeros((4, 0))  # Web-Mercator x1, y1, x2, y2 of the crossing segments
+        self.fence_items = []  # Canvas polygon items
+        self.crossing_items = []  # Canvas line items
+        self.drawn = None  # (zoom, upper-left tile, scale, culled pixel bounds) of the items
+        self.update_pending = False
+        map_widget.canvas_path_list.append(self)
+
+    def schedule_update(self):
+        """Coalesce flight path change notifications into one update when Tk is idle"""
+        if not self.update_pending:
+            self.update_pending = True
+            self.map_widget.after_idle(self.update)
+
+    def update(self):
+        """Re-read the crossing segments and redraw"""
+        self.update_pending = False
+        crossings = self.crossings_source()
+        if crossings:
+            lats1, lons1, lats2, lons2 = np.array(
+                [(start.lat, start.lon, end.lat, end.lon) for start, end, _ in crossings]
+            ).T
+            self.crossings = np.vstack(mercator(lats1, lons1) + mercator(lats2, lons2))
+        elif not self.crossings.size:
+            return
+        else:
+            self.crossings = np.zeros((4, 0))
+        self.refresh()
+
+    def refresh(self):
+        """Redraw everything, e.g. after the fences changed"""
+        self.drawn = None
+        self.draw()
+
+    # Drawing (called by TkinterMapView on every pan and zoom)
+
+    def draw(self, move=False):
+        widget = self.map_widget
+        zoom = round(widget.zoom)
+        upper_left = widget.upper_left_tile_pos
+        lower_right = widget.lower_right_tile_pos
+        scale = widget.width / ((lower_right[0] - upper_left[0]) * TILE_SIZE)  # Canvas units per pixel
+
+        left, top = upper_left[0] * TILE_SIZE, upper_left[1] * TILE_SIZE
+        right, bottom = lower_right[0] * TILE_SIZE, lower_right[1] * TILE_SIZE
+        if move and self.drawn is not None:
+            drawn_zoom, drawn_upper_left, drawn_scale, bounds = self.drawn
+            if (drawn_zoom == zoom and abs(drawn_scale - scale) <= 1e-9 * scale and left >= bounds[0] and top >= bounds[1]
+                    and right <= bounds[2] and bottom <= bounds[3]):
+                dx = (drawn_upper_left[0] - upper_left[0]) * TILE_SIZE * scale
+                dy = (drawn_upper_left[1] - upper_left[1]) * TILE_SIZE * scale
+                widget.canvas.move(self.tag, dx, dy)
+                self.drawn = (zoom, upper_left, scale, bounds)
+                return
+
+        margin_x = (right - left) * VIEW_MARGIN
+        margin_y = (bottom - top) * VIEW_MARGIN
+        bounds = (left - margin_x, top - margin_y, right + margin_x, bottom + margin_y)
+        self.render(zoom, upper_left, scale, bounds)
+        self.drawn = (zoom, upper_left, scale, bounds)
+
+    def render(self, zoom, upper_left, scale, bounds):
+        """Put the fences and crossing segments within bounds on the canvas"""
+        world = TILE_SIZE * 2.0 ** zoom
+        origin_x, origin_y = upper_left[0] * TILE_SIZE, upper_left[1] * TILE_SIZE
+        canvas = self.map_widget.canvas
+        created = False
+
+        # Fences in view, largest first when there are too many
+        fences = np.zeros(0, dtype=np.int64)
+        if len(self.index):
+            fences = self.index.query_box(*(value / world for value in bounds))
+            sizes = (self.index.boxes[fences, 2:] - self.index.boxes[fences, :2]) * world
+            fences = fences[sizes.max(axis=1) >= MIN_FENCE_PX]
+            if fences.size > MAX_DRAWN_FENCES:
+                areas = np.prod(self.index.boxes[fences, 2:] - self.index.boxes[fences, :2], axis=1)
+                fences = fences[np.argsort(-areas, kind='stable')[:MAX_DRAWN_FENCES]]
+        for i, fence in enumerate(fences.tolist()):
+            x, y = self.index.corners(fence)
+            coords = np.column_stack(((x * world - origin_x) * scale, (y * world - origin_y) * scale)).ravel().tolist()
+            if i < len(self.fence_items):
+                canvas.coords(self.fence_items[i], coords)
+            else:
+                self.fence_items.append(canvas.create_polygon(
+                    coords, outline=FENCE_COLOR, fill="", width=FENCE_WIDTH, tags=("polygon", self.tag)
+                ))
+                created = True
+        self.delete_items(self.fence_items, fences.size)
+
+        # Crossing segments in view
+        x1, y1, x2, y2 = self.crossings * world
+        visible = np.flatnonzero((np.minimum(x1, x2) <= bounds[2]) & (np.maximum(x1, x2) >= bounds[0])
+                                 & (np.minimum(y1, y2) <= bounds[3]) & (np.maximum(y1, y2) >= bounds[1]))
+        visible = visible[:MAX_DRAWN_CROSSINGS]
+        segments = np.column_stack((
+            (x1[visible] - origin_x) * scale, (y1[visible] - origin_y) * scale,
+            (x2[visible] - origin_x) * scale, (y2[visible] - origin_y) * scale
+        )).tolist()
+        for i, coords in enumerate(segments):
+            if i < len(self.crossing_items):
+                canvas.coords(self.crossing_items[i], coords)
+            else:
+                self.crossing_items.append(canvas.create_line(
+                    coords, width=CROSSING_WIDTH, fill=CROSSING_COLOR, capstyle=tk.ROUND, tags=("path", self.tag)
+                ))
+                created = True
+        self.delete_items(self.crossing_items, len(segments))
+        if created:
+            self.map_widget.manage_z_order()
+
+    def delete_items(self, items, keep):
+        """Delete canvas items of a list beyond the first keep"""
+        for item in items[keep:]:
+            self.map_widget.canvas.delete(item)
+        del items[keep:]
+
+    def delete(self):
+        """Remove the overlay from the map (also called by TkinterMapView.delete_all_path)"""
+        self.delete_items(self.fence_items, 0)
+        self.delete_items(self.crossing_items, 0)
+        if self in self.map_widget.canvas_path_list:
+            self.map_widget.canvas_path_list.remove(self)
@@ -0,0 +1,219 @@
+"""Multi-vehicle mission planning
+
+plan_fleet() splits a set of waypoints among several vehicles, each with its
+own takeoff and landing point (or one shared pair), and orders every
+vehicle's share:
+
+1. Balanced clustering. The waypoints are put in Hilbert-curve order, which
+   keeps neighbouring waypoints close together along the curve, and the
+   curve is cut into one contiguous piece per vehicle. A piece's cost is
+   estimated in O(1) from prefix sums: either its route length - the legs
+   from the vehicle's takeoff to the piece's centroid and on to its
+   landing, plus CURVE_TOUR_RATIO times the curve length through the piece
+   - or its flight time (that length at cruise speed plus a hover turn per
+   waypoint). The cuts are found by bisecting on the largest piece cost, so
+   the pieces get similar costs rather than similar sizes. Vehicles with
+   their own bases take the pieces in the curve order of their takeoff
+   points. Clustering 10k waypoints among 8 vehicles takes about 0.1 s; the
+   optimized routes typically end up within 10-20% of each other.
+2. Route optimization. Each vehicle's route is ordered with
+   route_optimizer.optimize_route in its own worker process, so the
+   vehicles are optimized in parallel. The pool uses the 'spawn' start
+   method because the GUI calls this from a worker thread.
+3. Every optimized route is simulated (flight_sim) for its flight time and
+   battery at landing.
+"""
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import math
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import flight_sim
+import geodesy
+import route_optimizer
+from spatial_index import hilbert_index
+
+BALANCE_MODES = ('distance', 'time')
+DEFAULT_VEHICLES = 4
+MAX_VEHICLES = 16
+DEFAULT_TIME_BUDGET = route_optimizer.DEFAULT_TIME_BUDGET  # Seconds of optimization per vehicle
+CURVE_BITS = 16  # Hilbert curve resolution: a 65536 x 65536 grid over the waypoints
+CURVE_TOUR_RATIO = 0.8  # Optimized tour length per unit of Hilbert-curve length
+TURN_ESTIMATE = 90.0  # Average hover turn per waypoint in degrees (flight time estimate)
+BISECTION_STEPS = 30
+CANCEL_POLL_INTERVAL = 0.1  # Seconds between cancel checks while vehicles are optimized
+KM_PER_DEGREE = geodesy.EARTH_RADIUS_KM * math.pi / 180
+
+VehiclePlan = namedtuple('VehiclePlan', [
+    'vehicle',  # 0-based vehicle number
+    'indices',  # Indices into the planned waypoints, in flight order
+    'lats',  # Flight path: takeoff, waypoints, landing
+    'lons',
+    'distance_km',
+    'flight_time',  # Seconds
+    'battery'  # Percent left at landing
+])
+FleetPlan = namedtuple('FleetPlan', ['vehicles', 'balance', 'spread', 'seconds'])
+
+
+def local_plane(lats, lons, origin):
+    """Local east/north km around origin (lat, lon)"""
+    scale = math.cos(math.radians(origin[0]))
+    x = (np.asarray(lons, dtype=np.float64) - origin[1]) * KM_PER_DEGREE * scale
+    y = (np.asarray(lats, dtype=np.float64) - origin[0]) * KM_PER_DEGREE
+    return np.column_stack((x, y))
+
+
+def cluster_waypoints(points, takeoffs, lands, balance='distance', profile=None):
+    """Balanced split of an (n, 2) km point array: the vehicle number of every point"""
+    profile = profile or flight_sim.DEFAULT_PROFILE
+    count, vehicles = len(points), len(takeoffs)
+    low = points.min(axis=0)
+    scale = ((1 << CURVE_BITS) - 1) / max(float((points.max(axis=0) - low).max()), 1e-9)
+
+    def grid(xy):
+        return np.clip(((xy - low) * scale).astype(np.int64), 0, (1 << CURVE_BITS) - 1).T
+
+    curve = np.argsort(hilbert_index(*grid(points), CURVE_BITS), kind='stable')
+    vehicle_order = np.argsort(hilbert_index(*grid(takeoffs), CURVE_BITS), kind='stable')
+    takeoffs, lands = takeoffs[vehicle_order], lands[vehicle_order]
+
+    # Prefix sums along the curve: length, coordinates
+    ordered = points[curve]
+    length = np.zeros(count)
+    np.cumsum(np.hypot(*np.diff(ordered, axis=0).T), out=length[1:])
+    sum_x = np.concatenate(([0.0], np.cumsum(ordered[:, 0])))
+    sum_y = np.concatenate(([0.0], np.cumsum(ordered[:, 1])))
+
+    def cost(k, start, ends):
+        """Estimated cost of vehicle k flying the curve pieces [start, end) for every end"""
+        size = ends - start
+        cx = (sum_x[ends] - sum_x[start]) / size
+        cy = (sum_y[ends] - sum_y[start]) / size
+        legs = np.hypot(cx - takeoffs[k, 0], cy - takeoffs[k, 1]) + np.hypot(lands[k, 0] - cx, lands[k, 1] - cy)
+        route = legs + CURVE_TOUR_RATIO * (length[ends - 1] - length[start])
+        if balance == 'distance':
+            return route
+        return route * 1000 / profile.cruise_speed + size * TURN_ESTIMATE / profile.turn_rate
+
+    def cut(limit):
+        """Greedily cut the longest pieces within limit; returns the cuts and the last piece's cost"""
+        cuts = [0]
+        for k in range(vehicles - 1):
+            ends = np.arange(cuts[-1] + 1, count - (vehicles - 2 - k))
+            within = np.flatnonzero(cost(k, cuts[-1], ends) <= limit)
+            cuts.append(int(ends[within[-1]]) if within.size else cuts[-1] + 1)
+        cuts.append(count)
+        return cuts, float(cost(vehicles - 1, cuts[-2], np.array([count]))[0])
+
+    whole = np.array([count])
+    low_limit, high_limit = 0.0, max(float(cost(k, 0, whole)[0]) for k in range(vehicles))
+    best = cut(high_limit)[0]
+    for _ in range(BISECTION_STEPS):
+        limit = (low_limit + high_limit) / 2
+        cuts, last = cut(limit)
+        if last <= limit:
+            best, high_limit = cuts, limit
+        else:
+            low_limit = limit
+
+    labels = np.empty(count, dtype=np.int64)
+    for k in range(vehicles):
+        labels[curve[best[k]:best[k + 1]]] = vehicle_order[k]
+    return labels
+
+
+def optimize_vehicle(lats, lons, time_budget, cancel_event=None):
+    """Order one vehicle's route (runs in a worker process); returns (order, distance_km)"""
+    result = route_optimizer.optimize_route(lats, lons, time_budget=time_budget, cancel_event=cancel_event)
+    return result.order, result.distance
+
+
+def plan_fleet(lats, lons, vehicles, takeoffs, lands, balance='distance', time_budget=DEFAULT_TIME_BUDGET,
+               workers=None, profile=None, cancel_event=None, progress=None):
+    """Split waypoints among vehicles and optimize every vehicle's route
+
+    takeoffs/lands are one (lat, lon) per vehicle, or a single one shared by
+    all vehicles. balance is 'distance' or 'time'. progress(done, total) is
+    called as vehicles finish. workers=1 optimizes in-process. Returns a
+    FleetPlan, or None if cancel_event was set; spread is max / min - 1 of
+    the balanced quantity over the vehicles.
+    """
+    started = time.perf_counter()
+    profile = profile or flight_sim.DEFAULT_PROFILE
+    if balance not in BALANCE_MODES:
+        raise ValueError(f"Unknown balance {balance!r}, expected one of {', '.join(BALANCE_MODES)}")
+    if len(takeoffs) not in (1, vehicles) or len(lands) not in (1, vehicles):
+        raise ValueError("Give one takeoff and one landing point per vehicle, or one shared pair")
+    if not 1 <= vehicles <= MAX_VEHICLES:
+        raise ValueError(f"A fleet has 1 to {MAX_VEHICLES} vehicles")
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats.size < vehicles:
+        raise ValueError(f"Need at least one waypoint per vehicle ({vehicles})")
+    takeoffs = np.broadcast_to(np.asarray(takeoffs, dtype=np.float64), (vehicles, 2))
+    lands = np.broadcast_to(np.asarray(lands, dtype=np.float64), (vehicles, 2))
+
+    origin = (float(lats.mean()), float(lons.mean()))
+    labels = cluster_waypoints(
+        local_plane(lats, lons, origin), local_plane(*takeoffs.T, origin), local_plane(*lands.T, origin),
+        balance, profile
+    )
+
+    # Flight paths to optimize: takeoff, the vehicle's waypoints, landing
+    members = [np.flatnonzero(labels == k) for k in range(vehicles)]
+    largest = max(m.size for m in members)
+    if largest > route_optimizer.MAX_ROUTE_WAYPOINTS:
+        raise ValueError(f"A vehicle would get {largest} waypoints; routes are optimized up to "
+                         f"{route_optimizer.MAX_ROUTE_WAYPOINTS} waypoints, so use more vehicles")
+    paths = [
+        (np.concatenate(([takeoffs[k, 0]], lats[m], [lands[k, 0]])),
+         np.concatenate(([takeoffs[k, 1]], lons[m], [lands[k, 1]])))
+        for k, m in enumerate(members)
+    ]
+
+    results = [None] * vehicles
+    workers = min(workers or os.cpu_count() or 1, vehicles)
+    if workers == 1:
+        for k, (path_lats, path_lons) in enumerate(paths):
+            if cancel_event and cancel_event.is_set():
+                return None
+            results[k] = optimize_vehicle(path_lats, path_lons, time_budget, cancel_event)
+            if progress:
+                progress(k + 1, vehicles)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            futures = {pool.submit(optimize_vehicle, path_lats, path_lons, time_budget): k
+                       for k, (path_lats, path_lons) in enumerate(paths)}
+            pending = set(futures)
+            while pending:
+                if cancel_event and cancel_event.is_set():
+                    return None
+                finished, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[futures[future]] = future.result()
+                if finished and progress:
+                    progress(vehicles - len(pending), vehicles)
+        finally:
+            # Running optimizations end with their time budget; do not wait for them when cancelled
+            pool.shutdown(wait=not (cancel_event and cancel_event.is_set()), cancel_futures=True)
+
+    plans = []
+    for k, ((order, distance), (path_lats, path_lons)) in enumerate(zip(results, paths)):
+        order = np.asarray(order, dtype=np.int64)
+        flight_order = np.concatenate(([0], order + 1, [len(path_lats) - 1]))
+        flight_lats, flight_lons = path_lats[flight_order], path_lons[flight_order]
+        simulation = flight_sim.simulate_route(flight_lats, flight_lons, profile)
+        plans.append(VehiclePlan(
+            k, members[k][order], flight_lats, flight_lons, distance,
+            simulation.total_time, simulation.remaining_battery
+        ))
+
+    balanced = np.array([plan.distance_km if balance == 'distance' else plan.flight_time for plan in plans])
+    spread = float(balanced.max() / balanced.min() - 1) if balanced.min() > 0 else 0.0
+    return FleetPlan(plans, balance, spread, time.perf_counter() - started)
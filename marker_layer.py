@@ -0,0 +1,172 @@
+"""Viewport-culled, clustered waypoint markers for TkinterMapView
+
+Creating one TkinterMapView marker per waypoint makes every pan and zoom redraw
+all of them. MarkerLayer only keeps canvas markers for waypoints inside the
+visible map area (plus a small margin). When too many unassigned waypoints are
+visible, they are merged per screen-grid cell into cluster markers showing
+their count. Takeoff, landing and route waypoints are never clustered and are
+always drawn with their own colors.
+
+The layer polls the map view with after() and only re-renders when the zoom
+level or position changed, or when the planner asks for a refresh.
+"""
+import numpy as np
+
+from spatial_index import TILE_SIZE, mercator, mercator_latitude
+from waypoint_store import TYPE_CODES, TYPE_NAMES
+
+# Marker colors (circle, outside) per waypoint type
+MARKER_COLORS = {
+    'takeoff': ("green", "darkgreen"),
+    'land': ("blue", "darkblue"),
+    'route': ("purple", "darkviolet"),
+    'normal': ("gray", "darkgray")
+}
+CLUSTER_COLORS = ("white", "gray")
+
+POLL_INTERVAL = 100  # ms between viewport checks
+VIEW_MARGIN = 0.25  # Extra area around the viewport (fraction of its size) kept rendered
+MAX_MARKERS = 300  # Above this many visible unassigned waypoints, cluster them
+CLUSTER_ZOOM = 13  # Below this zoom level unassigned waypoints are always clustered
+CLUSTER_CELL_PX = 60  # Screen cell size used to merge waypoints into clusters
+
+
+class MarkerLayer:
+    """Renders waypoint markers for the visible part of the map only"""
+        
+    def __init__(self, map_widget, store, spatial_index):
+        self.map_widget = map_widget
+        self.store = store
+        self.spatial_index = spatial_index
+        self.clusters = {}  # (zoom, cell_x, cell_y, count) -> cluster marker
+        self.last_view = None
+        self.refresh_pending = False
+        self.map_widget.after(POLL_INTERVAL, self.poll)
+        
+    def poll(self):
+        """Re-render when the visible map area changed"""
+        if self.current_view() != self.last_view:
+            self.refresh()
+        self.map_widget.after(POLL_INTERVAL, self.poll)
+        
+    def current_view(self):
+        return (
+            round(self.map_widget.zoom),
+            tuple(self.map_widget.upper_left_tile_pos),
+            tuple(self.map_widget.lower_right_tile_pos)
+        )
+        
+    def schedule_refresh(self):
+        """Coalesce refresh requests into one render when Tk is idle"""
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.map_widget.after_idle(self.refresh)
+        
+    # Marker management
+        
+    def create_marker(self, waypoint_id, lat, lon, waypoint_type):
+        circle, outside = MARKER_COLORS[waypoint_type]
+        marker = self.map_widget.set_marker(
+            lat, lon,
+            text=self.store.get(waypoint_id).name,
+            marker_color_circle=circle,
+            marker_color_outside=outside
+        )
+        self.store.markers[waypoint_id] = marker
+        
+    def remove(self, waypoint_id):
+        """Delete the marker of a waypoint if it is rendered"""
+        marker = self.store.markers.pop(waypoint_id, None)
+        if marker:
+            marker.delete()
+        
+    def clear(self):
+        """Delete all waypoint and cluster markers"""
+        for marker in self.store.markers.values():
+            marker.delete()
+        self.store.markers.clear()
+        for marker in self.clusters.values():
+            marker.delete()
+        self.clusters.clear()
+        
+    # Rendering
+        
+    def refresh(self):
+        """Bring canvas markers in line with the visible waypoints"""
+        self.refresh_pending = False
+        view = self.current_view()
+        self.last_view = view
+        zoom, upper_left, lower_right = view
+        
+        # Visible area with margin, in tile coordinates
+        margin_x = (lower_right[0] - upper_left[0]) * VIEW_MARGIN
+        margin_y = (lower_right[1] - upper_left[1]) * VIEW_MARGIN
+        ids = self.spatial_index.query_tiles(
+            (upper_left[0] - margin_x, upper_left[1] - margin_y),
+            (lower_right[0] + margin_x, lower_right[1] + margin_y),
+            zoom
+        )
+        slots = self.store.slot_index[ids]
+        types = self.store.types[slots]
+        normal = types == TYPE_CODES['normal']
+        
+        individual = ~normal
+        cluster_keys = {}
+        if np.count_nonzero(normal) > MAX_MARKERS or (zoom < CLUSTER_ZOOM and np.any(normal)):
+            cluster_keys, singles = self.build_clusters(slots[normal], zoom)
+            # Waypoints alone in their cell are drawn individually
+            individual[np.flatnonzero(normal)[singles]] = True
+        else:
+            individual |= normal
+        
+        self.render_individual(ids[individual], slots[individual], types[individual])
+        self.render_clusters(cluster_keys)
+        
+    def render_individual(self, ids, slots, types):
+        wanted = dict(zip(ids.tolist(), zip(slots.tolist(), types.tolist())))
+        markers = self.store.markers
+        
+        for waypoint_id in [wp_id for wp_id in markers if wp_id not in wanted]:
+            markers.pop(waypoint_id).delete()
+        
+        lats, lons = self.store.lats, self.store.lons
+        for waypoint_id, (slot, code) in wanted.items():
+            if waypoint_id not in markers:
+                self.create_marker(waypoint_id, lats[slot], lons[slot], TYPE_NAMES[code])
+        
+    def build_clusters(self, slots, zoom):
+        """Group waypoints by screen cell
+        
+        Returns ({(zoom, cx, cy, count): (lat, lon)} for cells holding several
+        waypoints, mask of the waypoints that are alone in their cell).
+        """
+        lats, lons = self.store.lats[slots], self.store.lons[slots]
+        x, y = mercator(lats, lons)
+        cell_size = CLUSTER_CELL_PX / (TILE_SIZE * 2.0 ** zoom)
+        cell_x = np.floor(x / cell_size).astype(np.int64)
+        cell_y = np.floor(y / cell_size).astype(np.int64)
+        
+        keys = cell_x * (1 << 32) + cell_y
+        unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        mean_x = np.bincount(inverse, weights=x) / counts
+        mean_y = np.bincount(inverse, weights=y) / counts
+        
+        clusters = {}
+        for key, count, cx, cy in zip(unique.tolist(), counts.tolist(), mean_x.tolist(), mean_y.tolist()):
+            if count > 1:
+                clusters[(zoom, key >> 32, key & 0xFFFFFFFF, count)] = (mercator_latitude(cy), cx * 360.0 - 180.0)
+        return clusters, counts[inverse] == 1
+        
+    def render_clusters(self, wanted):
+        for key in [key for key in self.clusters if key not in wanted]:
+            self.clusters.pop(key).delete()
+        
+        for key, (lat, lon) in wanted.items():
+            if key not in self.clusters:
+                circle, outside = CLUSTER_COLORS
+                self.clusters[key] = self.map_widget.set_marker(
+                    lat, lon,
+                    text=str(key[3]),
+                    marker_color_circle=circle,
+                    marker_color_outside=outside
+                )
@@ -0,0 +1,487 @@
+"""Display-free mission planning core
+
+Mission holds a mission plan - waypoints, the takeoff and landing points and
+the ordered route between them - together with the structures the planner
+keeps in sync with it: the columnar WaypointStore, the SpatialIndex used for
+map queries, the RouteMetrics distance cache and the RouteFenceCheck of the
+flight path against geofences. Nothing here imports Tk, so
+missions can be validated, measured and converted on machines without a
+display (see mission_cli.py); the GUI drives the same object and only adds
+markers, dialogs and logging on top.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import repeat
+import numbers
+
+import numpy as np
+
+import flight_sim
+from geofence import RouteFenceCheck
+import geodesy
+import mission_format
+from route_metrics import RouteMetrics
+from spatial_index import SpatialIndex
+from waypoint_store import Waypoint, WaypointStore
+
+MAX_REPORTED_CROSSINGS = 5  # Geofence crossings listed by validate()
+
+MissionSummary = namedtuple('MissionSummary', ['waypoints', 'route_waypoints', 'direct_km', 'route_km', 'segments_km'])
+
+
+def check_mission_data(data):
+    """Return a list of problems found in decoded mission file data (empty if usable)"""
+    if not isinstance(data, dict):
+        return ["Mission file is not a JSON object"]
+    if 'waypoints' not in data:
+        return ["Invalid mission file: missing waypoints data"]
+    if not isinstance(data['waypoints'], list):
+        return ["Invalid mission file: waypoints is not a list"]
+
+    problems = []
+    ids = set()
+    for i, entry in enumerate(data['waypoints']):
+        label = f"Waypoint {i + 1}"
+        if not isinstance(entry, dict):
+            problems.append(f"{label}: not an object")
+            continue
+        lat, lon = entry.get('lat'), entry.get('lon')
+        if not isinstance(lat, numbers.Real) or not isinstance(lon, numbers.Real):
+            problems.append(f"{label}: missing or non-numeric coordinates")
+        elif not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            problems.append(f"{label}: coordinates out of range ({lat}, {lon})")
+        if 'id' in entry:
+            if entry['id'] in ids:
+                problems.append(f"{label}: duplicate id {entry['id']}")
+            ids.add(entry['id'])
+
+    for key in ('takeoff_id', 'land_id'):
+        if data.get(key) is not None and data[key] not in ids:
+            problems.append(f"{key} {data[key]} does not match any waypoint")
+    missing = [wp_id for wp_id in data.get('route') or [] if wp_id not in ids]
+    if missing:
+        problems.append(f"Route references unknown waypoint ids: {missing}")
+    return problems
+
+
+class Mission:
+    """Waypoints and flight plan of one mission"""
+
+    def __init__(self):
+        self.waypoints = WaypointStore()  # Columnar waypoint table with id index
+        self.spatial_index = SpatialIndex(self.waypoints)  # Grid index for map queries
+        self.last_id = 0  # Highest waypoint id handed out
+        self.takeoff = None
+        self.land = None
+        self.route = []  # Waypoints in the flight path
+        self.route_positions = {}  # Waypoint id -> index in route
+        self.metrics = RouteMetrics()  # Cached distances for takeoff -> route -> land
+        self.fence_check = RouteFenceCheck()  # Geofence crossings of takeoff -> route -> land
+        self.journal = None  # Optional autosave journal receiving every edit (see autosave.py)
+
+    def record(self, *edit):
+        """Pass an edit to the journal, if any"""
+        if self.journal is not None:
+            self.journal.record(edit)
+
+    @contextmanager
+    def bulk_change(self):
+        """Journal a bulk change as one new snapshot instead of edit by edit"""
+        journal, self.journal = self.journal, None
+        try:
+            yield
+        finally:
+            self.journal = journal
+            if journal is not None:
+                journal.reset(self)
+
+    # Waypoints
+
+    def add_waypoint(self, lat, lon, name=None, waypoint_id=None):
+        """Add a waypoint and return it
+
+        waypoint_id restores a known, unused id (e.g. when replaying a journal).
+        """
+        if waypoint_id is None:
+            waypoint_id = self.last_id + 1
+        self.last_id = max(self.last_id, waypoint_id)
+        self.spatial_index.add(waypoint_id, lat, lon)
+        waypoint = self.waypoints.add(waypoint_id, lat, lon, name=name)
+        self.record('add', waypoint_id, lat, lon, name)
+        return waypoint
+
+    def add_waypoints(self, waypoint_entries, takeoff_id=None, land_id=None, route_ids=None):
+        """Add many waypoints in one pass
+
+        Entries are dicts with 'lat', 'lon' and optional 'id', 'name' and 'type'.
+        takeoff_id, land_id and route_ids refer to entry ids and restore the
+        mission plan. Without them, entries typed 'takeoff', 'land' or 'route'
+        are used, with route order following entry order. Returns the number
+        of added waypoints.
+        """
+        entries = [entry for entry in waypoint_entries if 'lat' in entry and 'lon' in entry]
+        if not entries:
+            return 0
+        with self.bulk_change():
+            return self._add_waypoints(entries, takeoff_id, land_id, route_ids)
+
+    def _add_waypoints(self, entries, takeoff_id, land_id, route_ids):
+
+        # Assign ids and append all coordinates to the store in one pass
+        first_id = self.last_id + 1
+        self.last_id += len(entries)
+        ids = range(first_id, self.last_id + 1)
+        lats = np.fromiter((entry['lat'] for entry in entries), dtype=np.float64, count=len(entries))
+        lons = np.fromiter((entry['lon'] for entry in entries), dtype=np.float64, count=len(entries))
+
+        names = {}
+        by_entry_id = {}
+        typed = {'takeoff': None, 'land': None, 'route': []}
+        for waypoint_id, entry in zip(ids, entries):
+            if entry.get('name'):
+                names[waypoint_id] = entry['name']
+            if 'id' in entry:
+                by_entry_id[entry['id']] = waypoint_id
+
+            entry_type = entry.get('type')
+            if entry_type == 'route':
+                typed['route'].append(waypoint_id)
+            elif entry_type in ('takeoff', 'land') and typed[entry_type] is None:
+                typed[entry_type] = waypoint_id
+
+        self.waypoints.extend(ids, lats, lons, names=names)
+        self.spatial_index.extend(ids, lats, lons)
+
+        # Resolve the mission plan from explicit ids, falling back to entry types
+        takeoff_id = by_entry_id.get(takeoff_id) if takeoff_id is not None else typed['takeoff']
+        land_id = by_entry_id.get(land_id) if land_id is not None else typed['land']
+        if route_ids is not None:
+            route_ids = [by_entry_id[wp_id] for wp_id in route_ids if wp_id in by_entry_id]
+        else:
+            route_ids = typed['route']
+        route_ids = [wp_id for wp_id in dict.fromkeys(route_ids) if wp_id != takeoff_id and wp_id != land_id]
+        route = [self.waypoints.get(wp_id) for wp_id in route_ids]
+
+        self.waypoints.set_type(route_ids, 'route')
+        self.route.extend(route)
+        self.reindex_route(len(self.route) - len(route))
+        route_lats, route_lons = self.waypoints.coordinates_of(route)
+        self.metrics.extend(route_lats, route_lons)
+        self.fence_check.extend(route_lats, route_lons)
+        if land_id is not None:
+            self.set_land(self.waypoints.get(land_id))
+        if takeoff_id is not None:
+            self.set_takeoff(self.waypoints.get(takeoff_id))
+        return len(entries)
+
+    def add_waypoint_arrays(self, lats, lons, types=None, ids=None):
+        """Add waypoints from coordinate arrays without touching the plan; returns their ids
+
+        types is an optional array of type codes. ids, if given, must be
+        unique and above last_id; otherwise new ids are handed out.
+        """
+        with self.bulk_change():
+            return self._add_waypoint_arrays(lats, lons, types, ids)
+
+    def _add_waypoint_arrays(self, lats, lons, types, ids):
+        count = len(lats)
+        if ids is None:
+            ids = np.arange(self.last_id + 1, self.last_id + 1 + count, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if count:
+            self.last_id = max(self.last_id, int(ids.max()))
+        self.waypoints.extend(ids, lats, lons, types=types)
+        self.spatial_index.extend(ids, lats, lons)
+        return ids
+
+    def add_survey(self, lats, lons):
+        """Add survey waypoints in flight order as one bulk change; returns their ids
+
+        The points are appended to the route. If the mission has no takeoff
+        point the first survey point becomes it, and without a landing point
+        the last one becomes the landing point.
+        """
+        if len(lats) == 0:
+            raise ValueError("The survey has no waypoints")
+        with self.bulk_change():
+            ids = self.add_waypoint_arrays(lats, lons)
+            takeoff_id = self.takeoff.id if self.takeoff else int(ids[0])
+            land_id = self.land.id if self.land else int(ids[-1])
+            route_ids = [wp.id for wp in self.route] + ids.tolist()
+            self.set_plan(takeoff_id, land_id, route_ids)
+        return ids
+
+    def remove_waypoint(self, waypoint):
+        """Remove a waypoint, taking it out of the plan first"""
+        if waypoint.id in self.route_positions:
+            self.remove_from_route(waypoint)
+        if waypoint == self.takeoff:
+            self.takeoff = None
+            self.metrics.set_takeoff(None)
+            self.fence_check.set_takeoff(None)
+        if waypoint == self.land:
+            self.land = None
+            self.metrics.set_land(None)
+            self.fence_check.set_land(None)
+
+        self.spatial_index.remove(waypoint.id, waypoint.lat, waypoint.lon)
+        self.waypoints.remove(waypoint.id)
+        self.record('remove', waypoint.id)
+
+    def rename_waypoint(self, waypoint, name):
+        waypoint.name = name
+        self.record('rename', waypoint.id, name)
+
+    def clear(self):
+        """Remove all waypoints and the plan"""
+        with self.bulk_change():
+            self._clear()
+
+    def _clear(self):
+        self.waypoints.clear()
+        self.spatial_index.clear()
+        self.takeoff = None
+        self.land = None
+        self.route.clear()
+        self.route_positions.clear()
+        self.metrics.clear()
+        self.fence_check.clear()
+
+    # Plan
+
+    def set_plan(self, takeoff_id, land_id, route_ids):
+        """Replace the whole plan by waypoint ids in one pass"""
+        with self.bulk_change():
+            self._set_plan(takeoff_id, land_id, route_ids)
+
+    def _set_plan(self, takeoff_id, land_id, route_ids):
+        old = [wp.id for wp in self.route] + [wp.id for wp in (self.takeoff, self.land) if wp]
+        self.waypoints.set_type(old, 'normal')
+
+        route_ids = np.asarray(route_ids, dtype=np.int64)
+        route_ids = route_ids[(route_ids != takeoff_id) & (route_ids != land_id)]
+        ids = route_ids.tolist()
+        self.route_positions = dict(zip(ids, range(len(ids))))
+        if len(self.route_positions) < len(ids):
+            # Keep the first occurrence of repeated ids
+            ids = list(dict.fromkeys(ids))
+            route_ids = np.asarray(ids, dtype=np.int64)
+            self.route_positions = dict(zip(ids, range(len(ids))))
+        self.route = list(map(Waypoint, repeat(self.waypoints, len(ids)), ids))
+        self.waypoints.set_type(route_ids, 'route')
+        self.metrics.clear()
+        self.fence_check.clear()
+        slots = self.waypoints.slot_index[route_ids]
+        self.metrics.extend(self.waypoints.lats[slots], self.waypoints.lons[slots])
+        self.fence_check.extend(self.waypoints.lats[slots], self.waypoints.lons[slots])
+
+        self.takeoff = self.land = None
+        if land_id is not None:
+            self.set_land(self.waypoints.get(land_id))
+        if takeoff_id is not None:
+            self.set_takeoff(self.waypoints.get(takeoff_id))
+
+    def plan_type(self, waypoint):
+        """Waypoint type implied by the current plan"""
+        if waypoint == self.takeoff:
+            return 'takeoff'
+        if waypoint == self.land:
+            return 'land'
+        return 'route' if waypoint.id in self.route_positions else 'normal'
+
+    def set_takeoff(self, waypoint):
+        """Make a waypoint the takeoff point; returns the previous takeoff point"""
+        if waypoint.id in self.route_positions:
+            self.remove_from_route(waypoint)
+        previous, self.takeoff = self.takeoff, waypoint
+        if previous:
+            previous.type = self.plan_type(previous)
+        waypoint.type = 'takeoff'
+        self.metrics.set_takeoff((waypoint.lat, waypoint.lon))
+        self.fence_check.set_takeoff((waypoint.lat, waypoint.lon))
+        self.record('takeoff', waypoint.id)
+        return previous
+
+    def set_land(self, waypoint):
+        """Make a waypoint the landing point; returns the previous landing point"""
+        if waypoint.id in self.route_positions:
+            self.remove_from_route(waypoint)
+        previous, self.land = self.land, waypoint
+        if previous:
+            previous.type = self.plan_type(previous)
+        waypoint.type = 'land'
+        self.metrics.set_land((waypoint.lat, waypoint.lon))
+        self.fence_check.set_land((waypoint.lat, waypoint.lon))
+        self.record('land', waypoint.id)
+        return previous
+
+    def toggle_route(self, waypoint):
+        """Add a waypoint to the end of the route or remove it; returns True if it was added"""
+        if waypoint == self.takeoff or waypoint == self.land:
+            raise ValueError("Takeoff and landing points are automatically in the route.")
+
+        self.record('route', waypoint.id)
+        if waypoint.id in self.route_positions:
+            self.remove_from_route(waypoint)
+            waypoint.type = 'normal'
+            return False
+
+        self.route_positions[waypoint.id] = len(self.route)
+        self.route.append(waypoint)
+        self.metrics.append(waypoint.lat, waypoint.lon)
+        self.fence_check.append(waypoint.lat, waypoint.lon)
+        waypoint.type = 'route'
+        return True
+
+    def remove_from_route(self, waypoint):
+        """Remove a waypoint from the flight route and return its former position"""
+        route_idx = self.route_positions.pop(waypoint.id)
+        del self.route[route_idx]
+        self.metrics.remove(route_idx)
+        self.fence_check.remove(route_idx)
+        self.reindex_route(route_idx)
+        return route_idx
+
+    def reindex_route(self, start=0):
+        """Refresh route positions from a route index onwards"""
+        for i in range(start, len(self.route)):
+            self.route_positions[self.route[i].id] = i
+
+    def reorder_route(self, order):
+        """Reorder the route by a sequence of current route indices"""
+        with self.bulk_change():
+            self._reorder_route(order)
+
+    def _reorder_route(self, order):
+        self.route = [self.route[i] for i in order]
+        self.reindex_route()
+        lats, lons = self.waypoints.coordinates_of(self.route)
+        self.metrics.clear_route()
+        self.metrics.extend(lats, lons)
+        self.fence_check.clear_route()
+        self.fence_check.extend(lats, lons)
+
+    def full_route(self):
+        """Takeoff, route and landing waypoints in flight order"""
+        return [self.takeoff] + self.route + [self.land]
+
+    def flight_path(self):
+        """Waypoints of the flight path so far: takeoff and landing only if set"""
+        return ([self.takeoff] if self.takeoff else []) + self.route + ([self.land] if self.land else [])
+
+    def route_coordinates(self):
+        """(lats, lons) of the flight path so far: takeoff and landing only if set"""
+        return self.waypoints.coordinates_of(self.flight_path())
+
+    # Geofences
+
+    def set_geofences(self, index):
+        """Check the flight path against a GeofenceIndex (call again after changing its fences)"""
+        self.fence_check.index = index
+        self.fence_check.revalidate()
+
+    def geofence_crossings(self):
+        """(from waypoint, to waypoint, Geofence) of every flight path segment entering a geofence"""
+        violations = self.fence_check.violations()
+        if not violations:
+            return []
+        path = self.flight_path()
+        fences = self.fence_check.index.fences
+        return [(path[segment], path[segment + 1], fences[fence]) for segment, fence in violations]
+
+    # Analysis
+
+    def validate(self, geofences=True):
+        """Return a list of problems that prevent flying the mission (empty if ready)
+
+        geofences=False only checks that the plan is complete, e.g. before a
+        simulation.
+        """
+        problems = []
+        if not self.takeoff:
+            problems.append("No takeoff point set")
+        if not self.land:
+            problems.append("No landing point set")
+        crossings = self.geofence_crossings() if geofences else []
+        for start, end, fence in crossings[:MAX_REPORTED_CROSSINGS]:
+            problems.append(f"{start.name} -> {end.name} crosses geofence {fence.name}")
+        if len(crossings) > MAX_REPORTED_CROSSINGS:
+            problems.append(f"... and {len(crossings) - MAX_REPORTED_CROSSINGS} more geofence crossings")
+        return problems
+
+    def summary(self, precision=None):
+        """Distances of the planned route (requires takeoff and landing)
+
+        precision selects a geodesy tier; the cached route metrics are used
+        unless it differs from theirs, in which case the route is re-measured.
+        """
+        if precision is not None and precision != self.metrics.precision:
+            distances = geodesy.route_distances(*self.waypoints.coordinates_of(self.full_route()), precision)
+            return MissionSummary(
+                waypoints=len(self.waypoints),
+                route_waypoints=len(self.route),
+                direct_km=distances.direct,
+                route_km=distances.total,
+                segments_km=distances.segments.tolist()
+            )
+        return MissionSummary(
+            waypoints=len(self.waypoints),
+            route_waypoints=len(self.route),
+            direct_km=self.metrics.direct,
+            route_km=self.metrics.total,
+            segments_km=self.metrics.segments()
+        )
+
+    def simulate(self, profile=None):
+        """Simulated flight of the planned route (requires takeoff and landing)"""
+        return flight_sim.simulate_route(*self.waypoints.coordinates_of(self.full_route()), profile)
+
+    def terrain_profile(self, elevation, profile=None):
+        """Terrain and ground clearance along the planned route from an ElevationService
+
+        The route is flown at the profile's cruise altitude above the takeoff
+        point (requires takeoff and landing).
+        """
+        profile = profile or flight_sim.DEFAULT_PROFILE
+        return elevation.profile(*self.waypoints.coordinates_of(self.full_route()), profile.cruise_altitude)
+
+    def total_distance(self):
+        """Distance along all waypoints in list order in km"""
+        if len(self.waypoints) < 2:
+            return 0.0
+        lats, lons = self.waypoints.coordinates()
+        return geodesy.route_distances(lats, lons).total
+
+    # Persistence
+
+    def to_dict(self):
+        """Mission file data"""
+        return mission_format.mission_data(mission_format.snapshot(self))
+
+    @classmethod
+    def from_dict(cls, mission_data):
+        """Build a mission from mission file data"""
+        if 'waypoints' not in mission_data:
+            raise ValueError("Invalid mission file: missing waypoints data")
+        mission = cls()
+        mission.add_waypoints(
+            mission_data['waypoints'],
+            takeoff_id=mission_data.get('takeoff_id'),
+            land_id=mission_data.get('land_id'),
+            route_ids=mission_data.get('route')
+        )
+        return mission
+
+    def save(self, filename, progress=None, cancel_event=None):
+        """Save atomically in the format given by the extension (.json, .wpt text or .wpb binary)"""
+        mission_format.write(self, filename, progress, cancel_event)
+
+    def load_file(self, filename, progress=None, cancel_event=None):
+        """Add the waypoints and plan of a mission file of any format; returns its header"""
+        return mission_format.load_into(self, filename, progress, cancel_event)
+
+    @classmethod
+    def load(cls, filename):
+        mission = cls()
+        mission.load_file(filename)
+        return mission
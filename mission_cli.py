@@ -0,0 +1,208 @@
+"""Command-line batch processing of mission files
+
+Validates, measures and converts mission files without a display:
+
+    python mission_cli.py validate missions/
+    python mission_cli.py measure missions/ --workers 8
+    python mission_cli.py convert old_missions/ --output converted/ --format binary
+
+Paths may be files or directories (searched recursively for *.json, *.wpt and
+*.wpb files; see mission_format.py). Convert writes JSON by default and
+mirrors the layout of each directory argument under --output; missions whose
+output would overwrite an input file or the output of another mission fail
+without being written. Missions
+are processed in parallel on a process pool; each mission prints one line and
+an aggregate line closes the run. The exit status is 1 if any mission failed.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+import time
+
+from mission import Mission, check_mission_data
+import mission_format
+
+COMMANDS = ('validate', 'measure', 'convert')
+MISSION_EXTENSIONS = tuple(mission_format.EXTENSIONS.values())
+
+
+def find_mission_files(paths):
+    """Expand files and directories into a sorted list of (mission file, path relative to its argument)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                files.extend((os.path.join(folder, name), os.path.relpath(os.path.join(folder, name), path))
+                             for name in names if os.path.splitext(name)[1].lower() in MISSION_EXTENSIONS)
+        else:
+            files.append((path, os.path.basename(path)))
+    return sorted(files)
+
+
+def conversion_targets(files, output_dir, output_format):
+    """Output paths for convert: ({mission file: target}, {mission file: problem})
+
+    Each (file, relative path) pair is written to the relative path under
+    output_dir with the extension of output_format. Files whose target is an
+    input file or shared with another file get a problem instead.
+    """
+    def key(path):
+        return os.path.normcase(os.path.realpath(path))
+
+    extension = mission_format.EXTENSIONS[output_format]
+    targets = {path: os.path.join(output_dir, os.path.splitext(relative)[0] + extension) for path, relative in files}
+    inputs = {key(path) for path, _ in files}
+    sources = {}
+    for path, target in targets.items():
+        sources.setdefault(key(target), []).append(path)
+
+    problems = {}
+    for path, target in targets.items():
+        others = [other for other in sources[key(target)] if other != path]
+        if key(target) in inputs:
+            problems[path] = f"Output {target} would overwrite an input mission file"
+        elif others:
+            problems[path] = f"Output {target} is also the output of {', '.join(others)}"
+    return {path: target for path, target in targets.items() if path not in problems}, problems
+
+
+def new_result(path):
+    return {'path': path, 'ok': False, 'problems': [], 'waypoints': 0, 'route_waypoints': 0,
+            'direct_km': None, 'route_km': None}
+
+
+def process_mission(command, path, target=None):
+    """Run one command on one mission file and return a result dict (runs in a worker process)
+
+    convert saves the mission to target, in the format given by its extension.
+    """
+    started = time.perf_counter()
+    result = new_result(path)
+    try:
+        mission = None
+        if mission_format.sniff_format(path) == 'json':
+            with open(path, 'r') as f:
+                mission_data = json.load(f)
+            result['problems'] = check_mission_data(mission_data)
+            if isinstance(mission_data, dict) and isinstance(mission_data.get('waypoints'), list):
+                mission = Mission.from_dict(mission_data)
+        else:
+            mission = Mission.load(path)
+
+        if mission is not None:
+            result['waypoints'] = len(mission.waypoints)
+            result['route_waypoints'] = len(mission.route)
+            plan_problems = mission.validate()
+            if not plan_problems:
+                summary = mission.summary()
+                result['direct_km'] = summary.direct_km
+                result['route_km'] = summary.route_km
+            if command == 'validate':
+                result['problems'].extend(plan_problems)
+            elif command == 'convert' and not result['problems']:
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                mission.save(target)
+                result['output'] = target
+        # Problems in the file fail every command; problems of the plan only fail validate
+        result['ok'] = mission is not None and not result['problems']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        result['problems'].append(str(e))
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def format_result(command, result):
+    status = "OK  " if result['ok'] else "FAIL"
+    line = f"{status} {result['path']}: {result['waypoints']} waypoints"
+    if result['route_km'] is not None:
+        line += (f", {result['route_waypoints']} route, direct {result['direct_km']:.2f} km, "
+                 f"route {result['route_km']:.2f} km")
+    if result.get('output'):
+        line += f" -> {result['output']}"
+    line += "".join(f"\n     - {problem}" for problem in result['problems'])
+    return line
+
+
+def aggregate(results, elapsed):
+    """Aggregate statistics over all mission results"""
+    measured = [r['route_km'] for r in results if r['route_km'] is not None]
+    return {
+        'missions': len(results),
+        'ok': sum(r['ok'] for r in results),
+        'failed': sum(not r['ok'] for r in results),
+        'waypoints': sum(r['waypoints'] for r in results),
+        'measured': len(measured),
+        'total_route_km': sum(measured),
+        'mean_route_km': sum(measured) / len(measured) if measured else 0.0,
+        'max_route_km': max(measured, default=0.0),
+        'seconds': elapsed
+    }
+
+
+def run(command, paths, output_dir=None, workers=None, stream=None, output_format='json'):
+    """Process mission files and print per-mission and aggregate results; returns the aggregate dict"""
+    stream = stream or sys.stdout
+    started = time.perf_counter()
+    files = find_mission_files(paths)
+    results = []
+    targets = {}
+    if command == 'convert':
+        os.makedirs(output_dir, exist_ok=True)
+        targets, problems = conversion_targets(files, output_dir, output_format)
+        for path, problem in problems.items():
+            result = new_result(path)
+            result['problems'].append(problem)
+            print(format_result(command, result), file=stream)
+            results.append(result)
+        files = [(path, relative) for path, relative in files if path in targets]
+
+    args = ([command] * len(files), [path for path, _ in files], [targets.get(path) for path, _ in files])
+    pool = None
+    if workers == 1 or len(files) < 2:
+        outcomes = map(process_mission, *args)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(files) // (4 * (workers or os.cpu_count() or 1)))
+        outcomes = pool.map(process_mission, *args, chunksize=chunksize)
+
+    try:
+        for result in outcomes:
+            print(format_result(command, result), file=stream)
+            results.append(result)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    stats = aggregate(results, time.perf_counter() - started)
+    print(
+        f"{stats['missions']} missions: {stats['ok']} ok, {stats['failed']} failed, "
+        f"{stats['waypoints']} waypoints, route total {stats['total_route_km']:.2f} km "
+        f"(mean {stats['mean_route_km']:.2f} km, max {stats['max_route_km']:.2f} km over "
+        f"{stats['measured']} planned missions) in {stats['seconds']:.2f} s",
+        file=stream
+    )
+    return stats
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Validate, measure and convert drone mission files.")
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('paths', nargs='+', help="Mission files or directories")
+    parser.add_argument('--output', '-o', help="Output directory for convert")
+    parser.add_argument('--format', '-f', choices=tuple(mission_format.EXTENSIONS), default='json',
+                        help="Output format for convert (default: json)")
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help="Worker processes (default: CPU count, 1 to run in-process)")
+    args = parser.parse_args(argv)
+    if args.command == 'convert' and not args.output:
+        parser.error("convert requires --output")
+
+    stats = run(args.command, args.paths, args.output, args.workers, output_format=args.format)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,533 @@
+"""Versioned mission file formats
+
+Besides the original JSON files (still read and written for ``.json``), a
+mission can be stored in two encodings that carry the full mission state
+(waypoint ids, coordinates, types and names, takeoff, landing and route
+order) and are read as a stream of chunks:
+
+Text (``.wpt``), line-delimited::
+
+    DRONE-MISSION 1
+    {"timestamp": ..., "takeoff_id": 1, "land_id": 2, "waypoints": N, "route": R, "names": K}
+    0000000001 +0377749000 -01224194000 1     N waypoint records
+    ...
+    0000000003                                R route ids in flight order
+    ...
+    5 "Custom name"                           K names (JSON strings)
+
+Waypoint records are fixed-width ("%010d %+011d %+012d %d"): id, latitude
+and longitude in units of 1e-7 degrees (as in MAVLink's *_INT messages,
+about 1 cm) and the type code. Fixed widths let whole blocks of lines be
+encoded and decoded with NumPy instead of per-line parsing.
+
+Binary (``.wpb``), little-endian::
+
+    b"DMSNBIN\\0", uint32 version, uint32 header length, JSON header
+    N packed records (int64 id, float64 lat, float64 lon, uint8 type)
+    R int64 route ids
+    K int64 name ids, K + 1 uint64 offsets, UTF-8 string table
+
+Readers yield ('waypoints', ids, lats, lons, types), ('route', ids) and
+('names', {id: name}) chunks, so missions load incrementally.
+
+Writers encode a snapshot() of the mission, so a save can run on a worker
+thread while the mission is edited, and write to a temporary file that is
+renamed over the target only when complete. Loads and saves accept a
+progress callback and a cancel event.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import gc
+import json
+import os
+import stat
+import tempfile
+
+import numpy as np
+
+import geodesy
+from waypoint_store import TYPE_NAMES
+
+FORMAT_VERSION = 1
+TEXT_MAGIC = "DRONE-MISSION"
+BINARY_MAGIC = b"DMSNBIN\0"
+TEXT_EXTENSION = ".wpt"
+BINARY_EXTENSION = ".wpb"
+JSON_EXTENSION = ".json"
+EXTENSIONS = {'text': TEXT_EXTENSION, 'binary': BINARY_EXTENSION, 'json': JSON_EXTENSION}
+CHUNK_RECORDS = 65536  # Records encoded or decoded per block
+MAX_ID_SPREAD = 4  # File ids are kept only up to this many times the ids a load needs (the id index is sized by them)
+
+_UMASK = os.umask(0o022)  # Read once at import: os.umask() can only be read by setting it
+os.umask(_UMASK)
+COORDINATE_SCALE = 10 ** 7  # Text coordinates are integers in 1e-7 degrees
+ID_WIDTH = 10
+LAT_WIDTH = 11  # Sign + 10 digits
+LON_WIDTH = 12  # Sign + 11 digits
+RECORD_WIDTH = ID_WIDTH + LAT_WIDTH + LON_WIDTH + 5  # Three separators, type digit, newline
+ROUTE_WIDTH = ID_WIDTH + 1
+
+HEADER_KEYS = ('takeoff_id', 'land_id', 'waypoints', 'route', 'names')
+RECORD_DTYPE = np.dtype([('id', '<i8'), ('lat', '<f8'), ('lon', '<f8'), ('type', 'u1')])
+
+
+def format_of(filename):
+    """'text', 'binary' or 'json', from the file extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    for name, known in EXTENSIONS.items():
+        if extension == known:
+            return name
+    raise ValueError(f"Unknown mission file extension: {extension or filename}")
+
+
+MissionSnapshot = namedtuple('MissionSnapshot', ['header', 'ids', 'lats', 'lons', 'types', 'route_ids', 'names'])
+
+
+class Cancelled(Exception):
+    """Raised when a save or load is cancelled through its cancel event"""
+
+
+def snapshot(mission):
+    """Copy of everything a mission file stores, safe to write from another thread"""
+    store = mission.waypoints
+    lats, lons = store.coordinates()  # Compacts, so slots are display rows
+    count = store.count
+    route_ids = np.fromiter((wp.id for wp in mission.route), dtype=np.int64, count=len(mission.route))
+    header = {
+        'timestamp': datetime.now().isoformat(),
+        'takeoff_id': mission.takeoff.id if mission.takeoff else None,
+        'land_id': mission.land.id if mission.land else None,
+        'waypoints': count,
+        'route': len(route_ids),
+        'names': len(store.names)
+    }
+    return MissionSnapshot(
+        header, store.ids[:count].copy(), lats.copy(), lons.copy(), store.types[:count].copy(),
+        route_ids, dict(store.names)
+    )
+
+
+def mission_data(snap):
+    """JSON mission file data of a snapshot"""
+    names = snap.names
+    total_distance = geodesy.route_distances(snap.lats, snap.lons).total if len(snap.ids) > 1 else 0.0
+    return {
+        'timestamp': snap.header['timestamp'],
+        'waypoints': [
+            {'id': wp_id, 'name': names.get(wp_id) or f"WP{wp_id}", 'lat': lat, 'lon': lon, 'type': TYPE_NAMES[code]}
+            for wp_id, lat, lon, code in zip(snap.ids.tolist(), snap.lats.tolist(), snap.lons.tolist(), snap.types.tolist())
+        ],
+        'takeoff_id': snap.header['takeoff_id'],
+        'land_id': snap.header['land_id'],
+        'route': snap.route_ids.tolist(),
+        'total_distance_km': total_distance
+    }
+
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise Cancelled("Cancelled")
+
+
+def _fsync_directory(folder):
+    """Make a rename in folder durable (not possible on Windows, where it is skipped)"""
+    try:
+        fd = os.open(folder, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Some file systems do not sync directories
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(filename):
+    """Binary file object for a temporary file that replaces filename only once fully written
+
+    A crash or error while writing leaves any existing file untouched. The
+    file gets the permissions of the file it replaces, or those of a newly
+    created file (0666 less the umask); mkstemp's 0600 is not kept.
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, filename)
+        _fsync_directory(folder)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def check_header(header):
+    missing = [key for key in HEADER_KEYS if key not in header]
+    if missing:
+        raise ValueError(f"Invalid mission file: header is missing {', '.join(missing)}")
+    return header
+
+
+# Fixed-width digit encoding
+
+def _encode_digits(values, width):
+    """uint8 matrix of zero-padded decimal digits of non-negative integers"""
+    values = np.asarray(values, dtype=np.uint64)
+    out = np.empty((len(values), width), dtype=np.uint8)
+    for column in range(width - 1, -1, -1):  # One divmod per column beats a (n, width) power table
+        values, digits = np.divmod(values, 10)
+        out[:, column] = digits
+    out += ord('0')
+    return out
+
+
+def _decode_digits(block, line):
+    """Integers from a uint8 matrix of decimal digits"""
+    digits = block - np.uint8(ord('0'))  # Non-digits wrap around to values above 9
+    bad = np.any(digits > 9, axis=1)
+    if bad.any():
+        raise ValueError(f"Malformed mission record at line {line + int(np.flatnonzero(bad)[0])}")
+    values = np.zeros(len(block), dtype=np.int64)
+    for column in range(block.shape[1]):
+        values *= 10
+        values += digits[:, column]
+    return values
+
+
+def _encode_signed(values, width):
+    out = np.empty((len(values), width), dtype=np.uint8)
+    out[:, 0] = np.where(values < 0, ord('-'), ord('+'))
+    out[:, 1:] = _encode_digits(np.abs(values), width - 1)
+    return out
+
+
+def _decode_signed(block, line):
+    values = _decode_digits(block[:, 1:], line)
+    return np.where(block[:, 0] == ord('-'), -values, values)
+
+
+def encode_records(ids, lats, lons, types):
+    """Fixed-width text waypoint records as bytes"""
+    n = len(ids)
+    out = np.full((n, RECORD_WIDTH), ord(' '), dtype=np.uint8)
+    col = 0
+    out[:, col:col + ID_WIDTH] = _encode_digits(np.asarray(ids, dtype=np.int64), ID_WIDTH)
+    col += ID_WIDTH + 1
+    out[:, col:col + LAT_WIDTH] = _encode_signed(np.rint(np.asarray(lats) * COORDINATE_SCALE).astype(np.int64), LAT_WIDTH)
+    col += LAT_WIDTH + 1
+    out[:, col:col + LON_WIDTH] = _encode_signed(np.rint(np.asarray(lons) * COORDINATE_SCALE).astype(np.int64), LON_WIDTH)
+    col += LON_WIDTH + 1
+    out[:, col] = np.asarray(types, dtype=np.uint8) + ord('0')
+    out[:, -1] = ord('\n')
+    return out.tobytes()
+
+
+def decode_records(data, line=3):
+    """(ids, lats, lons, types) from fixed-width text waypoint records"""
+    block = np.frombuffer(data, dtype=np.uint8)
+    if block.size % RECORD_WIDTH:
+        raise ValueError(f"Truncated or malformed waypoint records near line {line}")
+    block = block.reshape(-1, RECORD_WIDTH)
+    if np.any(block[:, -1] != ord('\n')):
+        bad = int(np.flatnonzero(block[:, -1] != ord('\n'))[0])
+        raise ValueError(f"Malformed mission record at line {line + bad}")
+    col = 0
+    ids = _decode_digits(block[:, col:col + ID_WIDTH], line)
+    col += ID_WIDTH + 1
+    lats = _decode_signed(block[:, col:col + LAT_WIDTH], line) / COORDINATE_SCALE
+    col += LAT_WIDTH + 1
+    lons = _decode_signed(block[:, col:col + LON_WIDTH], line) / COORDINATE_SCALE
+    col += LON_WIDTH + 1
+    types = (block[:, col] - ord('0')).astype(np.uint8)
+    return ids, lats, lons, types
+
+
+# Text encoding
+
+def write_text(snap, f, progress=None, cancel_event=None):
+    """Write a snapshot as a text mission file to a binary file object"""
+    ids, lats, lons, types, route_ids = snap.ids, snap.lats, snap.lons, snap.types, snap.route_ids
+    total = len(ids) + len(route_ids)
+    f.write(f"{TEXT_MAGIC} {FORMAT_VERSION}\n{json.dumps(snap.header)}\n".encode())
+    for start in range(0, len(ids), CHUNK_RECORDS):
+        _check_cancel(cancel_event)
+        end = start + CHUNK_RECORDS
+        f.write(encode_records(ids[start:end], lats[start:end], lons[start:end], types[start:end]))
+        if progress:
+            progress(min(end, len(ids)), total)
+    for start in range(0, len(route_ids), CHUNK_RECORDS):
+        _check_cancel(cancel_event)
+        chunk = route_ids[start:start + CHUNK_RECORDS]
+        block = np.full((len(chunk), ROUTE_WIDTH), ord('\n'), dtype=np.uint8)
+        block[:, :ID_WIDTH] = _encode_digits(chunk, ID_WIDTH)
+        f.write(block.tobytes())
+        if progress:
+            progress(len(ids) + start + len(chunk), total)
+    f.write("".join(f"{wp_id} {json.dumps(name)}\n" for wp_id, name in snap.names.items()).encode())
+
+
+def read_text(f):
+    """Yield the header and then waypoint, route and name chunks of a text mission file"""
+    magic = f.readline().decode().split()
+    if len(magic) != 2 or magic[0] != TEXT_MAGIC:
+        raise ValueError("Not a text mission file")
+    if int(magic[1]) > FORMAT_VERSION:
+        raise ValueError(f"Mission format version {magic[1]} is newer than supported ({FORMAT_VERSION})")
+    header = check_header(json.loads(f.readline()))
+    yield 'header', header
+
+    line = 3
+    remaining = header['waypoints']
+    while remaining:
+        count = min(remaining, CHUNK_RECORDS)
+        yield ('waypoints', *decode_records(f.read(count * RECORD_WIDTH), line))
+        remaining -= count
+        line += count
+
+    remaining = header['route']
+    while remaining:
+        count = min(remaining, CHUNK_RECORDS)
+        block = np.frombuffer(f.read(count * ROUTE_WIDTH), dtype=np.uint8)
+        if block.size != count * ROUTE_WIDTH:
+            raise ValueError(f"Truncated route near line {line}")
+        yield 'route', _decode_digits(block.reshape(-1, ROUTE_WIDTH)[:, :ID_WIDTH], line)
+        remaining -= count
+        line += count
+
+    names = {}
+    for _ in range(header['names']):
+        wp_id, name = f.readline().decode().split(" ", 1)
+        names[int(wp_id)] = json.loads(name)
+    yield 'names', names
+
+
+# Binary encoding
+
+def write_binary(snap, f, progress=None, cancel_event=None):
+    """Write a snapshot as a binary mission file to a binary file object"""
+    ids, lats, lons, types, route_ids, names = snap.ids, snap.lats, snap.lons, snap.types, snap.route_ids, snap.names
+    header = json.dumps(snap.header).encode()
+    f.write(BINARY_MAGIC)
+    f.write(np.array([FORMAT_VERSION, len(header)], dtype='<u4').tobytes())
+    f.write(header)
+    for start in range(0, len(ids), CHUNK_RECORDS):
+        _check_cancel(cancel_event)
+        end = start + CHUNK_RECORDS
+        records = np.empty(len(ids[start:end]), dtype=RECORD_DTYPE)
+        records['id'] = ids[start:end]
+        records['lat'] = lats[start:end]
+        records['lon'] = lons[start:end]
+        records['type'] = types[start:end]
+        f.write(records.tobytes())
+        if progress:
+            progress(min(end, len(ids)), len(ids))
+    f.write(route_ids.astype('<i8').tobytes())
+
+    encoded = [name.encode() for name in names.values()]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    f.write(np.fromiter(names.keys(), dtype='<i8', count=len(names)).tobytes())
+    f.write(offsets.tobytes())
+    f.write(b"".join(encoded))
+
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated binary mission file")
+    return data
+
+
+def read_binary(f):
+    """Yield the header and then waypoint, route and name chunks of a binary mission file"""
+    if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("Not a binary mission file")
+    version, header_length = np.frombuffer(_read_exact(f, 8), dtype='<u4').tolist()
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Mission format version {version} is newer than supported ({FORMAT_VERSION})")
+    header = check_header(json.loads(_read_exact(f, header_length)))
+    yield 'header', header
+
+    remaining = header['waypoints']
+    while remaining:
+        count = min(remaining, CHUNK_RECORDS)
+        records = np.frombuffer(_read_exact(f, count * RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)
+        yield 'waypoints', records['id'], records['lat'], records['lon'], records['type']
+        remaining -= count
+
+    if header['route']:
+        yield 'route', np.frombuffer(_read_exact(f, header['route'] * 8), dtype='<i8')
+
+    count = header['names']
+    name_ids = np.frombuffer(_read_exact(f, count * 8), dtype='<i8').tolist()
+    offsets = np.frombuffer(_read_exact(f, (count + 1) * 8), dtype='<u8').tolist()
+    table = _read_exact(f, offsets[-1])
+    yield 'names', {
+        wp_id: table[start:end].decode()
+        for wp_id, start, end in zip(name_ids, offsets, offsets[1:])
+    }
+
+
+# JSON encoding
+
+def write_json(snap, f, progress=None, cancel_event=None):
+    """Write a snapshot as a JSON mission file to a binary file object
+
+    JSON is encoded as one document, so progress is only reported at the end.
+    """
+    data = mission_data(snap)
+    for i, chunk in enumerate(json.JSONEncoder(indent=2).iterencode(data)):
+        if i % CHUNK_RECORDS == 0:
+            _check_cancel(cancel_event)
+        f.write(chunk.encode())
+    if progress:
+        progress(len(snap.ids), len(snap.ids))
+
+
+# Loading into a mission
+
+def sniff_format(filename):
+    """'text', 'binary' or 'json', from the first bytes of a mission file"""
+    with open(filename, 'rb') as f:
+        start = f.read(max(len(BINARY_MAGIC), len(TEXT_MAGIC)))
+    if start.startswith(BINARY_MAGIC):
+        return 'binary'
+    if start.startswith(TEXT_MAGIC.encode()):
+        return 'text'
+    return 'json'
+
+
+def iter_chunks(filename):
+    """Open a text or binary mission file and yield its chunks"""
+    reader = read_binary if sniff_format(filename) == 'binary' else read_text
+    with open(filename, 'rb') as f:
+        yield from reader(f)
+
+
+def load_into(mission, filename, progress=None, cancel_event=None):
+    """Load a mission file of any supported format into a mission; returns the file header
+
+    The format is detected from the file contents, not the extension. File
+    ids are kept when they do not collide with the mission's ids and mapped
+    to new ids otherwise. Text and binary files are read chunk by chunk,
+    calling progress(bytes read, file size); JSON files are decoded in one
+    go. Setting cancel_event aborts with Cancelled and may leave the mission
+    partly loaded, so load into a fresh Mission when cancelling is possible.
+
+    The cyclic garbage collector is paused meanwhile: a large mission
+    allocates millions of small objects (route views, metric points) that
+    would otherwise trigger repeated full collections.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load_into(mission, filename, progress, cancel_event)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load_into(mission, filename, progress, cancel_event):
+    size = os.path.getsize(filename)
+    file_format = sniff_format(filename)
+    if file_format == 'json':
+        with open(filename, 'r') as f:
+            mission_data = json.load(f)
+        if 'waypoints' not in mission_data:
+            raise ValueError("Invalid mission file: missing waypoints data")
+        _check_cancel(cancel_event)
+        count = mission.add_waypoints(
+            mission_data['waypoints'],
+            takeoff_id=mission_data.get('takeoff_id'),
+            land_id=mission_data.get('land_id'),
+            route_ids=mission_data.get('route')
+        )
+        if progress:
+            progress(size, size)
+        header = {key: value for key, value in mission_data.items() if key != 'waypoints'}
+        header['waypoints'] = count
+        return header
+
+    header = None
+    chunks = []
+    route = []
+    names = {}
+    with open(filename, 'rb') as f:
+        reader = read_binary if file_format == 'binary' else read_text
+        for kind, *payload in reader(f):
+            _check_cancel(cancel_event)
+            if kind == 'header':
+                header = payload[0]
+            elif kind == 'waypoints':
+                chunks.append(payload)
+            elif kind == 'route':
+                route.append(payload[0])
+            else:
+                names = payload[0]
+            if progress:
+                progress(f.tell(), size)
+
+    # Add all waypoints in one vectorized pass and map file ids to mission ids
+    if chunks:
+        file_ids, lats, lons, types = (np.concatenate(column) for column in zip(*chunks))
+    else:
+        file_ids = lats = lons = types = np.zeros(0)
+    if np.any(types >= len(TYPE_NAMES)):
+        raise ValueError("Mission file contains unknown waypoint types")
+    order = np.argsort(file_ids, kind='stable')
+    sorted_ids = file_ids[order]
+    # File ids are kept when they fit after the mission's ids and are not much sparser than
+    # handing out new ids would be; otherwise they are remapped to new ids
+    keep_ids = not sorted_ids.size or (
+        sorted_ids[0] > mission.last_id and np.all(np.diff(sorted_ids) > 0)
+        and sorted_ids[-1] <= MAX_ID_SPREAD * (mission.last_id + sorted_ids.size))
+    _check_cancel(cancel_event)
+    new_ids = mission.add_waypoint_arrays(lats, lons, types, ids=file_ids if keep_ids else None)
+
+    def mission_ids(ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+        if ids.size and (not sorted_ids.size or np.any(sorted_ids[pos] != ids)):
+            raise ValueError("Mission file references unknown waypoint ids")
+        return new_ids[order[pos]]
+
+    if names:
+        mapped = mission_ids(list(names.keys())).tolist()
+        mission.waypoints.names.update(zip(mapped, names.values()))
+    route_ids = mission_ids(np.concatenate(route)) if route else np.zeros(0, dtype=np.int64)
+    endpoints = [None if header[key] is None else int(mission_ids([header[key]])[0])
+                 for key in ('takeoff_id', 'land_id')]
+    mission.set_plan(*endpoints, route_ids)
+    return header
+
+
+WRITERS = {'text': write_text, 'binary': write_binary, 'json': write_json}
+
+
+def write_snapshot(snap, filename, progress=None, cancel_event=None):
+    """Atomically save a snapshot in the format given by the file extension
+
+    progress(done, total) is called as records are written; setting
+    cancel_event aborts with Cancelled and leaves any existing file as it was.
+    """
+    writer = WRITERS[format_of(filename)]
+    with atomic_write(filename) as f:
+        writer(snap, f, progress, cancel_event)
+
+
+def write(mission, filename, progress=None, cancel_event=None):
+    """Save a mission in the format given by the file extension"""
+    write_snapshot(snapshot(mission), filename, progress, cancel_event)
@@ -0,0 +1,105 @@
+"""Playback of a simulated flight on the map
+
+PlaybackLayer moves a marker along a FlightSimulation (see flight_sim.py) in
+simulated time. Every frame advances the playback clock by the elapsed wall
+time times the playback speed and samples the simulation at the new time, so
+speed changes and scrubbing (seek) are instant and never re-simulate. The
+marker and the optional on_frame callback are updated FRAME_RATE times per
+second, whatever the speed.
+"""
+import time
+
+import flight_sim
+
+FRAME_RATE = 20  # Marker updates per second while playing
+SPEEDS = (1, 2, 5, 10, 20, 50, 100)  # Playback speeds offered to the user
+MARKER_COLORS = ("orange", "darkorange")  # (circle, outside)
+
+
+class PlaybackLayer:
+    """Plays a simulated flight back on the map at 1x-100x with seeking"""
+
+    def __init__(self, map_widget, on_frame=None, frame_rate=FRAME_RATE):
+        self.map_widget = map_widget
+        self.on_frame = on_frame  # Called with the FlightState after every drawn frame
+        self.frame_interval = int(1000 / frame_rate)
+        self.simulation = None
+        self.position = 0.0  # Simulated seconds since takeoff
+        self.speed = SPEEDS[0]
+        self.playing = False
+        self.last_tick = None  # time.monotonic() of the previous frame while playing
+        self.frame_job = None
+        self.marker = None
+
+    def load(self, simulation):
+        """Show a simulation from its start, paused"""
+        self.pause()
+        self.simulation = simulation
+        self.seek(0.0)
+
+    def play(self):
+        if self.simulation is None or self.playing:
+            return
+        if self.position >= self.simulation.total_time:
+            self.position = 0.0  # Replay a finished flight
+        self.playing = True
+        self.last_tick = time.monotonic()
+        self.frame_job = self.map_widget.after(self.frame_interval, self.frame)
+
+    def pause(self):
+        self.playing = False
+        if self.frame_job is not None:
+            self.map_widget.after_cancel(self.frame_job)
+            self.frame_job = None
+
+    def set_speed(self, speed):
+        """Playback speed as a multiple of real time (takes effect on the next frame)"""
+        self.speed = min(max(float(speed), SPEEDS[0]), SPEEDS[-1])
+
+    def seek(self, seconds):
+        """Jump to a simulated time and draw it"""
+        if self.simulation is None:
+            return
+        self.position = min(max(float(seconds), 0.0), self.simulation.total_time)
+        self.last_tick = time.monotonic()
+        self.draw()
+
+    def frame(self):
+        """Advance the playback clock by the wall time since the previous frame"""
+        now = time.monotonic()
+        self.position += (now - self.last_tick) * self.speed
+        self.last_tick = now
+        if self.position >= self.simulation.total_time:
+            self.position = self.simulation.total_time
+            self.playing = False
+            self.frame_job = None
+        else:
+            self.frame_job = self.map_widget.after(self.frame_interval, self.frame)
+        self.draw()
+
+    def draw(self):
+        state = self.simulation.state_at(self.position)
+        label = f"SIM {flight_sim.format_duration(state.time)} {state.alt:.0f} m {max(state.battery, 0.0):.0f}%"
+        if self.marker is None:
+            self.marker = self.map_widget.set_marker(
+                state.lat, state.lon,
+                text=label,
+                marker_color_circle=MARKER_COLORS[0],
+                marker_color_outside=MARKER_COLORS[1]
+            )
+        else:
+            if self.marker.position != (state.lat, state.lon):
+                self.marker.set_position(state.lat, state.lon)
+            if self.marker.text != label:
+                self.marker.set_text(label)
+        if self.on_frame:
+            self.on_frame(state)
+
+    def clear(self):
+        """Stop playback and remove the marker"""
+        self.pause()
+        self.simulation = None
+        self.position = 0.0
+        if self.marker is not None:
+            self.marker.delete()
+            self.marker = None
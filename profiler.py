@@ -0,0 +1,248 @@
+"""Hot-path profiler and event-loop latency overlay
+
+When the planner stutters, the time has gone into some Tk callback: a
+handler, a list or marker refresh, map tile work or the activity log.
+Profiler records timing spans of these paths while it is enabled:
+
+- GUI handlers are decorated with @timed. While the profiler is off, the
+  wrapper only checks one flag before calling the handler.
+- Methods of objects the GUI does not own - the map widget's draw_move() and
+  tile updates, the layers' draw() and refresh() - are registered with
+  instrument(). Their timed wrappers are only installed on the objects while
+  the profiler is enabled, so they cost nothing otherwise.
+
+EventLoopProbe measures how late root.after callbacks run: it asks to be
+called every PROBE_INTERVAL ms, and the delay beyond that is the time the
+event loop was busy, i.e. the frame lag a user sees. ProfilerOverlay shows
+the frame lag and the p50/p99 latency of the slowest spans over the map.
+
+Spans and lag samples are kept in bounded ring buffers and can be exported
+in the Chrome trace event format (open the file in Perfetto or
+chrome://tracing) to see which calls nest inside a slow frame.
+"""
+from collections import deque
+import functools
+import json
+import os
+import threading
+import time
+import tkinter as tk
+
+import numpy as np
+
+from mission_format import atomic_write
+
+MAX_EVENTS = 100000  # Spans kept for trace export
+LATENCY_WINDOW = 1000  # Recent durations per span name used for percentiles
+PROBE_INTERVAL = 50  # ms between event-loop lag probes
+OVERLAY_INTERVAL = 500  # ms between overlay updates
+OVERLAY_SPANS = 8  # Slowest spans listed in the overlay
+_MISSING = object()
+
+
+class Profiler:
+    """Records timing spans and event-loop lag while enabled"""
+
+    def __init__(self, max_events=MAX_EVENTS, window=LATENCY_WINDOW):
+        self.enabled = False
+        self.window = window
+        self.events = deque(maxlen=max_events)  # (name, category, start ns, duration ns, thread id)
+        self.lag_events = deque(maxlen=max_events)  # (time ns, lag ms)
+        self.latencies = {}  # Span name -> recent durations in ms
+        self.lags = deque(maxlen=window)  # Recent event-loop lag in ms
+        self.threads = {}  # Thread id -> name, for the trace
+        self.instrumented = []  # [object, method name, span name, category, attribute before patching]
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for target in self.instrumented:
+                self.patch(target)
+
+    def disable(self):
+        """Stop recording; the recorded spans are kept for export"""
+        if self.enabled:
+            self.enabled = False
+            for target in self.instrumented:
+                self.unpatch(target)
+
+    def clear(self):
+        self.events.clear()
+        self.lag_events.clear()
+        self.latencies.clear()
+        self.lags.clear()
+
+    # Recording
+
+    def record(self, name, category, start, end):
+        """Add a span from perf_counter_ns() start to end"""
+        thread = threading.get_ident()
+        if thread not in self.threads:
+            self.threads[thread] = threading.current_thread().name
+        self.events.append((name, category, start, end - start, thread))
+        durations = self.latencies.get(name)
+        if durations is None:
+            durations = self.latencies[name] = deque(maxlen=self.window)
+        durations.append((end - start) / 1e6)
+
+    def record_lag(self, lag_ms):
+        self.lags.append(lag_ms)
+        self.lag_events.append((time.perf_counter_ns(), lag_ms))
+
+    def wrap(self, function, name, category):
+        """function timed as a span while the profiler is enabled"""
+        @functools.wraps(function)
+        def timed_call(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, category, start, time.perf_counter_ns())
+        return timed_call
+
+    def instrument(self, obj, names, prefix="", category="ui"):
+        """Time methods of an object while enabled; span names are prefix + method name"""
+        for name in names:
+            target = [obj, name, prefix + name, category, _MISSING]
+            self.instrumented.append(target)
+            if self.enabled:
+                self.patch(target)
+
+    def patch(self, target):
+        obj, name, span, category, _ = target
+        target[4] = obj.__dict__.get(name, _MISSING)
+        setattr(obj, name, self.wrap(getattr(obj, name), span, category))
+
+    @staticmethod
+    def unpatch(target):
+        obj, name, _, _, before = target
+        if before is _MISSING:
+            obj.__dict__.pop(name, None)  # The class method shows through again
+        else:
+            setattr(obj, name, before)
+
+    # Results
+
+    def stats(self):
+        """{span name: (calls in window, p50 ms, p99 ms)}"""
+        result = {}
+        for name, durations in list(self.latencies.items()):
+            if durations:
+                p50, p99 = np.percentile(np.fromiter(durations, dtype=np.float64), (50, 99))
+                result[name] = (len(durations), float(p50), float(p99))
+        return result
+
+    def lag_stats(self):
+        """(p50, p99, max) event-loop lag in ms, or None before the first probe"""
+        if not self.lags:
+            return None
+        lags = np.fromiter(self.lags, dtype=np.float64)
+        p50, p99 = np.percentile(lags, (50, 99))
+        return float(p50), float(p99), float(lags.max())
+
+    def chrome_trace(self):
+        """Recorded spans and lag samples as a Chrome trace event dict"""
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread, 'args': {'name': name}}
+            for thread, name in list(self.threads.items())
+        ]
+        events += [
+            {'name': name, 'cat': category, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000,
+             'pid': pid, 'tid': thread}
+            for name, category, start, duration, thread in list(self.events)
+        ]
+        events += [
+            {'name': 'event loop lag', 'ph': 'C', 'ts': t / 1000, 'pid': pid, 'args': {'ms': round(lag, 3)}}
+            for t, lag in list(self.lag_events)
+        ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, filename):
+        """Write the trace atomically as Chrome trace JSON; returns the number of spans"""
+        trace = self.chrome_trace()
+        with atomic_write(filename) as f:
+            f.write(json.dumps(trace).encode('utf-8'))
+        return sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+
+PROFILER = Profiler()
+
+
+def timed(function):
+    """Decorator: time every call of function as a span named after it while PROFILER is enabled"""
+    return PROFILER.wrap(function, function.__name__, "handler")
+
+
+class EventLoopProbe:
+    """Measures how late root.after callbacks run"""
+
+    def __init__(self, widget, profiler=PROFILER, interval=PROBE_INTERVAL):
+        self.widget = widget
+        self.profiler = profiler
+        self.interval = interval
+        self.job = None
+        self.expected = 0.0
+
+    def start(self):
+        if self.job is None:
+            self.schedule()
+
+    def stop(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    def schedule(self):
+        self.expected = time.perf_counter() + self.interval / 1000
+        self.job = self.widget.after(self.interval, self.tick)
+
+    def tick(self):
+        self.profiler.record_lag(max(0.0, (time.perf_counter() - self.expected) * 1000))
+        self.schedule()
+
+
+class ProfilerOverlay:
+    """Frame lag and the slowest spans, shown in a corner of a widget"""
+
+    def __init__(self, parent, profiler=PROFILER, interval=OVERLAY_INTERVAL):
+        self.parent = parent
+        self.profiler = profiler
+        self.interval = interval
+        self.label = None
+        self.job = None
+
+    @property
+    def shown(self):
+        return self.label is not None
+
+    def show(self):
+        if self.label is None:
+            self.label = tk.Label(self.parent, justify=tk.LEFT, anchor=tk.NW, font=("Consolas", 9),
+                                  bg="black", fg="#00ff00", padx=6, pady=4)
+            self.label.place(relx=1.0, x=-10, y=10, anchor=tk.NE)
+            self.update()
+
+    def hide(self):
+        if self.job is not None:
+            self.parent.after_cancel(self.job)
+            self.job = None
+        if self.label is not None:
+            self.label.destroy()
+            self.label = None
+
+    def update(self):
+        self.label.config(text=self.text())
+        self.job = self.parent.after(self.interval, self.update)
+
+    def text(self):
+        lag = self.profiler.lag_stats()
+        lines = ["Frame lag  p50 {:6.1f}  p99 {:6.1f}  max {:6.1f} ms".format(*lag) if lag else "Frame lag  -"]
+        spans = sorted(self.profiler.stats().items(), key=lambda item: -item[1][2])[:OVERLAY_SPANS]
+        if spans:
+            width = max(len(name) for name, _ in spans)
+            lines.append(f"{'span':<{width}}  {'calls':>5}  {'p50 ms':>7}  {'p99 ms':>7}")
+            lines += [f"{name:<{width}}  {calls:>5}  {p50:>7.2f}  {p99:>7.2f}" for name, (calls, p50, p99) in spans]
+        return "\n".join(lines)
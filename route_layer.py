@@ -0,0 +1,228 @@
+"""Level-of-detail flight path line for TkinterMapView
+
+A TkinterMapView path re-projects every vertex in Python whenever the map is
+zoomed and shifts every vertex on each pan. RouteLayer draws the planned
+takeoff -> route -> landing line itself instead:
+
+- Douglas-Peucker is run once per route change, recording for every vertex
+  the tolerance at which it would be dropped (its significance). The
+  simplification for a zoom level is then just the vertices whose
+  significance exceeds SIMPLIFY_TOLERANCE_PX at that zoom. The recursion is
+  processed one depth level at a time, all ranges of a level in one NumPy
+  pass, and stops below the tolerance of the deepest zoom level. Its depth
+  grows with the number of survey lines, so a 10k-point survey takes about
+  20 ms and a plain 10k-point route under 10 ms.
+- Each zoom level's simplified vertices are projected to Web-Mercator pixel
+  coordinates once and cached.
+- Only the segments inside the viewport (plus VIEW_MARGIN) are put on the
+  canvas, one line item per visible run of segments. Pans that stay within
+  the margin move all items with a single canvas.move().
+
+The layer registers itself in the map's path list, so TkinterMapView calls
+draw() on every pan and zoom like for its own paths.
+"""
+import itertools
+import tkinter as tk
+
+import numpy as np
+
+from spatial_index import TILE_SIZE, mercator
+
+ROUTE_COLOR = "darkviolet"
+ROUTE_WIDTH = 3
+ROUTE_TAG = "route_path"  # Canvas tag prefix; every layer gets its own tag
+SIMPLIFY_TOLERANCE_PX = 0.5  # Maximum deviation of the drawn line from the route in pixels
+VIEW_MARGIN = 0.5  # Extra area around the viewport (fraction of its size) put on the canvas
+DEFAULT_MAX_ZOOM = 19
+
+_layer_numbers = itertools.count(1)
+
+
+def simplification_ranks(x, y, min_tolerance=0.0):
+    """Douglas-Peucker significance of every vertex of a polyline
+
+    A vertex is part of the simplification at tolerance eps exactly when its
+    significance is greater than eps; the end points are always kept.
+    Vertices below min_tolerance get 0 without further recursion.
+    """
+    count = len(x)
+    significance = np.zeros(count)  # Squared until the end
+    significance[[0, -1]] = np.inf
+    starts = np.array([0] if count > 2 else [], dtype=np.int64)
+    ends = np.array([count - 1] if count > 2 else [], dtype=np.int64)
+    caps = np.full(starts.size, np.inf)  # Significance of the vertex whose split created the range
+    min_squared = min_tolerance * min_tolerance
+
+    while starts.size:
+        # Interior vertices of all ranges, grouped by range
+        lengths = ends - starts - 1
+        offsets = np.cumsum(lengths) - lengths
+        index = np.arange(lengths.sum()) + np.repeat(starts + 1 - offsets, lengths)
+
+        # Squared distance of every vertex to its range's chord (clamped to the chord's ends)
+        x1, y1 = x[starts], y[starts]
+        dx, dy = x[ends] - x1, y[ends] - y1
+        length2 = dx * dx + dy * dy
+        inverse = np.divide(1.0, length2, out=np.zeros_like(length2), where=length2 > 0)
+        px = x[index] - np.repeat(x1, lengths)
+        py = y[index] - np.repeat(y1, lengths)
+        chord_x, chord_y = np.repeat(dx, lengths), np.repeat(dy, lengths)
+        t = np.clip((px * chord_x + py * chord_y) * np.repeat(inverse, lengths), 0.0, 1.0)
+        px -= t * chord_x
+        py -= t * chord_y
+        distance = px * px + py * py
+
+        # Farthest vertex of every range (the first one on ties)
+        best = np.maximum.reduceat(distance, offsets)
+        candidates = np.flatnonzero(distance == np.repeat(best, lengths))
+        owner = np.repeat(np.arange(starts.size), lengths)[candidates]
+        first = np.ones(candidates.size, dtype=bool)
+        first[1:] = owner[1:] != owner[:-1]
+        split = index[candidates[first]]
+        value = np.minimum(best, caps)
+        significance[split] = value
+
+        # Split into two ranges unless nothing in them can matter at any zoom level
+        deeper = value >= min_squared
+        starts = np.concatenate((starts[deeper], split[deeper]))
+        ends = np.concatenate((split[deeper], ends[deeper]))
+        caps = np.concatenate((value[deeper], value[deeper]))
+        keep = ends - starts > 1
+        starts, ends, caps = starts[keep], ends[keep], caps[keep]
+    return np.sqrt(significance)
+
+
+class RouteLayer:
+    """Draws the planned flight path with zoom-dependent simplification"""
+
+    def __init__(self, map_widget, route_source=None, color=ROUTE_COLOR, width=ROUTE_WIDTH):
+        self.map_widget = map_widget
+        self.route_source = route_source  # Returns (lats, lons) of the route in flight order
+        self.color = color
+        self.width = width
+        self.tag = f"{ROUTE_TAG}{next(_layer_numbers)}"
+        self.lats = None
+        self.lons = None
+        self.x = None  # Normalized Web-Mercator coordinates of the route
+        self.y = None
+        self.significance = None
+        self.levels = {}  # zoom -> (pixel x, pixel y) of the simplified route
+        self.items = []  # Canvas line items, one per visible run of segments
+        self.drawn = None  # (zoom, upper-left tile, scale, culled pixel bounds) of the items
+        self.update_pending = False
+        self.deleted = False
+        map_widget.canvas_path_list.append(self)
+
+    def schedule_update(self):
+        """Coalesce route change notifications into one update when Tk is idle"""
+        if not self.update_pending:
+            self.update_pending = True
+            self.map_widget.after_idle(self.update)
+
+    def update(self):
+        """Re-read the route and redraw if it changed"""
+        self.update_pending = False
+        self.set_route(*self.route_source())
+
+    def set_route(self, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if self.lats is not None and np.array_equal(lats, self.lats) and np.array_equal(lons, self.lons):
+            return
+        self.lats, self.lons = lats, lons
+        self.levels.clear()
+        if lats.size < 2:
+            self.x = self.y = self.significance = None
+        else:
+            self.x, self.y = mercator(lats, lons)
+            max_zoom = getattr(self.map_widget, 'max_zoom', DEFAULT_MAX_ZOOM)
+            self.significance = simplification_ranks(self.x, self.y, self.tolerance(max_zoom))
+        self.drawn = None
+        self.draw()
+
+    @staticmethod
+    def tolerance(zoom):
+        """SIMPLIFY_TOLERANCE_PX in normalized Web-Mercator units at a zoom level"""
+        return SIMPLIFY_TOLERANCE_PX / (TILE_SIZE * 2.0 ** zoom)
+
+    def level(self, zoom):
+        """Pixel coordinates of the route simplified for a zoom level (cached)"""
+        if zoom not in self.levels:
+            kept = self.significance > self.tolerance(zoom)
+            scale = TILE_SIZE * 2.0 ** zoom
+            self.levels[zoom] = (self.x[kept] * scale, self.y[kept] * scale)
+        return self.levels[zoom]
+
+    # Drawing (called by TkinterMapView on every pan and zoom)
+
+    def draw(self, move=False):
+        if self.deleted:
+            return
+        if self.x is None:
+            self.delete_items(0)
+            return
+        widget = self.map_widget
+        zoom = round(widget.zoom)
+        upper_left = widget.upper_left_tile_pos
+        lower_right = widget.lower_right_tile_pos
+        scale = widget.width / ((lower_right[0] - upper_left[0]) * TILE_SIZE)  # Canvas units per pixel
+
+        left, top = upper_left[0] * TILE_SIZE, upper_left[1] * TILE_SIZE
+        right, bottom = lower_right[0] * TILE_SIZE, lower_right[1] * TILE_SIZE
+        if move and self.drawn is not None:
+            drawn_zoom, drawn_upper_left, drawn_scale, bounds = self.drawn
+            if (drawn_zoom == zoom and abs(drawn_scale - scale) <= 1e-9 * scale and left >= bounds[0] and top >= bounds[1]
+                    and right <= bounds[2] and bottom <= bounds[3]):
+                dx = (drawn_upper_left[0] - upper_left[0]) * TILE_SIZE * scale
+                dy = (drawn_upper_left[1] - upper_left[1]) * TILE_SIZE * scale
+                widget.canvas.move(self.tag, dx, dy)
+                self.drawn = (zoom, upper_left, scale, bounds)
+                return
+
+        margin_x = (right - left) * VIEW_MARGIN
+        margin_y = (bottom - top) * VIEW_MARGIN
+        bounds = (left - margin_x, top - margin_y, right + margin_x, bottom + margin_y)
+        self.render(zoom, upper_left, scale, bounds)
+        self.drawn = (zoom, upper_left, scale, bounds)
+
+    def render(self, zoom, upper_left, scale, bounds):
+        """Put the simplified segments within bounds on the canvas"""
+        px, py = self.level(zoom)
+        x1, x2, y1, y2 = px[:-1], px[1:], py[:-1], py[1:]
+        visible = ((np.minimum(x1, x2) <= bounds[2]) & (np.maximum(x1, x2) >= bounds[0])
+                   & (np.minimum(y1, y2) <= bounds[3]) & (np.maximum(y1, y2) >= bounds[1]))
+
+        # Runs of consecutive visible segments; segments a..b-1 join vertices a..b
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], visible.view(np.int8), [0]))))
+        run_starts, run_ends = edges[0::2], edges[1::2]
+        canvas_x = (px - upper_left[0] * TILE_SIZE) * scale
+        canvas_y = (py - upper_left[1] * TILE_SIZE) * scale
+
+        canvas = self.map_widget.canvas
+        created = False
+        for i, (start, end) in enumerate(zip(run_starts.tolist(), run_ends.tolist())):
+            coords = np.column_stack((canvas_x[start:end + 1], canvas_y[start:end + 1])).ravel().tolist()
+            if i < len(self.items):
+                canvas.coords(self.items[i], coords)
+            else:
+                self.items.append(canvas.create_line(
+                    coords, width=self.width, fill=self.color,
+                    capstyle=tk.ROUND, joinstyle=tk.ROUND, tags=("path", self.tag)
+                ))
+                created = True
+        self.delete_items(run_starts.size)
+        if created:
+            self.map_widget.manage_z_order()
+
+    def delete_items(self, keep):
+        """Delete canvas items beyond the first keep"""
+        for item in self.items[keep:]:
+            self.map_widget.canvas.delete(item)
+        del self.items[keep:]
+
+    def delete(self):
+        """Remove the line from the map (also called by TkinterMapView.delete_all_path)"""
+        self.delete_items(0)
+        self.deleted = True
+        if self in self.map_widget.canvas_path_list:
+            self.map_widget.canvas_path_list.remove(self)
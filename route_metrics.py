@@ -0,0 +1,185 @@
+"""Incrementally maintained distance metrics for the planned flight route
+
+The route is takeoff -> route waypoints -> landing. RouteMetrics keeps the
+distance of every leg between consecutive route waypoints together with a
+running total and a lazily extended prefix-sum table, so edits only touch the
+legs adjacent to the changed waypoint. All distances use one geodesy
+precision tier (haversine by default).
+"""
+import numpy as np
+
+import geodesy
+
+
+class RouteMetrics:
+    """Per-segment distances and prefix sums for takeoff -> route -> landing"""
+
+    def __init__(self, precision=geodesy.DEFAULT_PRECISION):
+        self.precision = precision  # geodesy precision tier of every distance
+        self.takeoff = None  # (lat, lon) or None
+        self.land = None  # (lat, lon) or None
+        self._points = []  # (lat, lon) of route waypoints in flight order
+        self._legs = []  # _legs[i] is the distance from _points[i] to _points[i + 1]
+        self._legs_total = 0.0
+        self._prefix = [0.0]  # _prefix[i] = sum(_legs[:i]), valid for a leading subset of legs
+
+    def __len__(self):
+        return len(self._points)
+
+    def _leg(self, a, b):
+        """Distance in km between two (lat, lon) tuples"""
+        return geodesy.distance(a[0], a[1], b[0], b[1], self.precision)
+
+    def _invalidate_prefix(self, leg_index):
+        """Drop cached prefix sums that depend on legs from leg_index onwards"""
+        del self._prefix[leg_index + 1:]
+
+    def set_takeoff(self, coords):
+        """Set takeoff coordinates (lat, lon) or None"""
+        self.takeoff = tuple(coords) if coords is not None else None
+
+    def set_land(self, coords):
+        """Set landing coordinates (lat, lon) or None"""
+        self.land = tuple(coords) if coords is not None else None
+
+    def append(self, lat, lon):
+        """Append a waypoint to the end of the route"""
+        point = (lat, lon)
+        if self._points:
+            leg = self._leg(self._points[-1], point)
+            self._legs.append(leg)
+            self._legs_total += leg
+            if len(self._prefix) == len(self._legs):
+                self._prefix.append(self._prefix[-1] + leg)
+        self._points.append(point)
+
+    def extend(self, lats, lons):
+        """Append many waypoints with a single vectorized distance call"""
+        if len(lats) == 0:
+            return
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        new_points = zip(lats.tolist(), lons.tolist())
+        if self._points:
+            lats = np.concatenate(([self._points[-1][0]], lats))
+            lons = np.concatenate(([self._points[-1][1]], lons))
+        legs = geodesy.segment_distances(lats, lons, self.precision).tolist()
+        self._points.extend(new_points)
+        self._legs.extend(legs)
+        self._legs_total += sum(legs)
+
+    def insert(self, index, lat, lon):
+        """Insert a waypoint at a route position"""
+        if index >= len(self._points):
+            self.append(lat, lon)
+            return
+        index = max(index, 0)
+        point = (lat, lon)
+        after = self._points[index]
+        new_legs = [self._leg(point, after)]
+        if index > 0:
+            before = self._points[index - 1]
+            old_leg = self._legs[index - 1]
+            new_legs.insert(0, self._leg(before, point))
+            self._legs[index - 1:index] = new_legs
+            self._legs_total += sum(new_legs) - old_leg
+            self._invalidate_prefix(index - 1)
+        else:
+            self._legs.insert(0, new_legs[0])
+            self._legs_total += new_legs[0]
+            self._invalidate_prefix(0)
+        self._points.insert(index, point)
+
+    def remove(self, index):
+        """Remove the waypoint at a route position"""
+        last = len(self._points) - 1
+        if index < 0:
+            index += len(self._points)
+        if last == 0:
+            self.clear_route()
+            return
+        if index == 0:
+            self._legs_total -= self._legs.pop(0)
+            self._invalidate_prefix(0)
+        elif index == last:
+            self._legs_total -= self._legs.pop()
+            self._invalidate_prefix(index - 1)
+        else:
+            old_legs = self._legs[index - 1] + self._legs[index]
+            bridge = self._leg(self._points[index - 1], self._points[index + 1])
+            self._legs[index - 1:index + 1] = [bridge]
+            self._legs_total += bridge - old_legs
+            self._invalidate_prefix(index - 1)
+        del self._points[index]
+
+    def clear_route(self):
+        """Remove all route waypoints, keeping takeoff and landing"""
+        self._points.clear()
+        self._legs.clear()
+        self._legs_total = 0.0
+        self._prefix = [0.0]
+
+    def clear(self):
+        """Reset the whole route including takeoff and landing"""
+        self.clear_route()
+        self.takeoff = None
+        self.land = None
+
+    @property
+    def direct(self):
+        """Direct takeoff -> landing distance in km"""
+        if self.takeoff is None or self.land is None:
+            return 0.0
+        return self._leg(self.takeoff, self.land)
+
+    def _head(self):
+        """Distance from takeoff to the first route waypoint (or landing)"""
+        if self.takeoff is None:
+            return 0.0
+        target = self._points[0] if self._points else self.land
+        return self._leg(self.takeoff, target) if target is not None else 0.0
+
+    def _tail(self):
+        """Distance from the last route waypoint to landing"""
+        if self.land is None or not self._points:
+            return 0.0
+        return self._leg(self._points[-1], self.land)
+
+    @property
+    def total(self):
+        """Total route distance in km, O(1)"""
+        return self._head() + self._legs_total + self._tail()
+
+    def segments(self):
+        """Distances of every segment of takeoff -> route -> landing in km"""
+        if self.takeoff is None or self.land is None:
+            return list(self._legs)
+        if not self._points:
+            return [self._head()]
+        return [self._head()] + self._legs + [self._tail()]
+
+    def prefix_sums(self):
+        """Cumulative route distance at each route waypoint, measured from the first"""
+        if len(self._prefix) <= len(self._legs):
+            start = len(self._prefix) - 1
+            running = self._prefix[-1]
+            for leg in self._legs[start:]:
+                running += leg
+                self._prefix.append(running)
+            # Resync the running total to bound floating point drift
+            self._legs_total = running
+        return self._prefix[:len(self._points) or 1]
+
+    def cumulative(self):
+        """Cumulative distance at every point of takeoff -> route -> landing in km"""
+        head = self._head()
+        distances = [0.0]
+        if self._points:
+            distances.extend(head + d for d in self.prefix_sums())
+            if self.land is not None:
+                distances.append(distances[-1] + self._tail())
+        elif self.land is not None:
+            distances.append(head)
+        if self.takeoff is None:
+            distances.pop(0)
+        return distances
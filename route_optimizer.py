@@ -0,0 +1,157 @@
+"""Route optimization for takeoff -> route waypoints -> landing
+
+The intermediate waypoints are reordered to minimize total flight distance
+while takeoff and landing stay fixed at the ends. A nearest-neighbour tour is
+built first and then improved with 2-opt and Or-opt moves on a cached
+distance matrix until no move helps, the time budget runs out or the run is
+cancelled. Each move search is vectorized over all candidate positions, so a
+single improvement pass over n points costs O(n) NumPy calls. The matrix
+grows with the square of the route, so routes are limited to
+MAX_ROUTE_WAYPOINTS waypoints.
+"""
+from collections import namedtuple
+import time
+
+import numpy as np
+
+import geodesy
+
+DEFAULT_TIME_BUDGET = 5.0  # Seconds
+PROGRESS_INTERVAL = 0.2  # Minimum seconds between progress callbacks
+EPSILON = 1e-9  # Ignore improvements smaller than this (km)
+MAX_ROUTE_WAYPOINTS = 5000  # The n x n distance matrix takes 8 n^2 bytes (200 MB here)
+
+OptimizationResult = namedtuple(
+    'OptimizationResult', ['order', 'distance', 'initial_distance', 'passes', 'cancelled']
+)
+
+
+def tour_length(matrix, tour):
+    """Total length of a tour (array of node indices) in km"""
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+
+def nearest_neighbour_tour(matrix):
+    """Greedy path from node 0 to the last node visiting every node once"""
+    n = matrix.shape[0]
+    tour = np.empty(n, dtype=np.int64)
+    tour[0], tour[-1] = 0, n - 1
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = visited[n - 1] = True
+    current = 0
+    for position in range(1, n - 1):
+        row = np.where(visited, np.inf, matrix[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        tour[position] = current
+    return tour
+
+
+def two_opt_pass(matrix, tour, deadline, cancel_event=None):
+    """Apply improving 2-opt reversals in place; return True if any was applied"""
+    n = tour.size
+    improved = False
+    for i in range(n - 3):
+        if time.monotonic() > deadline or (cancel_event and cancel_event.is_set()):
+            break
+        a, b = tour[i], tour[i + 1]
+        c, d = tour[i + 2:n - 1], tour[i + 3:n]
+        delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+        k = int(np.argmin(delta))
+        if delta[k] < -EPSILON:
+            j = i + 2 + k
+            tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def or_opt_pass(matrix, tour, deadline, cancel_event=None, max_segment=3):
+    """Move segments of 1..max_segment nodes to a better position; return new tour and flag"""
+    improved = False
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length < tour.size:
+            if time.monotonic() > deadline or (cancel_event and cancel_event.is_set()):
+                return tour, improved
+            first, last = tour[i], tour[i + length - 1]
+            prev, nxt = tour[i - 1], tour[i + length]
+            removal_gain = matrix[prev, first] + matrix[last, nxt] - matrix[prev, nxt]
+
+            # Candidate edges (c, d) of the tour with the segment taken out
+            rest = np.concatenate((tour[:i], tour[i + length:]))
+            c, d = rest[:-1], rest[1:]
+            forward = matrix[c, first] + matrix[last, d] - matrix[c, d]
+            backward = matrix[c, last] + matrix[first, d] - matrix[c, d]
+            forward[i - 1] = backward[i - 1] = np.inf  # Original position
+
+            k_forward = int(np.argmin(forward))
+            k_backward = int(np.argmin(backward))
+            if forward[k_forward] <= backward[k_backward]:
+                k, cost, segment = k_forward, forward[k_forward], tour[i:i + length]
+            else:
+                k, cost, segment = k_backward, backward[k_backward], tour[i:i + length][::-1]
+
+            if cost - removal_gain < -EPSILON:
+                tour = np.concatenate((rest[:k + 1], segment, rest[k + 1:]))
+                improved = True
+            else:
+                i += 1
+    return tour, improved
+
+
+def optimize_route(lats, lons, time_budget=DEFAULT_TIME_BUDGET, cancel_event=None, progress=None):
+    """Reorder the intermediate points of a path with fixed first and last points
+
+    lats/lons hold takeoff first, landing last and the route waypoints in
+    between. Returns an OptimizationResult whose order lists the indices of
+    the intermediate points (0-based into the route waypoints) in optimized
+    flight order. progress(distance, order) is called from the optimizing
+    thread whenever a better route is found, at most every PROGRESS_INTERVAL
+    seconds. Setting cancel_event stops the search and returns the best route
+    found so far. Raises ValueError for more than MAX_ROUTE_WAYPOINTS
+    intermediate points.
+    """
+    start_time = time.monotonic()
+    deadline = start_time + time_budget
+    n = len(lats)
+    intermediate = n - 2
+    if intermediate > MAX_ROUTE_WAYPOINTS:
+        raise ValueError(f"Route optimization is limited to {MAX_ROUTE_WAYPOINTS} route waypoints, "
+                         f"the route has {intermediate}")
+    if intermediate < 2:
+        matrix = geodesy.distance_matrix(lats, lons)
+        distance = tour_length(matrix, np.arange(n))
+        return OptimizationResult(list(range(max(intermediate, 0))), distance, distance, 0, False)
+
+    matrix = geodesy.distance_matrix(lats, lons)
+    initial_distance = tour_length(matrix, np.arange(n))
+
+    tour = nearest_neighbour_tour(matrix)
+    if tour_length(matrix, tour) > initial_distance:
+        tour = np.arange(n)
+    best = tour_length(matrix, tour)
+    last_report = 0.0
+
+    def report(distance):
+        nonlocal last_report
+        now = time.monotonic()
+        if progress and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            progress(distance, (tour[1:-1] - 1).tolist())
+
+    report(best)
+
+    passes = 0
+    while time.monotonic() < deadline and not (cancel_event and cancel_event.is_set()):
+        passes += 1
+        improved = two_opt_pass(matrix, tour, deadline, cancel_event)
+        tour, moved = or_opt_pass(matrix, tour, deadline, cancel_event)
+        distance = tour_length(matrix, tour)
+        if distance < best - EPSILON:
+            best = distance
+            report(best)
+        if not (improved or moved):
+            break
+
+    cancelled = bool(cancel_event and cancel_event.is_set())
+    return OptimizationResult((tour[1:-1] - 1).tolist(), best, initial_distance, passes, cancelled)
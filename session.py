@@ -0,0 +1,63 @@
+"""Planner state kept between sessions
+
+On a clean exit the GUI saves the map viewport and the mission being edited;
+the next start restores them once the map is up. The viewport is a small
+JSON file, the mission a binary mission file next to it (see
+mission_format.py), which loads fastest. A mission recovered after a crash
+(autosave.py) takes precedence, as the journal is newer than the saved
+session; if recovery is declined or fails, the saved session is restored.
+"""
+from collections import namedtuple
+import json
+import os
+
+from mission_format import atomic_write
+
+SESSION_PATH = "session.json"
+SESSION_VERSION = 1
+
+Session = namedtuple('Session', ['position', 'zoom', 'mission_path'])  # mission_path is None without a mission
+
+
+def mission_path_for(path):
+    """Mission file saved next to a session file"""
+    return os.path.splitext(path)[0] + ".wpb"
+
+
+def save_session(mission, position, zoom, path=SESSION_PATH):
+    """Save the viewport (lat, lon), zoom and mission (if it has waypoints)"""
+    mission_path = mission_path_for(path)
+    if len(mission.waypoints):
+        mission.save(mission_path)
+    elif os.path.exists(mission_path):
+        os.remove(mission_path)
+    data = {
+        'version': SESSION_VERSION,
+        'position': [float(position[0]), float(position[1])],
+        'zoom': float(zoom),
+        'mission': os.path.basename(mission_path) if len(mission.waypoints) else None
+    }
+    with atomic_write(path) as f:
+        f.write(json.dumps(data, indent=2).encode('utf-8'))
+
+
+def load_session(path=SESSION_PATH):
+    """The saved Session, or None if there is none; ValueError if the file is invalid"""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    try:
+        if data.get('version') != SESSION_VERSION:
+            raise ValueError(f"Unsupported session version {data.get('version')!r}")
+        lat, lon = (float(value) for value in data['position'])
+        zoom = float(data['zoom'])
+    except KeyError as e:
+        raise ValueError(f"Invalid session file: missing {e.args[0]}") from None
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid session file: {str(e)}") from None
+    mission_path = None
+    if data.get('mission'):
+        mission_path = os.path.join(os.path.dirname(os.path.abspath(path)), os.path.basename(str(data['mission'])))
+    return Session((lat, lon), zoom, mission_path)
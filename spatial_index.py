@@ -0,0 +1,182 @@
+"""Grid spatial index over waypoint coordinates
+
+Waypoints are bucketed into a uniform grid in Web-Mercator space (the
+projection used by the map tiles), so "what is under this click" and "what is
+inside the viewport" only look at the cells covering the query. When a query
+covers more cells than it is worth visiting one by one (zoomed far out), the
+index falls back to a single vectorized scan of the waypoint store's
+coordinate arrays, which is sub-millisecond at 100k points.
+
+The index stores waypoint ids only; coordinates are read from the
+WaypointStore it was created with.
+"""
+import math
+
+import numpy as np
+
+TILE_SIZE = 256  # Map tile size in pixels
+CELL_LEVEL = 14  # Grid cells are the size of zoom-14 map tiles (~2.4 km at the equator)
+MAX_CELL_LOOKUPS = 1024  # Larger queries use a vectorized scan instead
+SCAN_FRACTION = 0.125  # Scan when a query is expected to touch this share of all waypoints
+MAX_LATITUDE = 85.05112878  # Web-Mercator latitude limit
+
+
+def mercator_latitude(y):
+    """Latitude of a normalized Web-Mercator y coordinate"""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def mercator(lats, lons):
+    """Project coordinates to normalized Web-Mercator x, y in [0, 1]"""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lons = np.asarray(lons, dtype=np.float64)
+    x = (lons + 180.0) / 360.0
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2.0
+    return x, y
+
+
+def hilbert_index(x, y, bits):
+    """Position along the Hilbert curve of integer grid coordinates in [0, 2 ** bits)"""
+    size = 1 << bits
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    index = np.zeros(x.shape, dtype=np.int64)
+    s = size >> 1
+    while s:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve continues in the right orientation
+        flip = rx & ~ry
+        x = np.where(flip, size - 1 - x, x)
+        y = np.where(flip, size - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return index
+
+
+class SpatialIndex:
+    """Incrementally maintained grid index of waypoint ids"""
+
+    def __init__(self, store, cell_level=CELL_LEVEL):
+        self.store = store
+        self.cells_per_side = 2 ** cell_level
+        self.cells = {}  # (cell_x, cell_y) -> list of waypoint ids
+
+    def _cell(self, lat, lon):
+        x, y = mercator(lat, lon)
+        n = self.cells_per_side
+        return min(int(x * n), n - 1), min(int(y * n), n - 1)
+
+    def add(self, waypoint_id, lat, lon):
+        """Index a waypoint"""
+        self.cells.setdefault(self._cell(lat, lon), []).append(waypoint_id)
+
+    def extend(self, ids, lats, lons):
+        """Index many waypoints at once, grouping them by cell before touching the buckets"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return
+        x, y = mercator(lats, lons)
+        n = self.cells_per_side
+        cell_x = np.minimum((x * n).astype(np.int64), n - 1)
+        cell_y = np.minimum((y * n).astype(np.int64), n - 1)
+        keys = cell_x * n + cell_y
+        order = np.argsort(keys, kind='stable')
+        keys, starts = np.unique(keys[order], return_index=True)
+        grouped = np.split(ids[order], starts[1:])
+        cells = self.cells
+        for key, group in zip(keys.tolist(), grouped):
+            key = divmod(key, n)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = group.tolist()
+            else:
+                bucket.extend(group.tolist())
+
+    def remove(self, waypoint_id, lat, lon):
+        """Remove a waypoint (lat/lon must be the indexed coordinates)"""
+        key = self._cell(lat, lon)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            return
+        try:
+            bucket.remove(waypoint_id)
+        except ValueError:
+            return
+        if not bucket:
+            del self.cells[key]
+
+    def clear(self):
+        """Remove all waypoints from the index"""
+        self.cells.clear()
+
+    def _mercator_box(self, x0, y0, x1, y1):
+        """Ids, lats and lons of waypoints whose projected position lies in [x0, x1] x [y0, y1]"""
+        n = self.cells_per_side
+        cx0, cx1 = max(int(x0 * n), 0), min(int(x1 * n), n - 1)
+        cy0, cy1 = max(int(y0 * n), 0), min(int(y1 * n), n - 1)
+        box_cells = (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+
+        # The projection is monotonic, so the box maps to a lat/lon box
+        north, south = mercator_latitude(max(y0, 0.0)), mercator_latitude(min(y1, 1.0))
+        west, east = x0 * 360.0 - 180.0, x1 * 360.0 - 180.0
+
+        store = self.store
+        expected = min(box_cells, len(self.cells)) * store.live / max(len(self.cells), 1)
+        if box_cells > MAX_CELL_LOOKUPS or expected > SCAN_FRACTION * store.live:
+            # Vectorized scan over the whole store
+            count = store.count
+            lats, lons = store.lats[:count], store.lons[:count]
+            mask = store.alive[:count] & (lats <= north) & (lats >= south) & (lons >= west) & (lons <= east)
+            return store.ids[:count][mask], lats[mask], lons[mask]
+
+        candidates = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    candidates.extend(bucket)
+        if not candidates:
+            empty = np.zeros(0)
+            return empty.astype(np.int64), empty, empty
+
+        ids = np.asarray(candidates, dtype=np.int64)
+        slots = store.slot_index[ids]
+        lats, lons = store.lats[slots], store.lons[slots]
+        mask = (lats <= north) & (lats >= south) & (lons >= west) & (lons <= east)
+        return ids[mask], lats[mask], lons[mask]
+
+    def query_box(self, north, west, south, east):
+        """Ids of waypoints inside a lat/lon bounding box"""
+        x0, y0 = mercator(north, west)
+        x1, y1 = mercator(south, east)
+        return self._mercator_box(float(x0), float(y0), float(x1), float(y1))[0]
+
+    def query_tiles(self, upper_left, lower_right, zoom):
+        """Ids of waypoints inside a viewport given in (fractional) tile coordinates"""
+        scale = 2.0 ** zoom
+        return self._mercator_box(
+            upper_left[0] / scale, upper_left[1] / scale,
+            lower_right[0] / scale, lower_right[1] / scale
+        )[0]
+
+    def nearest(self, lat, lon, zoom, radius_px):
+        """Id of the waypoint closest to a point within radius_px pixels at a zoom level, or None"""
+        world_px = TILE_SIZE * 2.0 ** zoom
+        x, y = mercator(lat, lon)
+        x, y = float(x), float(y)
+        r = radius_px / world_px
+        ids, lats, lons = self._mercator_box(x - r, y - r, x + r, y + r)
+        if ids.size == 0:
+            return None
+
+        # Within a few pixels the projection is locally linear: d(y)/d(lat) = 1 / (360 cos(lat))
+        y_scale = 1.0 / (360.0 * math.cos(math.radians(min(abs(lat), MAX_LATITUDE))))
+        dx = (lons - lon) / 360.0
+        dy = (lats - lat) * y_scale
+        dist_sq = dx * dx + dy * dy
+        best = int(np.argmin(dist_sq))
+        if dist_sq[best] > r * r:
+            return None
+        return int(ids[best])
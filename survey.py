@@ -0,0 +1,138 @@
+"""Area-coverage survey patterns
+
+generate_survey() covers a polygon with parallel flight lines flown back and
+forth (a boustrophedon or "lawnmower" pattern) and returns evenly spaced
+waypoints along them in flight order:
+
+- line_spacing is the distance between neighbouring lines in meters, i.e.
+  the swath width each line covers;
+- heading is the direction of the lines in degrees clockwise from north;
+- overlap is the along-line overlap of consecutive points' swath-wide
+  footprints, so points are line_spacing * (1 - overlap) apart (0 gives a
+  square grid, 0.5 twice as many points per line).
+
+The polygon is projected onto a local plane around its centroid
+(equirectangular, accurate to well under a meter for survey-sized areas) and
+rotated so the lines run along one axis. The crossings of all lines with all
+polygon edges are then computed as one NumPy array operation; pairs of
+crossings (even-odd rule) give the segments inside the polygon, so concave
+polygons yield several segments per line. Points of all segments are laid
+out with repeat/cumsum instead of a per-line loop, which keeps 50k-point
+surveys in the millisecond range.
+"""
+from collections import namedtuple
+import math
+
+import numpy as np
+
+import geodesy
+
+DEFAULT_LINE_SPACING = 30.0  # m
+DEFAULT_HEADING = 0.0  # Degrees clockwise from north
+DEFAULT_OVERLAP = 0.0  # Fraction of the footprint shared by consecutive points on a line
+MAX_OVERLAP = 0.95
+METERS_PER_DEGREE = geodesy.EARTH_RADIUS_KM * 1000 * math.pi / 180
+
+Survey = namedtuple('Survey', ['lats', 'lons', 'lines', 'point_spacing'])
+
+
+def _to_plane(lats, lons, origin):
+    """Local east/north meters around origin (lat, lon)"""
+    scale = math.cos(math.radians(origin[0]))
+    east = (np.asarray(lons, dtype=np.float64) - origin[1]) * METERS_PER_DEGREE * scale
+    north = (np.asarray(lats, dtype=np.float64) - origin[0]) * METERS_PER_DEGREE
+    return east, north
+
+
+def _from_plane(east, north, origin):
+    scale = math.cos(math.radians(origin[0]))
+    return origin[0] + north / METERS_PER_DEGREE, origin[1] + east / (METERS_PER_DEGREE * scale)
+
+
+def line_segments(along, across, line_spacing):
+    """Segments of evenly spaced lines (constant ``across``) inside a polygon
+
+    along/across are the polygon's vertex coordinates in the rotated plane.
+    Returns (line index, start, end) arrays of the inside segments, sorted by
+    line and then by start, and the across offset of every line.
+    """
+    offsets = np.arange(across.min() + line_spacing / 2, across.max(), line_spacing)
+    if offsets.size == 0:
+        # Narrower than one swath: a single line through the middle
+        offsets = np.array([(across.min() + across.max()) / 2])
+
+    # Crossings of every line (rows) with every edge (columns); half-open so vertices count once
+    a1, a2 = across, np.roll(across, -1)
+    b1, b2 = along, np.roll(along, -1)
+    lines = offsets[:, None]
+    crosses = (a1 <= lines) != (a2 <= lines)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (lines - a1) / (a2 - a1)
+    crossing = np.where(crosses, b1 + t * (b2 - b1), np.nan)
+
+    # Sort crossings per line (NaN last) and pair them up
+    crossing.sort(axis=1)
+    counts = crosses.sum(axis=1)
+    pairs = counts // 2
+    line_index = np.repeat(np.arange(offsets.size), pairs)
+    first = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    starts = crossing[line_index, 2 * first]
+    ends = crossing[line_index, 2 * first + 1]
+    return line_index, starts, ends, offsets
+
+
+def generate_survey(polygon, line_spacing=DEFAULT_LINE_SPACING, heading=DEFAULT_HEADING,
+                    overlap=DEFAULT_OVERLAP, start=None):
+    """Boustrophedon survey waypoints covering a polygon of (lat, lon) vertices
+
+    start, an optional (lat, lon) such as the takeoff point, picks the end of
+    the pattern the survey begins at. Returns Survey(lats, lons, lines,
+    point_spacing) with the points in flight order.
+    """
+    if len(polygon) < 3:
+        raise ValueError("A survey area needs at least three corners")
+    if line_spacing <= 0:
+        raise ValueError("Line spacing must be positive")
+    if not 0 <= overlap <= MAX_OVERLAP:
+        raise ValueError(f"Overlap must be between 0 and {MAX_OVERLAP:g}")
+    point_spacing = line_spacing * (1 - overlap)
+
+    lats, lons = np.asarray(polygon, dtype=np.float64).T
+    origin = (float(lats.mean()), float(lons.mean()))
+    east, north = _to_plane(lats, lons, origin)
+    h = math.radians(heading)
+    along = east * math.sin(h) + north * math.cos(h)
+    across = east * math.cos(h) - north * math.sin(h)
+
+    line_index, starts, ends, offsets = line_segments(along, across, line_spacing)
+
+    # Points per segment, centered on it; every segment gets at least its midpoint
+    lengths = ends - starts
+    counts = np.floor(lengths / point_spacing).astype(np.int64) + 1
+    margins = (lengths - (counts - 1) * point_spacing) / 2
+    segment = np.repeat(np.arange(counts.size), counts)
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Odd lines are flown backwards: reverse both their segments and the points on them
+    # (counted over lines that have segments, so empty lines do not break the alternation)
+    line_rank = np.unique(line_index, return_inverse=True)[1]
+    backwards = (line_rank % 2 == 1)
+    segment_rank = np.empty(counts.size, dtype=np.int64)
+    segment_rank[np.lexsort((np.where(backwards, -starts, starts), line_index))] = np.arange(counts.size)
+    order = np.argsort(segment_rank[segment], kind='stable')
+    point_along = starts[segment] + margins[segment] + step * point_spacing
+    point_along = np.where(backwards[segment], starts[segment] + ends[segment] - point_along, point_along)
+    point_across = offsets[line_index[segment]]
+    point_along = point_along[order]
+    point_across = point_across[order]
+
+    east = point_along * math.sin(h) + point_across * math.cos(h)
+    north = point_along * math.cos(h) - point_across * math.sin(h)
+    survey_lats, survey_lons = _from_plane(east, north, origin)
+
+    if start is not None and survey_lats.size > 1:
+        to_first = geodesy.equirectangular(start[0], start[1], survey_lats[0], survey_lons[0])
+        to_last = geodesy.equirectangular(start[0], start[1], survey_lats[-1], survey_lons[-1])
+        if to_last < to_first:
+            survey_lats, survey_lons = survey_lats[::-1], survey_lons[::-1]
+    return Survey(survey_lats, survey_lons, int(line_rank.max()) + 1 if line_rank.size else 0, point_spacing)
@@ -0,0 +1,207 @@
+"""Live vehicle telemetry ingestion
+
+Vehicles (or telemetry_sim.py) send one datagram per position/attitude
+sample over UDP or a local Unix datagram socket. TelemetryReceiver runs an
+asyncio event loop on a background thread that decodes the datagrams and
+keeps only the newest sample of each vehicle. FORWARD_RATE times per second
+those samples are appended to a bounded deque, which the Tk thread drains
+at its own frame rate (see vehicle_layer.py). deque.append and popleft are
+atomic, so no lock is shared with the UI; if the UI falls behind, the
+oldest samples are dropped instead of building up a backlog.
+
+A 100 Hz stream per vehicle thus costs the Tk thread nothing: it only ever
+sees FORWARD_RATE samples per vehicle per second.
+
+Datagram layout, little-endian (after MAVLink's GLOBAL_POSITION_INT and
+ATTITUDE messages)::
+
+    4s     magic b"DTEL"
+    uint16 vehicle id
+    uint32 sequence number
+    float64 time (s)
+    int32  latitude, longitude (1e-7 degrees)
+    int32  altitude (mm)
+    int16  roll, pitch (centidegrees)
+    uint16 yaw (centidegrees, 0-35999)
+"""
+import asyncio
+from collections import deque, namedtuple
+import os
+import socket
+import struct
+import threading
+
+DEFAULT_ADDRESS = "udp://127.0.0.1:14550"
+MAGIC = b"DTEL"
+PACKET = struct.Struct("<4sHIdiiihhH")
+COORDINATE_SCALE = 10 ** 7
+FORWARD_RATE = 20  # Samples per vehicle per second handed to the UI
+QUEUE_SIZE = 4096  # Forwarded samples kept until the UI drains them
+START_TIMEOUT = 2.0  # Seconds to wait for the socket to be bound
+
+TelemetrySample = namedtuple(
+    'TelemetrySample', ['vehicle_id', 'seq', 'time', 'lat', 'lon', 'alt', 'roll', 'pitch', 'yaw']
+)
+
+
+def encode_sample(sample):
+    """Datagram bytes of a sample (altitude in m, angles in degrees)"""
+    return PACKET.pack(
+        MAGIC, sample.vehicle_id, sample.seq & 0xFFFFFFFF, sample.time,
+        round(sample.lat * COORDINATE_SCALE), round(sample.lon * COORDINATE_SCALE),
+        round(sample.alt * 1000),
+        round(sample.roll * 100), round(sample.pitch * 100), round(sample.yaw % 360 * 100) % 36000
+    )
+
+
+def decode_sample(data):
+    """Sample of a datagram; raises ValueError for anything else"""
+    if len(data) != PACKET.size:
+        raise ValueError(f"Telemetry datagram has {len(data)} bytes, expected {PACKET.size}")
+    magic, vehicle_id, seq, timestamp, lat, lon, alt, roll, pitch, yaw = PACKET.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("Not a telemetry datagram")
+    return TelemetrySample(
+        vehicle_id, seq, timestamp,
+        lat / COORDINATE_SCALE, lon / COORDINATE_SCALE, alt / 1000,
+        roll / 100, pitch / 100, yaw / 100
+    )
+
+
+def parse_address(address):
+    """('udp', (host, port)) or ('unix', path) for "udp://host:port" or "unix:///path" """
+    if address.startswith("udp://"):
+        host, _, port = address[len("udp://"):].rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid telemetry address: {address}")
+        return 'udp', (host, int(port))
+    if address.startswith("unix://"):
+        path = address[len("unix://"):]
+        if not path:
+            raise ValueError(f"Invalid telemetry address: {address}")
+        return 'unix', path
+    raise ValueError(f"Telemetry address must start with udp:// or unix://: {address}")
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.receive(data)
+
+
+class TelemetryReceiver:
+    """Receives telemetry on a background asyncio loop and decimates it for the UI"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, forward_rate=FORWARD_RATE, queue_size=QUEUE_SIZE):
+        self.address = address
+        self.kind, self.bind_address = parse_address(address)
+        self.forward_interval = 1.0 / forward_rate
+        self.samples = deque(maxlen=queue_size)  # Forwarded samples, drained by the Tk thread
+        self.pending = {}  # Vehicle id -> newest sample since the last forward (loop thread only)
+        self.received = 0
+        self.malformed = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.loop = None
+        self.transport = None
+        self.thread = None
+        self.error = None
+        self.ready = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Bind the socket and start receiving; raises OSError if the socket cannot be bound"""
+        self.ready.clear()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.ready.wait(START_TIMEOUT)
+        if self.error:
+            self.thread.join()
+            raise self.error
+
+    def stop(self, timeout=2.0):
+        if self.loop and self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+
+    def run(self):
+        """Receiver thread: runs the asyncio loop until stop()"""
+        loop = self.loop = asyncio.new_event_loop()
+        try:
+            try:
+                loop.run_until_complete(self.open())
+            except OSError as e:
+                self.error = e
+                return
+            finally:
+                self.ready.set()
+            loop.call_later(self.forward_interval, self.forward)
+            loop.run_forever()
+        finally:
+            if self.transport:
+                self.transport.close()
+            loop.close()
+            if self.kind == 'unix' and not self.error:
+                try:
+                    os.unlink(self.bind_address)
+                except OSError:
+                    pass
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        if self.kind == 'udp':
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), local_addr=self.bind_address
+            )
+        else:
+            if os.path.exists(self.bind_address):
+                os.unlink(self.bind_address)  # Stale socket file of an earlier run
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), local_addr=self.bind_address, family=socket.AF_UNIX
+            )
+
+    def receive(self, data):
+        """Decode a datagram and keep it as the vehicle's newest sample (loop thread)"""
+        self.received += 1
+        try:
+            sample = decode_sample(data)
+        except ValueError:
+            self.malformed += 1
+            return
+        self.pending[sample.vehicle_id] = sample
+
+    def forward(self):
+        """Hand the newest sample of each vehicle to the UI queue (loop thread)"""
+        if self.pending:
+            overflow = len(self.samples) + len(self.pending) - self.samples.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.samples.extend(self.pending.values())
+            self.forwarded += len(self.pending)
+            self.pending = {}
+        self.loop.call_later(self.forward_interval, self.forward)
+
+    def drain(self):
+        """Samples forwarded since the last call, oldest first (Tk thread)"""
+        samples = []
+        try:
+            while True:
+                samples.append(self.samples.popleft())
+        except IndexError:
+            pass
+        return samples
+
+    def stats(self):
+        """Datagram counters since start"""
+        return {
+            'received': self.received,
+            'malformed': self.malformed,
+            'forwarded': self.forwarded,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,150 @@
+"""Local telemetry simulator
+
+Sends synthetic position/attitude telemetry for several vehicles to a
+TelemetryReceiver (see telemetry.py), to try out and test the live map
+without hardware:
+
+    python telemetry_sim.py                              # 3 vehicles at 100 Hz to udp://127.0.0.1:14550
+    python telemetry_sim.py --vehicles 8 --rate 200 --duration 60
+    python telemetry_sim.py --mission mission.wpt        # fly the mission's route
+    python telemetry_sim.py --address unix:///tmp/drone-telemetry.sock
+
+Without a mission each vehicle circles the center point on its own radius;
+with one, the vehicles fly takeoff -> route -> landing in a loop, spaced
+out along the route.
+"""
+import argparse
+import math
+import socket
+import sys
+import time
+
+import numpy as np
+
+import geodesy
+from mission import Mission
+from telemetry import DEFAULT_ADDRESS, TelemetrySample, encode_sample, parse_address
+
+CENTER = (37.7749, -122.4194)  # Circle center without a mission
+CIRCLE_RADIUS_M = 300.0  # Radius of the first vehicle's circle; each further vehicle adds the same
+SPEED_MS = 15.0  # Ground speed
+ALTITUDE_M = 50.0
+METERS_PER_DEGREE = geodesy.EARTH_RADIUS_KM * 1000 * math.pi / 180
+
+
+class CircleFlight:
+    """Positions of a vehicle circling a center point"""
+
+    def __init__(self, center, radius_m, phase):
+        self.center = center
+        self.radius_m = radius_m
+        self.phase = phase
+
+    def position(self, t):
+        """(lat, lon, heading in degrees) after t seconds"""
+        angle = self.phase + SPEED_MS * t / self.radius_m
+        north = self.radius_m * math.cos(angle)
+        east = self.radius_m * math.sin(angle)
+        lat = self.center[0] + north / METERS_PER_DEGREE
+        lon = self.center[1] + east / (METERS_PER_DEGREE * math.cos(math.radians(self.center[0])))
+        return lat, lon, math.degrees(angle + math.pi / 2) % 360
+
+
+class RouteFlight:
+    """Positions of a vehicle flying a mission route in a loop"""
+
+    def __init__(self, lats, lons, offset_m):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.distances = geodesy.route_distances(self.lats, self.lons).cumulative * 1000
+        self.offset_m = offset_m
+
+    def position(self, t):
+        length = self.distances[-1]
+        if length <= 0:
+            return float(self.lats[0]), float(self.lons[0]), 0.0
+        s = (self.offset_m + SPEED_MS * t) % length
+        i = min(int(np.searchsorted(self.distances, s, side='right')) - 1, len(self.distances) - 2)
+        f = (s - self.distances[i]) / max(self.distances[i + 1] - self.distances[i], 1e-9)
+        lat = self.lats[i] + f * (self.lats[i + 1] - self.lats[i])
+        lon = self.lons[i] + f * (self.lons[i + 1] - self.lons[i])
+        heading = math.degrees(math.atan2(
+            (self.lons[i + 1] - self.lons[i]) * math.cos(math.radians(lat)),
+            self.lats[i + 1] - self.lats[i]
+        )) % 360
+        return float(lat), float(lon), heading
+
+
+def make_flights(vehicles, mission=None):
+    if mission is None:
+        return [
+            CircleFlight(CENTER, CIRCLE_RADIUS_M * (i + 1), 2 * math.pi * i / vehicles)
+            for i in range(vehicles)
+        ]
+    problems = mission.validate()
+    if problems:
+        raise ValueError(f"Mission cannot be simulated: {problems[0]}")
+    lats, lons = mission.waypoints.coordinates_of(mission.full_route())
+    length = geodesy.route_distances(lats, lons).total * 1000
+    return [RouteFlight(lats, lons, length * i / vehicles) for i in range(vehicles)]
+
+
+def simulate(address=DEFAULT_ADDRESS, vehicles=3, rate=100.0, duration=None, mission=None, stop_event=None):
+    """Send telemetry for vehicles at rate Hz each until duration seconds passed; returns the datagram count"""
+    kind, target = parse_address(address)
+    flights = make_flights(vehicles, mission)
+    sock = socket.socket(socket.AF_INET if kind == 'udp' else socket.AF_UNIX, socket.SOCK_DGRAM)
+    interval = 1.0 / rate
+    started = time.monotonic()
+    next_tick = started
+    seq = 0
+    sent = 0
+    try:
+        while duration is None or next_tick - started < duration:
+            if stop_event is not None and stop_event.is_set():
+                break
+            t = next_tick - started
+            for vehicle_id, flight in enumerate(flights, 1):
+                lat, lon, heading = flight.position(t)
+                sample = TelemetrySample(
+                    vehicle_id, seq, time.time(), lat, lon,
+                    ALTITUDE_M + 5 * math.sin(t / 4 + vehicle_id),
+                    10 * math.sin(t + vehicle_id), 2 * math.cos(t), heading
+                )
+                try:
+                    sock.sendto(encode_sample(sample), target)
+                    sent += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    pass  # Receiver not listening (yet)
+            seq += 1
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        sock.close()
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send simulated drone telemetry.")
+    parser.add_argument('--address', '-a', default=DEFAULT_ADDRESS, help="udp://host:port or unix:///path")
+    parser.add_argument('--vehicles', '-n', type=int, default=3)
+    parser.add_argument('--rate', '-r', type=float, default=100.0, help="Samples per second per vehicle")
+    parser.add_argument('--duration', '-d', type=float, default=None, help="Seconds (default: until Ctrl+C)")
+    parser.add_argument('--mission', '-m', help="Mission file whose route the vehicles fly")
+    args = parser.parse_args(argv)
+
+    mission = Mission.load(args.mission) if args.mission else None
+    print(f"Sending {args.vehicles} vehicles at {args.rate:g} Hz to {args.address} (Ctrl+C to stop)")
+    started = time.monotonic()
+    try:
+        sent = simulate(args.address, args.vehicles, args.rate, args.duration, mission)
+    except KeyboardInterrupt:
+        return 0
+    print(f"Sent {sent} datagrams in {time.monotonic() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
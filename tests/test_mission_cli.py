@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+
+from mission import Mission
+import mission_cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_mission(path, count, start_lat=37.0):
+    mission = Mission()
+    for i in range(count):
+        mission.add_waypoint(start_lat + i * 0.01, -122.0)
+    mission.set_takeoff(mission.waypoints.get(1))
+    mission.set_land(mission.waypoints.get(count))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mission.save(str(path))
+    return path
+
+
+def run_cli(command, paths, output_dir, output_format):
+    stream = io.StringIO()
+    stats = mission_cli.run(command, paths, output_dir, workers=1, stream=stream, output_format=output_format)
+    return stats, stream.getvalue()
+
+
+def test_convert_mirrors_directories(tmp_path):
+    write_mission(tmp_path / "in" / "a" / "m.json", 3)
+    write_mission(tmp_path / "in" / "b" / "m.json", 5)
+    stats, output = run_cli('convert', [str(tmp_path / "in")], str(tmp_path / "out"), 'binary')
+    assert stats['ok'] == 2 and stats['failed'] == 0, output
+    assert len(Mission.load(str(tmp_path / "out" / "a" / "m.wpb")).waypoints) == 3
+    assert len(Mission.load(str(tmp_path / "out" / "b" / "m.wpb")).waypoints) == 5
+
+
+def test_convert_fails_colliding_outputs(tmp_path):
+    write_mission(tmp_path / "in" / "m.json", 3)
+    write_mission(tmp_path / "in" / "m.wpt", 5)
+    write_mission(tmp_path / "in" / "other.json", 4)
+    stats, output = run_cli('convert', [str(tmp_path / "in")], str(tmp_path / "out"), 'binary')
+    assert stats['ok'] == 1 and stats['failed'] == 2, output
+    assert "also the output of" in output
+    assert sorted(os.listdir(tmp_path / "out")) == ["other.wpb"]
+
+
+def test_convert_does_not_overwrite_inputs(tmp_path):
+    source = write_mission(tmp_path / "m.json", 3)
+    other = write_mission(tmp_path / "n.wpt", 4)
+    before = source.read_bytes(), other.read_bytes()
+    write_mission(tmp_path / "n.json", 6)
+    stats, output = run_cli('convert', [str(tmp_path)], str(tmp_path), 'json')
+    assert stats['ok'] == 0 and stats['failed'] == 3, output
+    assert "overwrite an input" in output
+    assert (source.read_bytes(), other.read_bytes()) == before
+
+
+def test_command_line_exit_status(tmp_path):
+    write_mission(tmp_path / "in" / "a" / "m.json", 3)
+    write_mission(tmp_path / "in" / "b" / "m.wpt", 4)
+
+    def cli(*args):
+        return subprocess.run([sys.executable, os.path.join(ROOT, "mission_cli.py"), *args],
+                              capture_output=True, text=True, cwd=tmp_path)
+
+    converted = cli('convert', "in", "-o", "out", "-f", "text", "-j", "2")
+    assert converted.returncode == 0, converted.stdout + converted.stderr
+    assert os.path.exists(tmp_path / "out" / "a" / "m.wpt") and os.path.exists(tmp_path / "out" / "b" / "m.wpt")
+    assert cli('validate', "out").returncode == 0
+    assert cli('convert', "in", "-o", "in").returncode == 1
+    (tmp_path / "broken.json").write_text("{}")
+    assert cli('validate', "broken.json").returncode == 1
+
+
+def test_invalid_files_fail_every_command(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "list.json").write_text("[1, 2]")
+    (tmp_path / "in" / "range.json").write_text(
+        '{"waypoints": [{"id": 1, "lat": 999, "lon": 0}, {"id": 2, "lat": 37.0, "lon": -122.0}]}')
+    for command in mission_cli.COMMANDS:
+        stats, output = run_cli(command, [str(tmp_path / "in")], str(tmp_path / "out"), 'text')
+        assert stats['ok'] == 0 and stats['failed'] == 2, output
+        assert "not a JSON object" in output and "out of range" in output
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_measure_does_not_fail_incomplete_plans(tmp_path):
+    mission = Mission()
+    mission.add_waypoint(37.0, -122.0)
+    mission.save(str(tmp_path / "no_plan.wpt"))
+    stats, output = run_cli('measure', [str(tmp_path)], None, 'json')
+    assert stats['ok'] == 1, output
+    stats, output = run_cli('validate', [str(tmp_path)], None, 'json')
+    assert stats['failed'] == 1, output
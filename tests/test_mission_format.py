@@ -0,0 +1,104 @@
+import json
+import os
+import stat
+
+import pytest
+
+from mission import Mission
+import mission_format
+
+
+def write_wpt(path, records, takeoff_id=None, land_id=None, route=()):
+    """Write a text mission file by hand: records are (id, lat, lon, type code)"""
+    header = {'timestamp': "2026-01-01T00:00:00", 'takeoff_id': takeoff_id, 'land_id': land_id,
+              'waypoints': len(records), 'route': len(route), 'names': 0}
+    lines = [f"{mission_format.TEXT_MAGIC} {mission_format.FORMAT_VERSION}", json.dumps(header)]
+    lines += ["%010d %+011d %+012d %d" % (wp_id, round(lat * 1e7), round(lon * 1e7), code)
+              for wp_id, lat, lon, code in records]
+    lines += ["%010d" % wp_id for wp_id in route]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.mark.parametrize('extension', ['.wpt', '.wpb', '.json'])
+def test_round_trip_keeps_ids_and_plan(tmp_path, extension):
+    mission = Mission()
+    for i in range(5):
+        mission.add_waypoint(37.0 + i * 0.01, -122.0 - i * 0.01)
+    ids = [waypoint.id for waypoint in mission.waypoints]
+    mission.set_takeoff(mission.waypoints.get(ids[0]))
+    mission.set_land(mission.waypoints.get(ids[-1]))
+    mission.toggle_route(mission.waypoints.get(ids[2]))
+    path = tmp_path / ("mission" + extension)
+    mission.save(str(path))
+
+    loaded = Mission.load(str(path))
+    assert [waypoint.id for waypoint in loaded.waypoints] == ids
+    assert loaded.takeoff.id == ids[0]
+    assert loaded.land.id == ids[-1]
+    assert [waypoint.id for waypoint in loaded.route] == [ids[2]]
+
+
+def test_dense_file_ids_are_kept(tmp_path):
+    path = write_wpt(tmp_path / "dense.wpt", [(2, 37.0, -122.0, 0), (3, 37.1, -122.1, 0), (7, 37.2, -122.2, 0)],
+                     takeoff_id=2, land_id=7)
+    mission = Mission.load(str(path))
+    assert [waypoint.id for waypoint in mission.waypoints] == [2, 3, 7]
+    assert mission.takeoff.id == 2 and mission.land.id == 7
+
+
+@pytest.mark.parametrize('file_ids', [[300000000], [9999999999], [1, 2, 5000000000], [10, 2 ** 62]])
+def test_sparse_huge_ids_are_remapped(tmp_path, file_ids):
+    records = [(wp_id, 37.0 + i * 0.01, -122.0, 0) for i, wp_id in enumerate(file_ids)]
+    if max(file_ids) > 9999999999:
+        path = tmp_path / "sparse.wpb"
+        write_wpt(tmp_path / "small.wpt", [(i + 1, lat, lon, code) for i, (_, lat, lon, code) in enumerate(records)])
+        snap = mission_format.snapshot(Mission.load(str(tmp_path / "small.wpt")))
+        snap = snap._replace(ids=snap.ids.copy())
+        snap.ids[:] = file_ids
+        mission_format.write_snapshot(snap, str(path))
+    else:
+        path = write_wpt(tmp_path / "sparse.wpt", records, takeoff_id=file_ids[0], land_id=file_ids[-1],
+                         route=file_ids[1:-1])
+    mission = Mission.load(str(path))
+    ids = [waypoint.id for waypoint in mission.waypoints]
+    assert ids == list(range(1, len(file_ids) + 1))
+    assert mission.waypoints.slot_index.size <= 4096
+    assert [waypoint.lat for waypoint in mission.waypoints] == pytest.approx([lat for _, lat, _, _ in records])
+    if path.suffix == ".wpt":
+        assert mission.takeoff.id == 1 and mission.land.id == len(file_ids)
+        assert [waypoint.id for waypoint in mission.route] == ids[1:-1]
+
+
+def test_file_ids_below_existing_ids_are_remapped(tmp_path):
+    path = write_wpt(tmp_path / "low.wpt", [(1, 37.0, -122.0, 0), (2, 37.1, -122.1, 0)], land_id=2)
+    mission = Mission()
+    mission.add_waypoint(36.0, -121.0)
+    mission.load_file(str(path))
+    assert [waypoint.id for waypoint in mission.waypoints] == [1, 2, 3]
+    assert mission.land.id == 3
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="POSIX permissions")
+def test_saved_files_get_regular_permissions(tmp_path):
+    mission = Mission()
+    mission.add_waypoint(37.0, -122.0)
+    path = tmp_path / "mission.wpb"
+    mission.save(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~mission_format._UMASK
+
+    os.chmod(path, 0o640)
+    mission.save(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_failed_write_keeps_the_existing_file(tmp_path):
+    path = tmp_path / "mission.json"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with mission_format.atomic_write(str(path)) as f:
+            f.write(b"partial")
+            raise RuntimeError("disk full")
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["mission.json"]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import fleet
+import geodesy
+import route_optimizer
+
+
+def test_distance_matrix_blocks_match_pairwise_distances():
+    rng = np.random.default_rng(3)
+    lats, lons = 37 + rng.random(600), -122 + rng.random(600)
+    matrix = geodesy.distance_matrix(lats, lons)
+    expected = geodesy.distance_array(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+    assert matrix.shape == (600, 600)
+    np.testing.assert_allclose(matrix, expected)
+
+
+def test_optimize_route_improves_a_shuffled_line():
+    rng = np.random.default_rng(4)
+    lats = np.concatenate(([37.0], 37.0 + rng.permutation(50) * 0.001, [37.051]))
+    lons = np.full(lats.size, -122.0)
+    result = route_optimizer.optimize_route(lats, lons, time_budget=2.0)
+    assert sorted(result.order) == list(range(50))
+    assert result.distance < result.initial_distance
+    assert result.distance == pytest.approx(geodesy.distance(37.0, -122.0, 37.051, -122.0), rel=1e-6)
+
+
+def test_optimize_route_refuses_routes_over_the_limit(monkeypatch):
+    monkeypatch.setattr(route_optimizer, 'MAX_ROUTE_WAYPOINTS', 10)
+    lats = np.linspace(37.0, 37.1, 13)
+    with pytest.raises(ValueError, match="limited to 10"):
+        route_optimizer.optimize_route(lats, np.full(13, -122.0))
+
+
+def test_plan_fleet_refuses_vehicle_routes_over_the_limit(monkeypatch):
+    monkeypatch.setattr(route_optimizer, 'MAX_ROUTE_WAYPOINTS', 10)
+    lats = np.linspace(37.0, 37.1, 30)
+    with pytest.raises(ValueError, match="more vehicles"):
+        fleet.plan_fleet(lats, np.full(30, -122.0), 2, [(37.0, -122.0)], [(37.1, -122.0)], workers=1)
@@ -0,0 +1,161 @@
+import http.server
+import io
+import sqlite3
+import threading
+
+from PIL import Image
+import pytest
+
+import tile_cache
+from tile_cache import TileCache
+
+BOX = (37.80, -122.45, 37.75, -122.40)  # north, west, south, east
+
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves /<layer>/<z>/<x>/<y>.png tiles coloured by layer; unknown layers are 404"""
+    colors = {'a': (255, 0, 0), 'b': (0, 0, 255)}
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        layer = self.path.split("/")[1]
+        if layer not in self.colors:
+            self.send_error(404)
+            return
+        image = io.BytesIO()
+        Image.new("RGB", (4, 4), self.colors[layer]).save(image, "PNG")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(image.tell()))
+        self.end_headers()
+        self.wfile.write(image.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(httpd, layer="a"):
+    return f"http://127.0.0.1:{httpd.server_address[1]}/{layer}/{{z}}/{{x}}/{{y}}.png"
+
+
+def open_cache(path, tile_server, **kwargs):
+    cache = TileCache(str(path), tile_server, **kwargs)
+    cache.decode = lambda data: Image.open(io.BytesIO(data))  # PIL image instead of a Tk one: no display needed
+    return cache
+
+
+def pixel(image):
+    return image.convert("RGB").getpixel((0, 0))
+
+
+def test_memory_disk_and_network_tiers(tmp_path, server):
+    cache = open_cache(tmp_path / "tiles.mbtiles", url(server))
+    image = cache.image(12, 655, 1583)
+    assert pixel(image) == (255, 0, 0)
+    assert server.requests == ["/a/12/655/1583.png"]
+    assert cache.image(12, 655, 1583) is image  # Memory hit
+    assert len(server.requests) == 1
+
+    reopened = open_cache(tmp_path / "tiles.mbtiles", url(server))
+    assert pixel(reopened.image(12, 655, 1583)) == (255, 0, 0)  # Disk hit
+    assert len(server.requests) == 1
+    assert reopened.cached_image(12, 655, 1583) is not False
+
+
+def test_memory_tier_is_bounded(tmp_path, server):
+    cache = open_cache(tmp_path / "tiles.mbtiles", url(server), memory_tiles=2)
+    for x in range(3):
+        cache.image(12, 655 + x, 1583)
+    assert cache.cached_image(12, 655, 1583) is False
+    assert cache.cached_image(12, 657, 1583) is not False
+    assert pixel(cache.image(12, 655, 1583)) == (255, 0, 0)  # Reloaded from disk
+    assert len(server.requests) == 3
+
+
+def test_missing_tile_does_not_go_offline(tmp_path, server):
+    cache = open_cache(tmp_path / "tiles.mbtiles", url(server, "missing"))
+    assert cache.image(12, 655, 1583) is None
+    assert cache.offline_until == 0.0
+
+
+def test_offline_backoff(tmp_path, server, monkeypatch):
+    cache = open_cache(tmp_path / "tiles.mbtiles", url(server))
+    cache.image(12, 655, 1583)
+    server.shutdown()
+    server.server_close()
+
+    attempts = []
+    download = cache.download
+    monkeypatch.setattr(cache, 'download', lambda *tile: attempts.append(tile) or download(*tile))
+    assert cache.image(12, 656, 1583) is None
+    assert len(attempts) == 1 and cache.offline_until > 0
+    assert cache.image(12, 657, 1583) is None  # Backing off: no network attempt
+    assert len(attempts) == 1
+    assert pixel(cache.image(12, 655, 1583)) == (255, 0, 0)  # Stored tiles still work
+
+    monkeypatch.setattr(tile_cache.time, 'monotonic', lambda: cache.offline_until + 1)
+    cache.image(12, 657, 1583)
+    assert len(attempts) == 2  # Retried after OFFLINE_RETRY
+
+
+def test_prefetch_resumes_after_cancel(tmp_path, server):
+    cache = open_cache(tmp_path / "tiles.mbtiles", url(server))
+    zooms = range(12, 15)
+    total = tile_cache.tile_count(*BOX, zooms)
+    cancel = threading.Event()
+
+    def progress(done, count):
+        if done >= total // 3:
+            cancel.set()
+
+    first = cache.prefetch(*BOX, zooms, workers=2, cancel_event=cancel, progress=progress)
+    assert first.cancelled and first.total == total and first.failed == 0
+    stored = len(cache.store)
+    assert 0 < stored < total
+
+    second = cache.prefetch(*BOX, zooms, workers=2)
+    assert not second.cancelled and second.failed == 0
+    assert second.cached == stored
+    assert second.downloaded == total - stored
+    assert len(cache.store) == total
+
+    third = cache.prefetch(*BOX, zooms)
+    assert (third.cached, third.downloaded) == (total, 0)
+
+
+def test_tiles_are_kept_per_server(tmp_path, server):
+    path = tmp_path / "tiles.mbtiles"
+    red = open_cache(path, url(server, "a"))
+    blue = open_cache(path, url(server, "b"))
+    assert pixel(red.image(12, 655, 1583)) == (255, 0, 0)
+    assert pixel(blue.image(12, 655, 1583)) == (0, 0, 255)
+    assert len(server.requests) == 2
+    assert len(red.store) == len(blue.store) == 1
+    blue.store.close()
+    assert open_cache(path, url(server, "b")).store.existing(12, 655, 655, 1583, 1583) == {(655, 1583)}
+
+
+def test_cache_without_server_column_is_migrated(tmp_path, server):
+    path = tmp_path / "old.mbtiles"
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, "
+                           "tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row))")
+        connection.execute("INSERT INTO metadata VALUES ('tile_server', ?)", (url(server, "a"),))
+        connection.execute("INSERT INTO tiles VALUES (12, 655, ?, ?)", ((1 << 12) - 1 - 1583, b"old"))
+    connection.close()
+
+    assert open_cache(path, url(server, "a")).store.get(12, 655, 1583) == b"old"
+    assert open_cache(path, url(server, "b")).store.get(12, 655, 1583) is None
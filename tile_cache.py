@@ -0,0 +1,293 @@
+"""Offline map tile cache for TkinterMapView
+
+Tiles are served from two tiers before the network is touched:
+
+- a bounded in-memory LRU of decoded images, so panning back and forth does
+  not decode the same PNGs again;
+- a persistent MBTiles file (SQLite) holding the encoded tile bytes, so tiles
+  survive restarts and the map keeps working without connectivity.
+
+Tiles missing from both tiers are downloaded from the tile server and written
+to disk. After a failed connection the cache stops trying the network for a
+while, so an offline map does not stall on one timeout per tile. The tile
+server is a URL template like TkinterMapView's ("{z}/{x}/{y}"), which makes
+it easy to point the cache at a local stand-in server. Stored tiles are keyed
+by their server, so one cache file can hold tiles of several servers without
+serving one server's tiles for another.
+
+prefetch() downloads every tile of an area over a zoom range with a worker
+pool, skipping tiles already on disk.
+"""
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import io
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from PIL import Image, ImageTk
+
+from spatial_index import mercator
+
+TILE_SERVER = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+USER_AGENT = "DroneControlGUI"
+MEMORY_TILES = 512  # Decoded tiles kept in memory (~256 KB each)
+REQUEST_TIMEOUT = 10  # Seconds per tile download
+OFFLINE_RETRY = 30  # Seconds without network attempts after a connection failure
+PREFETCH_WORKERS = 8
+PREFETCH_BATCH = 64  # Downloaded tiles written to disk per transaction
+
+PrefetchResult = namedtuple('PrefetchResult', ['total', 'cached', 'downloaded', 'failed', 'cancelled'])
+
+
+def tile_range(north, west, south, east, zoom):
+    """Inclusive (x0, x1, y0, y1) tile index range covering a lat/lon box at a zoom level"""
+    n = 2 ** zoom
+    (x0, x1), (y0, y1) = mercator([north, south], [west, east])
+    return (
+        max(int(x0 * n), 0), min(int(x1 * n), n - 1),
+        max(int(y0 * n), 0), min(int(y1 * n), n - 1)
+    )
+
+
+def tile_count(north, west, south, east, zooms):
+    """Number of tiles covering a lat/lon box over a range of zoom levels"""
+    total = 0
+    for zoom in zooms:
+        x0, x1, y0, y1 = tile_range(north, west, south, east, zoom)
+        total += (x1 - x0 + 1) * (y1 - y0 + 1)
+    return total
+
+
+class TileStore:
+    """MBTiles file of encoded tiles of one tile server, shared by all threads
+
+    MBTiles numbers rows from the south (TMS), so y is flipped on the way in
+    and out; callers use the XYZ scheme of the tile server. The tiles table
+    has a server column next to the MBTiles ones, referring to the tile
+    server's URL template in the tile_servers table.
+    """
+
+    def __init__(self, path, tile_server=TILE_SERVER):
+        self.path = path
+        self.tile_server = tile_server
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS tile_servers (id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL)"
+            )
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(tiles)")]
+            if columns and 'server' not in columns:
+                self._key_by_server()
+            self._create_tiles_table()
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)",
+                [('name', "Drone Control map cache"), ('format', "png")]
+            )
+            self.server = self._server_id(tile_server)
+
+    def _create_tiles_table(self):
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            "server INTEGER, zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB, "
+            "PRIMARY KEY (server, zoom_level, tile_column, tile_row))"
+        )
+
+    def _server_id(self, tile_server):
+        self.connection.execute("INSERT OR IGNORE INTO tile_servers (url) VALUES (?)", (tile_server,))
+        return self.connection.execute("SELECT id FROM tile_servers WHERE url=?", (tile_server,)).fetchone()[0]
+
+    def _key_by_server(self):
+        """Move the tiles of a cache file without server column to the server it was created for"""
+        row = self.connection.execute("SELECT value FROM metadata WHERE name='tile_server'").fetchone()
+        server = self._server_id(row[0] if row else TILE_SERVER)
+        self.connection.execute("ALTER TABLE tiles RENAME TO unkeyed_tiles")
+        self._create_tiles_table()
+        self.connection.execute(
+            "INSERT INTO tiles (server, zoom_level, tile_column, tile_row, tile_data) "
+            "SELECT ?, zoom_level, tile_column, tile_row, tile_data FROM unkeyed_tiles", (server,)
+        )
+        self.connection.execute("DROP TABLE unkeyed_tiles")
+        self.connection.execute("DELETE FROM metadata WHERE name='tile_server'")
+
+    def get(self, zoom, x, y):
+        """Encoded tile bytes, or None if the tile is not stored"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tile_data FROM tiles WHERE server=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                (self.server, zoom, x, (1 << zoom) - 1 - y)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, zoom, x, y, data):
+        self.put_many([(zoom, x, y, data)])
+
+    def put_many(self, tiles):
+        """Store (zoom, x, y, data) tiles in one transaction"""
+        rows = [(self.server, zoom, x, (1 << zoom) - 1 - y, data) for zoom, x, y, data in tiles]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO tiles (server, zoom_level, tile_column, tile_row, tile_data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def existing(self, zoom, x0, x1, y0, y1):
+        """Set of (x, y) tiles stored inside an inclusive tile range"""
+        flip = (1 << zoom) - 1
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT tile_column, tile_row FROM tiles "
+                "WHERE server=? AND zoom_level=? AND tile_column BETWEEN ? AND ? AND tile_row BETWEEN ? AND ?",
+                (self.server, zoom, x0, x1, flip - y1, flip - y0)
+            ).fetchall()
+        return {(x, flip - row) for x, row in rows}
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM tiles WHERE server=?", (self.server,)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class TileCache:
+    """Two-tier (memory LRU + MBTiles) tile provider for a TkinterMapView"""
+
+    def __init__(self, path, tile_server=TILE_SERVER, memory_tiles=MEMORY_TILES):
+        self.tile_server = tile_server
+        self.store = TileStore(path, tile_server)
+        self.memory = OrderedDict()  # (zoom, x, y) -> decoded image, least recently used first
+        self.memory_tiles = memory_tiles
+        self.lock = threading.Lock()
+        self.offline_until = 0.0  # time.monotonic() before which the network is not tried
+        self.map_widget = None
+
+    def install(self, map_widget):
+        """Make the map widget load its tiles through this cache"""
+        self.map_widget = map_widget
+        map_widget.get_tile_image_from_cache = self.cached_image
+        map_widget.request_image = self.request_image
+
+    # TkinterMapView hooks (called from its loader threads)
+
+    def cached_image(self, zoom, x, y):
+        """Decoded tile from memory, or False (the widget's "not cached" value)"""
+        with self.lock:
+            image = self.memory.get((zoom, x, y))
+            if image is None:
+                return False
+            self.memory.move_to_end((zoom, x, y))
+            return image
+
+    def request_image(self, zoom, x, y, db_cursor=None):
+        """Load a tile from disk or the network; the widget's blank tile if unavailable"""
+        image = self.image(zoom, x, y)
+        return image if image is not None else self.map_widget.empty_tile_image
+
+    # Tiers
+
+    def image(self, zoom, x, y):
+        """Decoded tile from memory, disk or the network, or None"""
+        image = self.cached_image(zoom, x, y)
+        if image is not False:
+            return image
+
+        data = self.fetch(zoom, x, y)
+        if data is None:
+            return None
+        try:
+            image = self.decode(data)
+        except Exception:
+            return None
+
+        with self.lock:
+            self.memory[(zoom, x, y)] = image
+            while len(self.memory) > self.memory_tiles:
+                self.memory.popitem(last=False)
+        return image
+
+    @staticmethod
+    def decode(data):
+        """Tk image of encoded tile bytes"""
+        return ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+
+    def fetch(self, zoom, x, y):
+        """Encoded tile from disk, downloading and storing it if needed"""
+        data = self.store.get(zoom, x, y)
+        if data is not None or time.monotonic() < self.offline_until:
+            return data
+
+        try:
+            data = self.download(zoom, x, y)
+        except urllib.error.HTTPError:
+            return None  # Server reachable, tile missing
+        except OSError:
+            self.offline_until = time.monotonic() + OFFLINE_RETRY
+            return None
+        self.store.put(zoom, x, y, data)
+        return data
+
+    def download(self, zoom, x, y):
+        """Download a tile's bytes; raises OSError (urllib.error.URLError) on failure"""
+        url = self.tile_server.replace("{z}", str(zoom)).replace("{x}", str(x)).replace("{y}", str(y))
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return response.read()
+
+    # Prefetch
+
+    def prefetch(self, north, west, south, east, zooms, workers=PREFETCH_WORKERS,
+                 cancel_event=None, progress=None):
+        """Download all missing tiles of a lat/lon box over the given zoom levels
+
+        progress(done, total) is called from the calling thread as tiles
+        complete. Returns a PrefetchResult.
+        """
+        total = tile_count(north, west, south, east, zooms)
+        missing = []
+        for zoom in zooms:
+            x0, x1, y0, y1 = tile_range(north, west, south, east, zoom)
+            stored = self.store.existing(zoom, x0, x1, y0, y1)
+            missing.extend(
+                (zoom, x, y)
+                for x in range(x0, x1 + 1)
+                for y in range(y0, y1 + 1)
+                if (x, y) not in stored
+            )
+        cached = total - len(missing)
+
+        downloaded = failed = 0
+        batch = []
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {executor.submit(self.download, *tile): tile for tile in missing}
+            for done, future in enumerate(as_completed(futures), cached + 1):
+                try:
+                    batch.append((*futures[future], future.result()))
+                    downloaded += 1
+                except OSError:
+                    failed += 1
+                if len(batch) >= PREFETCH_BATCH:
+                    self.store.put_many(batch)
+                    batch = []
+                if progress:
+                    progress(done, total)
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if batch:
+                self.store.put_many(batch)
+
+        if downloaded:
+            self.offline_until = 0.0
+        cancelled = downloaded + failed < len(missing)
+        return PrefetchResult(total, cached, downloaded, failed, cancelled)
@@ -0,0 +1,127 @@
+"""Live vehicle markers and breadcrumb trails on the map
+
+VehicleLayer drains a TelemetryReceiver's sample queue FRAME_RATE times per
+second on the Tk thread. Each frame moves every vehicle's marker once to its
+newest position and redraws its trail once, however many samples arrived in
+between, so canvas work is capped by the frame rate rather than by the
+telemetry rate. Trails keep the last TRAIL_POINTS positions spaced at least
+TRAIL_SPACING_M apart, so a hovering vehicle does not flood its trail.
+"""
+from collections import deque
+import time
+
+import geodesy
+
+FRAME_RATE = 10  # Map updates per second
+TRAIL_POINTS = 500  # Breadcrumb positions kept per vehicle
+TRAIL_SPACING_M = 3.0  # Minimum distance between breadcrumb positions
+STALE_SECONDS = 3.0  # A vehicle without samples for this long is shown as lost
+VEHICLE_COLORS = (  # (circle, outside, trail) per vehicle, cycled
+    ("#00e5ff", "#0097a7", "#00e5ff"),
+    ("#ffea00", "#c7b800", "#ffea00"),
+    ("#ff4081", "#c60055", "#ff4081"),
+    ("#76ff03", "#4caf50", "#76ff03"),
+    ("#e040fb", "#aa00ff", "#e040fb"),
+    ("#ff9100", "#c56200", "#ff9100"),
+    ("#1de9b6", "#00b686", "#1de9b6"),
+    ("#ff1744", "#c4001d", "#ff1744"),
+)
+
+
+class Vehicle:
+    """Map objects and breadcrumb trail of one vehicle"""
+
+    def __init__(self, vehicle_id):
+        self.vehicle_id = vehicle_id
+        self.colors = VEHICLE_COLORS[(vehicle_id - 1) % len(VEHICLE_COLORS)]
+        self.sample = None
+        self.last_seen = 0.0  # time.monotonic() of the last sample
+        self.trail = deque(maxlen=TRAIL_POINTS)
+        self.trail_changed = False
+        self.marker = None
+        self.path = None
+
+    def add(self, sample, now):
+        self.sample = sample
+        self.last_seen = now
+        point = (sample.lat, sample.lon)
+        if not self.trail or geodesy.equirectangular(*self.trail[-1], *point) * 1000 >= TRAIL_SPACING_M:
+            self.trail.append(point)
+            self.trail_changed = True
+
+    def label(self, now):
+        status = " (lost)" if now - self.last_seen > STALE_SECONDS else ""
+        return f"UAV {self.vehicle_id} {self.sample.alt:.0f} m{status}"
+
+
+class VehicleLayer:
+    """Renders live vehicles from a telemetry receiver at a capped frame rate"""
+
+    def __init__(self, map_widget, frame_rate=FRAME_RATE):
+        self.map_widget = map_widget
+        self.frame_interval = int(1000 / frame_rate)
+        self.vehicles = {}  # Vehicle id -> Vehicle
+        self.receiver = None
+        self.frame_job = None
+
+    def start(self, receiver):
+        """Start drawing samples of a running receiver"""
+        self.receiver = receiver
+        if self.frame_job is None:
+            self.frame_job = self.map_widget.after(self.frame_interval, self.frame)
+
+    def stop(self):
+        """Stop drawing; vehicles stay on the map until clear()"""
+        if self.frame_job is not None:
+            self.map_widget.after_cancel(self.frame_job)
+            self.frame_job = None
+        self.receiver = None
+
+    def frame(self):
+        """Apply all samples received since the previous frame"""
+        self.frame_job = self.map_widget.after(self.frame_interval, self.frame)
+        self.update(self.receiver.drain())
+
+    def update(self, samples):
+        now = time.monotonic()
+        for sample in samples:
+            vehicle = self.vehicles.get(sample.vehicle_id)
+            if vehicle is None:
+                vehicle = self.vehicles[sample.vehicle_id] = Vehicle(sample.vehicle_id)
+            vehicle.add(sample, now)
+
+        for vehicle in self.vehicles.values():
+            self.draw(vehicle, now)
+
+    def draw(self, vehicle, now):
+        sample = vehicle.sample
+        if vehicle.marker is None:
+            circle, outside, _ = vehicle.colors
+            vehicle.marker = self.map_widget.set_marker(
+                sample.lat, sample.lon,
+                text=vehicle.label(now),
+                marker_color_circle=circle,
+                marker_color_outside=outside
+            )
+        else:
+            if vehicle.marker.position != (sample.lat, sample.lon):
+                vehicle.marker.set_position(sample.lat, sample.lon)
+            label = vehicle.label(now)
+            if vehicle.marker.text != label:
+                vehicle.marker.set_text(label)
+
+        if vehicle.trail_changed and len(vehicle.trail) >= 2:
+            vehicle.trail_changed = False
+            if vehicle.path is None:
+                vehicle.path = self.map_widget.set_path(list(vehicle.trail), color=vehicle.colors[2], width=2)
+            else:
+                vehicle.path.set_position_list(list(vehicle.trail))
+
+    def clear(self):
+        """Remove all vehicles from the map"""
+        for vehicle in self.vehicles.values():
+            if vehicle.marker:
+                vehicle.marker.delete()
+            if vehicle.path:
+                vehicle.path.delete()
+        self.vehicles.clear()
@@ -0,0 +1,189 @@
+"""Virtualized waypoint list for Tkinter
+
+A plain tk.Listbox holds one item per waypoint, so refreshing it is O(n)
+widget work. VirtualListbox keeps only the rows that fit on screen in the
+underlying Listbox and asks a callback for the text of each visible row. Rows
+are diffed against what is already displayed, so an edit only rewrites the
+rows whose text actually changed.
+
+The class mirrors the parts of the tk.Listbox API used by the mission planner
+(curselection, nearest, selection_set, selection_clear, activate, see, bind),
+with indices referring to absolute rows rather than visible slots.
+"""
+import tkinter as tk
+from tkinter import font as tkfont
+
+
+class VirtualListbox:
+    """Listbox that only materializes the visible rows of a large list"""
+
+    def __init__(self, parent, row_text, empty_text="", **listbox_options):
+        self.row_text = row_text  # Callback: absolute row index -> display text
+        self.empty_text = empty_text
+        self.row_count = 0
+        self.top = 0  # Absolute index of the first visible row
+        self.visible_rows = listbox_options.get('height', 10)
+        self.selected = None  # Absolute index of the selected row
+        self.shown = []  # Text currently displayed in each visible slot
+
+        self.frame = tk.Frame(parent, bg=listbox_options.get('bg', "#1a1a1a"))
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox = tk.Listbox(self.frame, exportselection=False, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.line_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<MouseWheel>", self.on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(3))
+        self.listbox.bind("<Up>", lambda e: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda e: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda e: self.move_selection(-self.visible_rows))
+        self.listbox.bind("<Next>", lambda e: self.move_selection(self.visible_rows))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def bind(self, sequence, func):
+        return self.listbox.bind(sequence, func, add="+")
+
+    # Data updates
+
+    def set_row_count(self, count):
+        """Set the number of rows and redraw the visible window"""
+        self.row_count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.top = max(0, min(self.top, count - self.visible_rows))
+        self.refresh()
+
+    def refresh(self, rows=None):
+        """Redraw visible rows, optionally limited to the given absolute rows"""
+        if self.row_count == 0:
+            texts = [self.empty_text] if self.empty_text else []
+        else:
+            end = min(self.top + self.visible_rows, self.row_count)
+            if rows is not None and len(self.shown) == end - self.top:
+                texts = list(self.shown)
+                for row in rows:
+                    if self.top <= row < end:
+                        texts[row - self.top] = self.row_text(row)
+            else:
+                texts = [self.row_text(row) for row in range(self.top, end)]
+
+        # Only rewrite slots whose text changed
+        if len(texts) != len(self.shown):
+            self.listbox.delete(0, tk.END)
+            if texts:
+                self.listbox.insert(tk.END, *texts)
+        else:
+            for slot, (old, new) in enumerate(zip(self.shown, texts)):
+                if old != new:
+                    self.listbox.delete(slot)
+                    self.listbox.insert(slot, new)
+        self.shown = texts
+
+        self.update_selection_display()
+        self.update_scrollbar()
+
+    def update_selection_display(self):
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected is not None and self.top <= self.selected < self.top + len(self.shown):
+            slot = self.selected - self.top
+            self.listbox.selection_set(slot)
+            self.listbox.activate(slot)
+
+    def update_scrollbar(self):
+        if self.row_count <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            first = self.top / self.row_count
+            last = (self.top + self.visible_rows) / self.row_count
+            self.scrollbar.set(first, min(last, 1.0))
+
+    # Scrolling
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), self.row_count - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def scroll(self, rows):
+        self.scroll_to(self.top + rows)
+
+    def yview(self, *args):
+        """Scrollbar command handler ('moveto', fraction) / ('scroll', n, what)"""
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.row_count)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows
+            self.scroll(amount)
+
+    def see(self, index):
+        """Scroll so that an absolute row is visible"""
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible_rows:
+            self.scroll_to(index - self.visible_rows + 1)
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def on_resize(self, event):
+        rows = max(1, event.height // self.line_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.top = max(0, min(self.top, self.row_count - rows))
+            self.refresh()
+
+    # Selection (absolute indices)
+
+    def on_select(self, event):
+        local = self.listbox.curselection()
+        if local and self.row_count:
+            self.selected = self.top + local[0]
+
+    def move_selection(self, step):
+        if not self.row_count:
+            return "break"
+        current = self.selected if self.selected is not None else self.top - step
+        self.selected = max(0, min(current + step, self.row_count - 1))
+        self.see(self.selected)
+        self.update_selection_display()
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def curselection(self):
+        local = self.listbox.curselection()
+        if local and self.row_count:
+            self.selected = self.top + local[0]
+        if self.selected is None:
+            return ()
+        return (self.selected,)
+
+    def nearest(self, y):
+        if not self.row_count:
+            return -1
+        return min(self.top + self.listbox.nearest(y), self.row_count - 1)
+
+    def selection_clear(self, first=0, last=None):
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    def selection_set(self, index):
+        if 0 <= index < self.row_count:
+            self.selected = index
+            self.see(index)
+            self.update_selection_display()
+
+    def activate(self, index):
+        if self.top <= index < self.top + len(self.shown):
+            self.listbox.activate(index - self.top)
@@ -0,0 +1,270 @@
+"""Columnar storage for mission waypoints
+
+Waypoint coordinates, ids and types live in contiguous NumPy arrays instead of
+one dict per waypoint. Slots are kept in insertion order; removing a waypoint
+only marks its slot dead, and dead slots are compacted away in bulk once they
+make up a large share of the store, so removal is O(1) amortized.
+
+Waypoint ids are small increasing integers handed out by the planner, so the
+id index is a direct-address table (id -> slot) giving O(1) lookups without a
+per-waypoint hash entry. Waypoint objects are lightweight __slots__ views that
+read and write through to the store; two views of the same id compare equal.
+"""
+import numpy as np
+
+TYPE_NAMES = ('normal', 'takeoff', 'land', 'route')
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+
+class Waypoint:
+    """View of a single waypoint stored in a WaypointStore"""
+
+    __slots__ = ('store', 'id')
+
+    def __init__(self, store, waypoint_id):
+        self.store = store
+        self.id = waypoint_id
+
+    def __eq__(self, other):
+        return isinstance(other, Waypoint) and other.id == self.id and other.store is self.store
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Waypoint(id={self.id}, name={self.name!r}, lat={self.lat:.6f}, lon={self.lon:.6f}, type={self.type!r})"
+
+    @property
+    def slot(self):
+        return self.store.slot_of(self.id)
+
+    @property
+    def lat(self):
+        return float(self.store.lats[self.slot])
+
+    @property
+    def lon(self):
+        return float(self.store.lons[self.slot])
+
+    @property
+    def name(self):
+        return self.store.names.get(self.id) or f"WP{self.id}"
+
+    @name.setter
+    def name(self, value):
+        if value == f"WP{self.id}":
+            self.store.names.pop(self.id, None)
+        else:
+            self.store.names[self.id] = value
+
+    @property
+    def type(self):
+        return TYPE_NAMES[self.store.types[self.slot]]
+
+    @type.setter
+    def type(self, value):
+        self.store.types[self.slot] = TYPE_CODES[value]
+
+    @property
+    def marker(self):
+        return self.store.markers.get(self.id)
+
+    @marker.setter
+    def marker(self, value):
+        if value is None:
+            self.store.markers.pop(self.id, None)
+        else:
+            self.store.markers[self.id] = value
+
+
+class WaypointStore:
+    """Insertion-ordered columnar waypoint table with an id index"""
+
+    def __init__(self, capacity=1024):
+        self.count = 0  # Used slots, including dead ones
+        self.live = 0  # Live waypoints
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.lats = np.zeros(capacity, dtype=np.float64)
+        self.lons = np.zeros(capacity, dtype=np.float64)
+        self.types = np.zeros(capacity, dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.slot_index = np.full(capacity, -1, dtype=np.int64)  # Waypoint id -> slot, -1 if absent
+        self.names = {}  # Waypoint id -> custom name (default names are not stored)
+        self.markers = {}  # Waypoint id -> map marker
+        self._rows = None  # Cached row -> slot mapping while dead slots exist
+
+    def __len__(self):
+        return self.live
+
+    def __bool__(self):
+        return self.live > 0
+
+    def __contains__(self, waypoint):
+        waypoint_id = waypoint.id if isinstance(waypoint, Waypoint) else waypoint
+        return self.slot_of(waypoint_id) >= 0
+
+    def __iter__(self):
+        for slot in self.row_slots():
+            yield Waypoint(self, int(self.ids[slot]))
+
+    def __getitem__(self, row):
+        """Waypoint at a display row (insertion order)"""
+        if row < 0:
+            row += self.live
+        if not 0 <= row < self.live:
+            raise IndexError("waypoint row out of range")
+        slot = row if self.live == self.count else self.row_slots()[row]
+        return Waypoint(self, int(self.ids[slot]))
+
+    def slot_of(self, waypoint_id):
+        """Slot of a waypoint id, or -1 if it is not stored"""
+        if 0 <= waypoint_id < self.slot_index.size:
+            return int(self.slot_index[waypoint_id])
+        return -1
+
+    def get(self, waypoint_id):
+        """Waypoint view for an id, or None"""
+        if self.slot_of(waypoint_id) < 0:
+            return None
+        return Waypoint(self, waypoint_id)
+
+    def row_of(self, waypoint):
+        """Display row of a waypoint, or -1 if it is not stored"""
+        slot = self.slot_of(waypoint.id if isinstance(waypoint, Waypoint) else waypoint)
+        if slot < 0:
+            return -1
+        if self.live == self.count:
+            return slot
+        return int(np.searchsorted(self.row_slots(), slot))
+
+    def row_slots(self):
+        """Slots of live waypoints in display order"""
+        if self.live == self.count:
+            return np.arange(self.count)
+        if self._rows is None:
+            self._rows = np.flatnonzero(self.alive[:self.count])
+        return self._rows
+
+    # Mutation
+
+    def _reserve(self, extra, max_id):
+        """Grow the columns and the id index to fit more waypoints"""
+        needed = self.count + extra
+        if needed > self.ids.size:
+            capacity = max(needed, self.ids.size * 2)
+            for column in ('ids', 'lats', 'lons', 'types', 'alive'):
+                old = getattr(self, column)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:self.count] = old[:self.count]
+                setattr(self, column, new)
+        if max_id >= self.slot_index.size:
+            index = np.full(max(max_id + 1, self.slot_index.size * 2), -1, dtype=np.int64)
+            index[:self.slot_index.size] = self.slot_index
+            self.slot_index = index
+
+    def add(self, waypoint_id, lat, lon, waypoint_type='normal', name=None):
+        """Append a waypoint and return its view"""
+        if self.slot_of(waypoint_id) >= 0:
+            raise ValueError(f"duplicate waypoint id {waypoint_id}")
+        self._reserve(1, waypoint_id)
+        slot = self.count
+        self.ids[slot] = waypoint_id
+        self.lats[slot] = lat
+        self.lons[slot] = lon
+        self.types[slot] = TYPE_CODES[waypoint_type]
+        self.alive[slot] = True
+        self.slot_index[waypoint_id] = slot
+        self.count += 1
+        self.live += 1
+        self._rows = None
+        waypoint = Waypoint(self, waypoint_id)
+        if name is not None:
+            waypoint.name = name
+        return waypoint
+
+    def extend(self, ids, lats, lons, types=None, names=None):
+        """Append many waypoints from arrays in one vectorized pass
+
+        ids must be new, unique and increasing. types is an optional array of
+        type codes and names an optional {id: name} mapping of custom names.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        k = ids.size
+        if k == 0:
+            return
+        if np.any(self.slot_index[ids[ids < self.slot_index.size]] >= 0):
+            raise ValueError("duplicate waypoint id")
+        self._reserve(k, int(ids.max()))
+        start, end = self.count, self.count + k
+        self.ids[start:end] = ids
+        self.lats[start:end] = lats
+        self.lons[start:end] = lons
+        self.types[start:end] = 0 if types is None else types
+        self.alive[start:end] = True
+        self.slot_index[ids] = np.arange(start, end)
+        self.count = end
+        self.live += k
+        self._rows = None
+        for waypoint_id, name in (names or {}).items():
+            Waypoint(self, waypoint_id).name = name
+
+    def set_type(self, waypoint_ids, waypoint_type):
+        """Set the type of many waypoints at once"""
+        slots = self.slot_index[np.asarray(waypoint_ids, dtype=np.int64)]
+        self.types[slots] = TYPE_CODES[waypoint_type]
+
+    def remove(self, waypoint_id):
+        """Remove a waypoint by id in O(1) amortized time"""
+        slot = self.slot_of(waypoint_id)
+        if slot < 0:
+            raise KeyError(waypoint_id)
+        self.alive[slot] = False
+        self.slot_index[waypoint_id] = -1
+        self.names.pop(waypoint_id, None)
+        self.markers.pop(waypoint_id, None)
+        self.live -= 1
+        self._rows = None
+        if slot == self.count - 1:
+            self.count -= 1
+        elif self.count - self.live > max(64, self.live):
+            self.compact()
+
+    def clear(self):
+        """Remove all waypoints"""
+        self.slot_index[self.ids[:self.count]] = -1
+        self.alive[:self.count] = False
+        self.count = 0
+        self.live = 0
+        self.names.clear()
+        self.markers.clear()
+        self._rows = None
+
+    def compact(self):
+        """Squeeze out dead slots, keeping insertion order"""
+        if self.live == self.count:
+            return
+        keep = self.row_slots()
+        for column in ('ids', 'lats', 'lons', 'types'):
+            values = getattr(self, column)
+            values[:self.live] = values[keep]
+        self.alive[:self.live] = True
+        self.alive[self.live:self.count] = False
+        self.count = self.live
+        self.slot_index[self.ids[:self.count]] = np.arange(self.count)
+        self._rows = None
+
+    # Bulk access
+
+    def coordinates(self):
+        """Zero-copy (lats, lons) views of all waypoints in display order"""
+        self.compact()
+        return self.lats[:self.count], self.lons[:self.count]
+
+    def coordinates_of(self, waypoints):
+        """(lats, lons) arrays for a sequence of waypoints or ids, in that order"""
+        ids = np.fromiter(
+            (wp.id if isinstance(wp, Waypoint) else wp for wp in waypoints),
+            dtype=np.int64, count=len(waypoints)
+        )
+        slots = self.slot_index[ids]
+        return self.lats[slots], self.lons[slots]